@@ -5,14 +5,23 @@ import urllib
 
 import channels.layers
 import requests
-from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from hx_lti_assignment.models import Assignment
-from hx_lti_initializer.utils import retrieve_token
+from django.urls import reverse
+from hx_lti_assignment.models import Assignment, CourseTargets
+from hx_lti_initializer.utils import (
+    dashboard_row,
+    format_catchpy_annotation,
+    retrieve_token,
+)
 from lti.contrib.django import DjangoToolProvider
+from notification import metrics
+from notification.acl import can_read, course_staff_group, read_acl
+from notification.health import get_breaker
+from notification.presence import is_listened
+from notification.publisher import publish
 
 logger = logging.getLogger(__name__)
 
@@ -880,12 +889,15 @@ class WebAnnotationStoreBackend(StoreBackend):
             )
         )
         try:
-            async_to_sync(self.channel_layer.group_send)(
+            publish(
+                self.channel_layer,
                 group,
                 {
                     "type": "annotation_notification",
                     "message": annotation,
                     "action": message_type,
+                    # only sent to consumers allowed to read the annotation
+                    "read": read_acl(annotation),
                 },
             )
         except Exception as e:
@@ -897,6 +909,67 @@ class WebAnnotationStoreBackend(StoreBackend):
                 message_type, group, annotation.get("id", "unknown_id"), e
             )
             self.logger.error(msg, exc_info=settings.HXAT_NOTIFY_ERRORLOG)
+        else:
+            self.send_dashboard_notification(message_type, annotation, context_id)
+
+    def send_dashboard_notification(self, message_type, annotation, context_id):
+        # nothing to build while sends are skipped, or for nobody
+        breaker = get_breaker()
+        if breaker is not None and breaker.is_open:
+            metrics.counter("notify.breaker.skipped").inc()
+            return
+        group = course_staff_group(context_id)
+        if not is_listened(group):
+            return
+        # the dashboard searches as ADMIN_GROUP_ID, so it only lists
+        # annotations staff can read
+        if not can_read(read_acl(annotation), None, True):
+            return
+        try:
+            row = format_catchpy_annotation(annotation)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            self.logger.debug(
+                "no dashboard notification for id({}): {}".format(
+                    annotation.get("id", "unknown_id"), e
+                )
+            )
+            return
+
+        object_id = str(self.request.LTI["hx_object_id"])
+        # cached per course, as for the dashboard itself
+        course_targets = CourseTargets.get(self.request.LTI["hx_context_id"])
+        assignment_name = course_targets.assignment_names.get(row["collectionId"])
+        target_object_name = course_targets.get_target_title(object_id)
+        preview_url = reverse(
+            "hx_lti_initializer:access_annotation_target",
+            kwargs={
+                "course_id": row["contextId"],
+                "assignment_id": row["collectionId"],
+                "object_id": object_id,
+            },
+        )
+        try:
+            publish(
+                self.channel_layer,
+                group,
+                {
+                    "type": "dashboard_notification",
+                    "action": message_type,
+                    "row": dashboard_row(
+                        row,
+                        assignment_name or "",
+                        target_object_name or "",
+                        preview_url,
+                    ),
+                },
+            )
+        except Exception as e:
+            self.logger.error(
+                "##### unable to notify dashboard: action({}) id({}): {}".format(
+                    message_type, row["id"], e
+                ),
+                exc_info=settings.HXAT_NOTIFY_ERRORLOG,
+            )
 
 
 """
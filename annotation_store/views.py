@@ -11,6 +11,7 @@ from django.views.decorators.http import require_http_methods
 from hx_lti_assignment.models import Assignment
 from hx_lti_initializer.models import LTICourse
 from hx_lti_initializer.utils import retrieve_token
+from target_object_database.manifests import get_first_canvas_id
 from target_object_database.models import TargetObject
 
 from .store import AnnotationStore
@@ -86,8 +87,14 @@ def transfer(request, instructor_only="1"):
         uri = pk
         target_type = types[obj.target_type]
         if target_type == "image":
-            result = requests.get(obj.target_content)
-            uri = json.loads(result.text)["sequences"][0]["canvases"][0]["@id"]
+            uri = get_first_canvas_id(obj.target_content)
+            if uri is None:
+                logger.error(
+                    "skipping transfer of object {}: no canvas in manifest {}".format(
+                        pk, obj.target_content
+                    )
+                )
+                continue
         search_database_url = (
             str(assignment.annotation_database_url).strip() + "/search?"
         )
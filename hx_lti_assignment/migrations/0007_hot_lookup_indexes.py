@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hx_lti_assignment', '0006_auto_20210608_2109'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignmenttargets',
+            index=models.Index(fields=['assignment', 'order'], name='assignmenttarget_order_idx'),
+        ),
+    ]
@@ -1,16 +1,57 @@
-import json
+import hashlib
 import logging
 import sys
 import uuid
+from collections import namedtuple
 
-import requests
-from requests.exceptions import HTTPError, Timeout
+from django.conf import settings
+from django.core.cache import caches
 from django.db import models
+from django.db.models import Case, TextField, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 from hx_lti_initializer.models import LTICourse
+from target_object_database import manifests
 from target_object_database.models import TargetObject
 
 logger = logging.getLogger(__name__)
 
+# target_external_options, in their csv order
+TargetOptions = namedtuple(
+    "TargetOptions",
+    [
+        "view_type",
+        "canvas_id",
+        "dashboard_hidden",
+        "transcript_hidden",
+        "transcript_download",
+        "video_download",
+    ],
+)
+
+
+def parse_target_options(target_external_options):
+    """
+    Returns TargetOptions for the value of target_external_options (see
+    AssignmentTargets.get_target_external_options_list).
+    """
+    if target_external_options is None:
+        options = []
+    else:
+        options = [option.strip() for option in target_external_options.split(",")]
+    # a lone option is not taken as the view type
+    view_type = options[0] if len(options) > 1 else ""
+    options += [""] * (len(TargetOptions._fields) - len(options))
+    return TargetOptions(
+        view_type=view_type or "ImageView",
+        canvas_id=options[1] or None,
+        dashboard_hidden=options[2] == "true",
+        transcript_hidden=options[3] == "true",
+        transcript_download=options[4] == "true",
+        video_download=options[5] == "true",
+    )
+
 
 class AssignmentTargets(models.Model):
     assignment = models.ForeignKey(
@@ -43,6 +84,12 @@ class AssignmentTargets(models.Model):
         ordering = [
             "order",
         ]
+        indexes = [
+            # previous/next target in an assignment
+            models.Index(
+                fields=["assignment", "order"], name="assignmenttarget_order_idx"
+            ),
+        ]
 
     def get_target_external_options_list(self):
         """
@@ -67,83 +114,78 @@ class AssignmentTargets(models.Model):
             return []
         return self.target_external_options.split(",")
 
+    @cached_property
+    def options(self):
+        """
+        Returns target_external_options as TargetOptions, parsed once per
+        instance (and again after save).
+        """
+        return parse_target_options(self.target_external_options)
+
+    def save(self, *args, **kwargs):
+        super(AssignmentTargets, self).save(*args, **kwargs)
+        self.__dict__.pop("options", None)
+
     def get_view_type_for_mirador(self):
         """
         """
-        options = self.get_target_external_options_list()
-        if len(options) == 1:
-            return "ImageView"
-        else:
-            return options[0] if options[0] != "" else "ImageView"
+        return self.options.view_type
 
     def get_canvas_id_for_mirador(self):
         """
         """
-        options = self.get_target_external_options_list()
-        logger.debug("OPTIONS: %s " % options)
-
         # Retrieve first canvas ID in the IIIF manifest if none
         # is specified in the options list.
-        if options is None or len(options) <= 1 or options[1] == "":
+        if self.options.canvas_id is None:
             manifest_url = self.target_object.target_content
-            try:
-                req = requests.get(manifest_url, timeout=10)
-                req.raise_for_status()
-            except Timeout as e:
-                logger.warning(f"Request for manifest timed out: AssignmentTarget {self.pk} manifest: {manifest_url}")
-                return None
-            except HTTPError as e:
-                logger.error(f"Failed to request manifest: AssignmentTarget {self.pk} status {e.response.status_code} manifest: {manifest_url}")
-                return None
-
-            try:
-                manifest = json.loads(req.text)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse manifest: AssignmentTarget {self.pk}")
-                return None
-
-            try:
-                return manifest["sequences"][0]["canvases"][0]["@id"]
-            except (KeyError, IndexError) as e:
-                logger.error(f"Failed to extract canvas ID from manifest: AssignmentTarget {self.pk}")
-                return None
-        return options[1]
+            canvas_id = manifests.get_first_canvas_id(manifest_url)
+            if canvas_id is None:
+                logger.warning(
+                    f"No canvas ID in manifest: AssignmentTarget {self.pk} manifest: {manifest_url}"
+                )
+            return canvas_id
+        return self.options.canvas_id
 
     def get_dashboard_hidden(self):
         """
         """
-        options = self.get_target_external_options_list()
-        if len(options) < 3:
-            return "false"
-        else:
-            return options[2] if options[2] != "" else "false"
+        return "true" if self.options.dashboard_hidden else "false"
 
     def get_transcript_hidden(self):
         """
         """
-        options = self.get_target_external_options_list()
-        if len(options) < 4:
-            return "false"
-        else:
-            return options[3] if options[3] != "" else "false"
+        return "true" if self.options.transcript_hidden else "false"
 
     def get_transcript_download(self):
         """
         """
-        options = self.get_target_external_options_list()
-        if len(options) < 5:
-            return "false"
-        else:
-            return options[4] if options[4] != "" else "false"
+        return "true" if self.options.transcript_download else "false"
 
     def get_video_download(self):
         """
         """
-        options = self.get_target_external_options_list()
-        if len(options) < 6:
-            return "false"
-        else:
-            return options[5] if options[5] != "" else "false"
+        return "true" if self.options.video_download else "false"
+
+    def get_page_options(self, course):
+        """
+        Returns the options of this target for its annotation page, with the
+        course's CSS as default, as template context.
+        """
+        page_options = {
+            "dashboard_hidden": self.get_dashboard_hidden(),
+            "transcript_hidden": self.get_transcript_hidden(),
+            "transcript_download": self.get_transcript_download(),
+            "video_download": self.get_video_download(),
+        }
+        custom_css = self.target_external_css or course.course_external_css_default
+        if custom_css:
+            page_options["custom_css"] = custom_css
+        if self.target_object.target_type == "ig":
+            page_options["viewType"] = self.get_view_type_for_mirador()
+            canvas_id = self.get_canvas_id_for_mirador()
+            if canvas_id is not None:
+                page_options["canvas_id"] = canvas_id
+        return page_options
 
     @classmethod
     def get_by_assignment_id(cls, assignment_id, target_object_id):
@@ -242,43 +284,40 @@ class Assignment(models.Model):
     def __unicode__(self):
         return "%s" % self.assignment_name
 
+    def get_navigation(self):
+        """
+        Returns the AssignmentNavigation of this assignment's target objects.
+        """
+        key = AssignmentNavigation.cache_key(self.pk)
+        navigation = caches["app"].get(key)
+        if navigation is None:
+            navigation = AssignmentNavigation(
+                AssignmentTargets.objects.filter(assignment_id=self.pk)
+                .order_by("order", "pk")
+                .values_list("target_object_id", flat=True)
+            )
+            caches["app"].set(
+                key,
+                navigation,
+                getattr(settings, "HXAT_NAVIGATION_CACHE_TTL", 300),
+            )
+        return navigation
+
+    def _assignment_target(self, target_object_id):
+        if target_object_id is None:
+            return None
+        try:
+            return AssignmentTargets.objects.get(
+                assignment=self, target_object_id=target_object_id
+            )
+        except AssignmentTargets.DoesNotExist:
+            return None
+
     def object_before(self, id):
-        if len(self.assignment_objects.all()) > 1:
-            try:
-                obj = TargetObject.objects.get(pk=id)
-                assignment_target = AssignmentTargets.objects.get(
-                    assignment=self, target_object=obj
-                )
-                if assignment_target.order == 1:
-                    return None
-                else:
-                    new_order = assignment_target.order - 1
-                    return AssignmentTargets.objects.get(
-                        assignment=self, order=new_order
-                    )
-            except:
-                return None
-        return None
+        return self._assignment_target(self.get_navigation().before(id))
 
     def object_after(self, id):
-        if len(self.assignment_objects.all()) > 1:
-            try:
-                obj = TargetObject.objects.get(pk=id)
-                assignment_target = AssignmentTargets.objects.get(
-                    assignment=self, target_object=obj
-                )
-                if assignment_target.order == len(
-                    self.assignment_objects.all()
-                ):  # noqa
-                    return None
-                else:
-                    new_order = assignment_target.order + 1
-                    return AssignmentTargets.objects.get(
-                        assignment=self, order=new_order
-                    )
-            except:
-                return None
-        return None
+        return self._assignment_target(self.get_navigation().after(id))
 
     def array_of_tags(self):
         def getColorValues(color):
@@ -352,3 +391,178 @@ class Assignment(models.Model):
 
     def get_target_objects(self):
         return self.assignment_objects.all()
+
+
+class AssignmentNavigation(object):
+    """
+    Target object ids of an assignment in order, to go from one to the
+    previous or next. Cached per assignment, and dropped from the cache
+    whenever one of its AssignmentTargets is saved or deleted.
+    """
+
+    def __init__(self, target_object_ids):
+        self.target_object_ids = list(target_object_ids)
+        # object ids come from urls as strings
+        self.positions = {
+            str(target_object_id): position
+            for position, target_object_id in enumerate(self.target_object_ids)
+        }
+
+    @staticmethod
+    def cache_key(assignment_pk):
+        return "hxat:assignment_navigation:{}".format(assignment_pk)
+
+    def __len__(self):
+        return len(self.target_object_ids)
+
+    def position(self, target_object_id):
+        """Returns the 0-based position of a target object, or None."""
+        return self.positions.get(str(target_object_id))
+
+    def before(self, target_object_id):
+        position = self.position(target_object_id)
+        if position is None or position == 0:
+            return None
+        return self.target_object_ids[position - 1]
+
+    def after(self, target_object_id):
+        position = self.position(target_object_id)
+        if position is None or position == len(self.target_object_ids) - 1:
+            return None
+        return self.target_object_ids[position + 1]
+
+
+class CourseTargets(object):
+    """
+    Names of a course's assignments and the target objects they use, as the
+    instructor dashboard looks them up. Only the columns it needs are loaded
+    (the content of image targets is their manifest url, the content of text
+    targets is not loaded at all). Cached per course, and dropped from the
+    cache whenever one of its assignments, their targets or the target
+    objects are saved or deleted.
+    """
+
+    def __init__(self, assignment_names, target_objects):
+        self.assignment_names = dict(assignment_names)
+        self.target_objects = list(target_objects)
+
+    @staticmethod
+    def cache_key(course_id):
+        # course ids come from lti consumers and can have any characters
+        return "hxat:course_targets:{}".format(
+            hashlib.sha1(str(course_id).encode("utf-8")).hexdigest()
+        )
+
+    @classmethod
+    def get(cls, course_id):
+        """Returns the CourseTargets of the LTICourse(s) with `course_id`."""
+        key = cls.cache_key(course_id)
+        course_targets = caches["app"].get(key)
+        if course_targets is None:
+            course_targets = cls.load(course_id)
+            caches["app"].set(
+                key,
+                course_targets,
+                getattr(settings, "HXAT_COURSE_TARGETS_CACHE_TTL", 300),
+            )
+        return course_targets
+
+    @classmethod
+    def load(cls, course_id):
+        assignment_names = Assignment.objects.filter(
+            course__course_id=course_id
+        ).values_list("assignment_id", "assignment_name")
+        target_objects = (
+            TargetObject.objects.filter(assignment__course__course_id=course_id)
+            .annotate(
+                manifest_url=Case(
+                    When(target_type="ig", then="target_content"),
+                    default=Value(""),
+                    output_field=TextField(),
+                )
+            )
+            .values("id", "target_title", "target_type", "manifest_url")
+            .order_by("id")
+            .distinct()
+        )
+        return cls(assignment_names, target_objects)
+
+    def get_target_title(self, target_object_id):
+        for target_object in self.target_objects:
+            if str(target_object["id"]) == str(target_object_id):
+                return target_object["target_title"]
+        return None
+
+    @classmethod
+    def invalidate(cls, course_ids):
+        caches["app"].delete_many(
+            [cls.cache_key(course_id) for course_id in set(course_ids) if course_id]
+        )
+
+
+@receiver(post_save, sender=AssignmentTargets)
+@receiver(post_delete, sender=AssignmentTargets)
+def invalidate_assignment_navigation(sender, instance, **kwargs):
+    caches["app"].delete(AssignmentNavigation.cache_key(instance.assignment_id))
+
+
+@receiver(pre_save, sender=Assignment)
+def remember_assignment_course(sender, instance, **kwargs):
+    # an assignment moved to another course has to leave the old course too
+    instance._stored_course_ids = list(
+        Assignment.objects.filter(pk=instance.pk).values_list(
+            "course__course_id", flat=True
+        )
+        if instance.pk is not None
+        else []
+    )
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def invalidate_assignment_course_targets(sender, instance, **kwargs):
+    course_ids = set(getattr(instance, "_stored_course_ids", []))
+    if instance.course_id is not None:
+        course_ids.update(
+            LTICourse.objects.filter(pk=instance.course_id).values_list(
+                "course_id", flat=True
+            )
+        )
+    CourseTargets.invalidate(course_ids)
+
+
+@receiver(pre_save, sender=LTICourse)
+def remember_course_id(sender, instance, **kwargs):
+    instance._stored_course_ids = list(
+        LTICourse.objects.filter(pk=instance.pk).values_list("course_id", flat=True)
+        if instance.pk is not None
+        else []
+    )
+
+
+@receiver(post_save, sender=LTICourse)
+def invalidate_course_course_targets(sender, instance, **kwargs):
+    # targets cached under the old course_id must not outlive a rename
+    CourseTargets.invalidate(
+        set(getattr(instance, "_stored_course_ids", [])) | {instance.course_id}
+    )
+
+
+@receiver(post_save, sender=AssignmentTargets)
+@receiver(post_delete, sender=AssignmentTargets)
+def invalidate_assignment_target_course_targets(sender, instance, **kwargs):
+    CourseTargets.invalidate(
+        Assignment.objects.filter(pk=instance.assignment_id).values_list(
+            "course__course_id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=TargetObject)
+def invalidate_target_object_course_targets(sender, instance, **kwargs):
+    # deleting a target object deletes its AssignmentTargets, which invalidate
+    CourseTargets.invalidate(
+        Assignment.objects.filter(assignment_objects=instance).values_list(
+            "course__course_id", flat=True
+        )
+    )
@@ -0,0 +1,192 @@
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+
+from django.core.management import BaseCommand
+
+from hx_lti_initializer.utils import (
+    DashboardEntry,
+    format_catchpy_annotation,
+    get_annotation_positions_by_user,
+    get_annotations_keyed_by_annotation_id,
+    get_annotations_keyed_by_user_id,
+    share_row_values,
+)
+from hxat.jsonstream import JsonArrayStream
+
+CONTEXT_ID = "course-v1:HarvardX+HxAT101+2020"
+
+
+def catchpy_annotation(i, users, collection_ids):
+    """a text annotation, or a reply to the one before it, as catchpy sends it."""
+    user_id = "user-{}".format(i % users)
+    target = {
+        "type": "List",
+        "items": [
+            {
+                "type": "Text",
+                "source": str(i % 20),
+                "selector": {
+                    "type": "Choice",
+                    "items": [
+                        {"type": "TextQuoteSelector", "exact": "quoted text {}".format(i)},
+                        {"type": "TextPositionSelector", "start": i, "end": i + 12},
+                    ],
+                },
+            }
+        ],
+    }
+    if i % 5 == 4:
+        target = {
+            "type": "List",
+            "items": [{"type": "Annotation", "format": "text/html", "source": str(i - 1)}],
+        }
+    return {
+        "id": str(i),
+        "created": "2020-10-19T10:00:00+00:00",
+        "modified": "2020-10-19T10:00:00+00:00",
+        "creator": {"id": user_id, "name": "Someone {}".format(i % users)},
+        "permissions": {
+            "can_read": [],
+            "can_update": [user_id],
+            "can_delete": [user_id],
+            "can_admin": [user_id],
+        },
+        "platform": {
+            "platform_name": "edX",
+            "context_id": CONTEXT_ID,
+            "collection_id": collection_ids[i % len(collection_ids)],
+            "target_source_id": str(i % 20),
+        },
+        "body": {
+            "type": "List",
+            "items": [
+                {"type": "TextualBody", "purpose": "commenting", "value": "<p>comment {}</p>".format(i)},
+                {"type": "TextualBody", "purpose": "tagging", "value": "tag{}".format(i % 7)},
+            ],
+        },
+        "target": target,
+        "totalReplies": 0,
+    }
+
+
+def dict_pipeline(document):
+    # the dashboard pipeline with dicts: the whole response is decoded, then
+    # every row is formatted into a dict, indexed by id and grouped by user,
+    # and listed in a dict with its names and links
+    response = json.loads(document)
+    rows = [dict(format_catchpy_annotation(annote)) for annote in response["rows"]]
+    del response
+    annotations = {"rows": rows}
+    annotation_by_id = get_annotations_keyed_by_annotation_id(annotations)
+    entries = [
+        {
+            "data": row,
+            "assignment_name": "Assignment",
+            "target_preview_url": "/preview/?focus_on_id={}".format(row["id"]),
+            "target_object_name": "Target",
+            "parent_text": annotation_by_id.get(row["parent"], {}).get("text"),
+        }
+        for user_rows in get_annotations_keyed_by_user_id(annotations).values()
+        for row in user_rows
+    ]
+    return rows, annotation_by_id, entries
+
+
+def row_pipeline(document):
+    # the same with the response parsed a row at a time into AnnotationRows
+    # that share their repeated values, grouped by position
+    shared = {}
+    rows = []
+    chunks = (document[i : i + 65536] for i in range(0, len(document), 65536))
+    for annote in JsonArrayStream(chunks, "rows"):
+        row = format_catchpy_annotation(annote)
+        share_row_values(row, shared)
+        rows.append(row)
+    annotations = {"rows": rows}
+    annotation_by_id = get_annotations_keyed_by_annotation_id(annotations)
+    entries = []
+    for positions in get_annotation_positions_by_user(annotations).values():
+        for position in positions:
+            row = rows[position]
+            parent = annotation_by_id.get(row["parent"])
+            entries.append(
+                DashboardEntry(
+                    data=row,
+                    assignment_name="Assignment",
+                    target_preview_url="/preview/?focus_on_id={}".format(row["id"]),
+                    target_object_name="Target",
+                    parent_text=None if parent is None else parent["text"],
+                )
+            )
+    return rows, annotation_by_id, entries
+
+
+class Command(BaseCommand):
+    help = (
+        "offline dashboard memory benchmark: turns a catchpy search response "
+        "into the rows listed on the instructor dashboard, with dicts vs "
+        "AnnotationRow and DashboardEntry, and reports the memory they hold "
+        "once built, the peak memory while building them, and the time taken"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--annotations",
+            dest="annotations",
+            type=int,
+            default=100000,
+            help="number of annotations in the course (DEFAULT 100000)",
+        )
+        parser.add_argument(
+            "--users",
+            dest="users",
+            type=int,
+            default=500,
+            help="number of users annotating (DEFAULT 500)",
+        )
+
+    def handle(self, *args, **kwargs):
+        collection_ids = [str(uuid.uuid4()) for _ in range(10)]
+        document = json.dumps(
+            {
+                "total": kwargs["annotations"],
+                "rows": [
+                    catchpy_annotation(i, max(1, kwargs["users"]), collection_ids)
+                    for i in range(kwargs["annotations"])
+                ],
+            }
+        )
+        results = []
+        for name, pipeline in (("dicts", dict_pipeline), ("rows", row_pipeline)):
+            results.append((name,) + self.measure(pipeline, document))
+
+        for name, held, peak, secs in results:
+            self.stdout.write(
+                "{}: holds {:.1f} MB, peak {:.1f} MB, {:.2f}s".format(
+                    name, held / 1e6, peak / 1e6, secs
+                )
+            )
+        (_, held0, peak0, _), (_, held1, peak1, _) = results
+        self.stdout.write(
+            "saved: {:.1f} MB held ({:.0%}), {:.1f} MB peak ({:.0%})".format(
+                (held0 - held1) / 1e6,
+                (held0 - held1) / float(held0),
+                (peak0 - peak1) / 1e6,
+                (peak0 - peak1) / float(peak0),
+            )
+        )
+
+    def measure(self, pipeline, document):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        built = pipeline(document)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del built
+        return held, peak, elapsed
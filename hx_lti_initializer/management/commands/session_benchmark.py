@@ -0,0 +1,135 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.management import BaseCommand
+
+from hxat.middleware import compact_launch_params
+from hxat.serializers import JsonOrderedDictSerializer, JsonSerializer
+
+SALT = "hxat.session_benchmark"
+
+
+def launch_post(i):
+    """POST params of an lti launch, as sent by canvas or edx."""
+    return {
+        "context_id": "course-v1:HarvardX+HxAT101+2020",
+        "context_label": "HxAT101",
+        "context_title": "Annotation Tool Sandbox (ñ)",
+        "custom_collection_id": str(uuid.uuid4()),
+        "custom_object_id": str(i),
+        "ext_roles": "urn:lti:instrole:ims/lis/Learner",
+        "ext_user_username": "someone",
+        "launch_presentation_document_target": "iframe",
+        "launch_presentation_locale": "en",
+        "launch_presentation_return_url": "https://lms.example.edu/courses/1/return",
+        "lis_outcome_service_url": "https://lms.example.edu/outcome/service",
+        "lis_person_contact_email_primary": "someone@example.edu",
+        "lis_person_name_full": "Someone Somebody",
+        "lis_person_sourcedid": "someone",
+        "lis_result_sourcedid": "course-v1:HarvardX+HxAT101+2020:{}:{}".format(
+            i, uuid.uuid4().hex
+        ),
+        "lti_message_type": "basic-lti-launch-request",
+        "lti_version": "LTI-1p0",
+        "oauth_callback": "about:blank",
+        "oauth_consumer_key": "consumer_key",
+        "oauth_nonce": uuid.uuid4().hex,
+        "oauth_signature": "S4mPl3s1gnatur3+ZmFrZQ==",
+        "oauth_signature_method": "HMAC-SHA1",
+        "oauth_timestamp": str(int(time.time())),
+        "oauth_version": "1.0",
+        "resource_link_id": "resource-link-{}".format(i),
+        "roles": "Learner,urn:lti:role:ims/lis/Learner",
+        "tool_consumer_info_product_family_code": "canvas",
+        "tool_consumer_info_version": "cloud",
+        "tool_consumer_instance_guid": "lms.example.edu",
+        "tool_consumer_instance_name": "Example University",
+        "user_id": uuid.uuid4().hex,
+    }
+
+
+def full_launch_params(postparams):
+    # everything in the launch, as the middleware used to keep it
+    lti_params = dict(postparams)
+    lti_params["roles"] = [r for r in postparams.get("roles", "").split(",") if r]
+    return lti_params
+
+
+class Command(BaseCommand):
+    help = (
+        "offline session benchmark: encodes and decodes a session holding "
+        "LTI_MAX_LAUNCHES launches, with full launch params and the ordered dict "
+        "serializer vs compact launch params and the plain json serializer, and "
+        "reports session bytes and cpu time per request (one load and one save)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--launches",
+            dest="launches",
+            type=int,
+            default=getattr(settings, "LTI_MAX_LAUNCHES", 10),
+            help="number of launches in the session (DEFAULT LTI_MAX_LAUNCHES)",
+        )
+        parser.add_argument(
+            "--iterations",
+            dest="iterations",
+            type=int,
+            default=2000,
+            help="number of load/save rounds to time",
+        )
+
+    def handle(self, *args, **kwargs):
+        posts = [launch_post(i) for i in range(kwargs["launches"])]
+        results = []
+        for name, make_params, serializer in (
+            ("full+ordered", full_launch_params, JsonOrderedDictSerializer),
+            ("compact+json", compact_launch_params, JsonSerializer),
+        ):
+            session = {
+                "LTI_LAUNCH": {
+                    post["resource_link_id"]: {
+                        "launch_params": make_params(post),
+                        "resource_link_id": post["resource_link_id"],
+                    }
+                    for post in posts
+                },
+                "LOGGED_IP": "127.0.0.1",
+            }
+            results.append(
+                (name,) + self.measure(session, serializer, kwargs["iterations"])
+            )
+
+        for name, raw_bytes, encoded_bytes, usecs in results:
+            self.stdout.write(
+                "{}: serialized {} bytes, stored {} bytes, {:.1f}us/request".format(
+                    name, raw_bytes, encoded_bytes, usecs
+                )
+            )
+        (_, raw0, enc0, us0), (_, raw1, enc1, us1) = results
+        self.stdout.write(
+            "saved: {} serialized bytes ({:.0%}), {} stored bytes ({:.0%}), "
+            "{:.1f}us/request ({:.0%})".format(
+                raw0 - raw1,
+                (raw0 - raw1) / float(raw0),
+                enc0 - enc1,
+                (enc0 - enc1) / float(enc0),
+                us0 - us1,
+                (us0 - us1) / us0 if us0 else 0,
+            )
+        )
+
+    def measure(self, session, serializer, iterations):
+        # same as SessionBase.encode()/decode()
+        raw = serializer().dumps(session)
+        encoded = signing.dumps(session, salt=SALT, serializer=serializer, compress=True)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            data = signing.loads(encoded, salt=SALT, serializer=serializer)
+            encoded = signing.dumps(
+                data, salt=SALT, serializer=serializer, compress=True
+            )
+        elapsed = time.perf_counter() - start
+        return len(raw), len(encoded), elapsed * 1e6 / iterations
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hx_lti_initializer', '0004_auto_20210608_2109'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lticourse',
+            name='course_id',
+            field=models.CharField(db_index=True, default='No Course ID', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='ltiprofile',
+            name='anon_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:01
+
+# LTICourse.Meta.ordering was set without a migration; this only records it
+# in the migration state, it does not change the database.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hx_lti_initializer', '0005_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lticourse',
+            options={'ordering': ['course_name', 'course_id'], 'verbose_name': 'Course'},
+        ),
+    ]
@@ -35,7 +35,9 @@ class LTIProfile(models.Model):
     )
 
     # saves the anonymous id for research purposes
-    anon_id = models.CharField(max_length=255, blank=True, null=True)
+    anon_id = models.CharField(
+        max_length=255, blank=True, null=True, db_index=True
+    )
 
     # saves the name for display purposes
     name = models.CharField(max_length=255, blank=True, null=True)
@@ -73,7 +75,9 @@ class LTICourse(models.Model):
     """
 
     # this id will come from the context_id value in the LTI
-    course_id = models.CharField(max_length=255, default=_("No Course ID"),)
+    course_id = models.CharField(
+        max_length=255, default=_("No Course ID"), db_index=True,
+    )
 
     # this is used for usability purposes only, course_id is the unique value
     course_name = models.CharField(max_length=255, default=_("No Default Name"),)
@@ -153,8 +157,7 @@ class LTICourse(models.Model):
         """
         Given an lti_profile, adds a user to the course_admins of an LTICourse if not already there
         """
-        current_profiles = self.course_admins.all()
-        if lti_profile and lti_profile not in current_profiles:
+        if lti_profile and not self.course_admins.filter(pk=lti_profile.pk).exists():
             self.course_admins.add(lti_profile)
             self.save()
         return self
@@ -163,8 +166,7 @@ class LTICourse(models.Model):
         """
         Given an lti_profile, adds a user to the course_users of an LTICourse if not already there
         """
-        current_profiles = self.course_users.all()
-        if lti_profile and lti_profile not in current_profiles:
+        if lti_profile and not self.course_users.filter(pk=lti_profile.pk).exists():
             self.course_users.add(lti_profile)
             self.save()
         return self
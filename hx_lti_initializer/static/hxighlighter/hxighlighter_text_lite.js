@@ -45759,7 +45759,7 @@ __webpack_require__(43);
 
   $.Websockets.prototype.openWs = function (slot_id, wsUrl) {
     var self = this;
-    var notificationSocket = new WebSocket('wss://' + wsUrl + '/ws/notification/' + slot_id + '/?utm_source=' + self.options.Websockets.utm + '&resource_link_id=' + self.options.Websockets.resource);
+    var notificationSocket = new WebSocket('wss://' + wsUrl + '/ws/notification/' + slot_id + '/?utm_source=' + self.options.Websockets.utm + '&resource_link_id=' + self.options.Websockets.resource + (self.options.Websockets.ticket ? '&ticket=' + self.options.Websockets.ticket : ''));
     return notificationSocket;
   };
 
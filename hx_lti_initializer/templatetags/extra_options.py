@@ -1,6 +1,7 @@
 from django import template
 from django.conf import settings
 from django.template import Library
+from hx_lti_assignment.models import parse_target_options
 from target_object_database.models import get_extension
 
 register = Library()
@@ -8,80 +9,32 @@ register = Library()
 
 @register.filter_function
 def just_the_view_type(extra_options):
-    if extra_options is None:
-        return "ImageView"
-    result = extra_options.split(",")
-    if len(result) < 2:
-        return "ImageView"
-    else:
-        return result[0].strip()
+    return parse_target_options(extra_options).view_type
 
 
 @register.filter_function
 def just_the_canvas_id(extra_options):
-    if extra_options is None:
-        return ""
-    result = extra_options.split(",")
-    if len(result) < 2:
-        return ""
-    else:
-        return result[1].strip()
+    return parse_target_options(extra_options).canvas_id or ""
 
 
 @register.filter_function
 def just_dashboard_hidden(extra_options):
-    if extra_options is None:
-        return False
-    result = extra_options.split(",")
-    if len(result) < 3:
-        return False
-    else:
-        if result[2].strip() == "true":
-            return True
-        else:
-            return False
+    return parse_target_options(extra_options).dashboard_hidden
 
 
 @register.filter_function
 def just_transcript_hidden(extra_options):
-    if extra_options is None:
-        return False
-    result = extra_options.split(",")
-    if len(result) < 4:
-        return False
-    else:
-        if result[3].strip() == "true":
-            return True
-        else:
-            return False
+    return parse_target_options(extra_options).transcript_hidden
 
 
 @register.filter_function
 def just_transcript_download(extra_options):
-    if extra_options is None:
-        return False
-    result = extra_options.split(",")
-    if len(result) < 5:
-        return False
-    else:
-        if result[4].strip() == "true":
-            return True
-        else:
-            return False
+    return parse_target_options(extra_options).transcript_download
 
 
 @register.filter_function
 def just_video_download(extra_options):
-    if extra_options is None:
-        return False
-    result = extra_options.split(",")
-    if len(result) < 6:
-        return False
-    else:
-        if result[5].strip() == "true":
-            return True
-        else:
-            return False
+    return parse_target_options(extra_options).video_download
 
 
 @register.tag(name="captureas")
@@ -9,6 +9,9 @@ import re
 import sys
 import time
 import urllib
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from os.path import basename, splitext
 from urllib.parse import urlparse
 
@@ -20,15 +23,25 @@ from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
 from django.urls import reverse
+from hxat.jsonstream import JsonArrayStream
 
 # import Sample Target Object Model
-from hx_lti_assignment.models import Assignment
-from target_object_database.models import TargetObject
+from hx_lti_assignment.models import Assignment, CourseTargets
 
 from .models import *
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_FETCH_DEFAULTS = {
+    "page_size": 1000,
+    "max_annotations": 20000,
+    "concurrency": 4,
+    "timeout": 10,
+}
+
+# what can go wrong fetching a page of annotations
+FETCH_ANNOTATIONS_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
 
 @transaction.atomic
 def create_new_user(
@@ -222,34 +235,343 @@ def fetch_annotations_by_course(context_id, user_id):
     but it's possible that this assumption could change by the simple fact that the settings
     are saved on assignment models, and not on course models.
 
-    Returns: [{"rows": [], "totalCount": 0 }]
+    Annotations are fetched in pages of HXAT_DASHBOARD_FETCH["page_size"], up to
+    "max_annotations" per database, with at most "concurrency" requests in flight
+    across pages and databases.
+
+    Replies get the "parent_text" of their parent when it is among the rows, on
+    any page; parents past "max_annotations", or on a page that failed, are not
+    fetched (catchpy search is not known to filter on annotation ids).
+
+    Returns: {"rows": [], "totalCount": 0, "truncated": False, "errors": [],
+    "annotation_by_id": {}} where "truncated" is set if a database has more
+    annotations than "max_annotations", "errors" has a message for each page
+    that could not be fetched, and "annotation_by_id" has the rows by id.
     """
-    annotation_db_credentials = get_annotation_db_credentials_by_course(context_id)
+    config = dict(DASHBOARD_FETCH_DEFAULTS)
+    config.update(getattr(settings, "HXAT_DASHBOARD_FETCH", {}))
+    page_size = config["page_size"]
+    max_annotations = config["max_annotations"]
 
-    results = {"rows": [], "totalCount": 0}
-    for credential in annotation_db_credentials:
+    databases = []
+    for credential in get_annotation_db_credentials_by_course(context_id):
         db_url = credential["annotation_database_url"].strip()
         db_apikey = credential["annotation_database_apikey"]
         db_secret = credential["annotation_database_secret_token"]
-        annotator_auth_token = retrieve_token(user_id, db_apikey, db_secret)
+        databases.append((db_url, retrieve_token(user_id, db_apikey, db_secret)))
+
+    def fetch_page(db_url, annotator_auth_token, offset, limit):
         logger.debug(
-            "Fetching annotations with context_id=%s database_url=%s"
-            % (context_id, db_url)
+            "Fetching annotations with context_id=%s database_url=%s offset=%s"
+            % (context_id, db_url, offset)
+        )
+        return _fetch_annotations_by_course(
+            context_id,
+            db_url,
+            annotator_auth_token,
+            limit=limit,
+            offset=offset,
+            timeout=config["timeout"],
         )
-        data = _fetch_annotations_by_course(context_id, db_url, annotator_auth_token)
-        # logger.debug("Annotations fetched: %s" % data)
-        if "rows" in data:
-            results["rows"] += data["rows"]
-        if "totalCount" in data:
-            results["totalCount"] += int(data["totalCount"])
+
+    results = {"rows": [], "totalCount": 0, "truncated": False, "errors": []}
+
+    def page_failed(db_url, offset, e):
+        message = "failed to fetch annotations from {} at offset {}: {}".format(
+            db_url, offset, e
+        )
+        logger.error(message)
+        results["errors"].append(message)
+
+    with ThreadPoolExecutor(max_workers=max(1, config["concurrency"])) as executor:
+        first_pages = [
+            (
+                db_url,
+                token,
+                executor.submit(
+                    fetch_page, db_url, token, 0, min(page_size, max_annotations)
+                ),
+            )
+            for db_url, token in databases
+        ]
+        # the first page of each database tells how many pages follow
+        pages = []  # (db_url, offset, future), in the order of their rows
+        for db_url, token, future in first_pages:
+            try:
+                data = future.result()
+            except FETCH_ANNOTATIONS_ERRORS as e:
+                page_failed(db_url, 0, e)
+                continue
+            pages.append((db_url, 0, future))
+            total = int(data["totalCount"])
+            results["totalCount"] += total
+            if total > max_annotations:
+                results["truncated"] = True
+                logger.warning(
+                    "fetching only %s of %s annotations with context_id=%s database_url=%s"
+                    % (max_annotations, total, context_id, db_url)
+                )
+            last = min(total, max_annotations)
+            for offset in range(page_size, last, page_size):
+                pages.append(
+                    (
+                        db_url,
+                        offset,
+                        executor.submit(
+                            fetch_page,
+                            db_url,
+                            token,
+                            offset,
+                            min(page_size, last - offset),
+                        ),
+                    )
+                )
+        for db_url, offset, future in pages:
+            try:
+                results["rows"] += future.result()["rows"]
+            except FETCH_ANNOTATIONS_ERRORS as e:
+                page_failed(db_url, offset, e)
+
+    # replies and their parents can be on different pages
+    annotation_by_id = get_annotations_keyed_by_annotation_id(results)
+    add_parent_text(results["rows"], annotation_by_id)
+    results["annotation_by_id"] = annotation_by_id
     return results
 
 
+class AnnotationRow(Mapping):
+    """
+    An annotation in the dashboard format (see format_catchpy_annotation). It
+    reads like the dict it replaces, and compares equal to it, but keeps its
+    fields in slots: a fraction of the memory of a dict, for courses with a
+    lot of annotations. The optional fields (thumb, rangePosition, bounds,
+    parent_text) are only in the row once set.
+    """
+
+    __slots__ = (
+        "id",
+        "created",
+        "updated",
+        "text",
+        "permissions",
+        "user",
+        "totalComments",
+        "tags",
+        "parent",
+        "ranges",
+        "contextId",
+        "collectionId",
+        "uri",
+        "media",
+        "quote",
+        "manifest_url",
+        "thumb",
+        "rangePosition",
+        "bounds",
+        "parent_text",
+    )
+    fields = frozenset(__slots__)
+
+    def __init__(self, **kwargs):
+        for name, value in kwargs.items():
+            self[name] = value
+
+    def __getitem__(self, name):
+        if name not in self.fields:
+            raise KeyError(name)
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name not in self.fields:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __iter__(self):
+        return (name for name in self.__slots__ if hasattr(self, name))
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def __repr__(self):
+        return "AnnotationRow({!r})".format(dict(self))
+
+
+def share_row_values(row, shared):
+    """
+    Makes `row` use the objects recorded in `shared` for the values that
+    repeat from row to row (course, assignment and target ids, user and
+    permissions), and records its own for the next rows. The values of rows
+    sharing them must then not be changed in place.
+    """
+    for name in ("contextId", "collectionId", "uri", "media", "manifest_url"):
+        row[name] = shared.setdefault(row[name], row[name])
+    try:
+        user_key = ("user",) + tuple(sorted(row["user"].items()))
+        row["user"] = shared.setdefault(user_key, row["user"])
+        permissions_key = ("permissions",) + tuple(
+            (name, tuple(value)) for name, value in sorted(row["permissions"].items())
+        )
+        row["permissions"] = shared.setdefault(permissions_key, row["permissions"])
+    except (AttributeError, TypeError):
+        # not in the expected shape, and not worth sharing
+        pass
+
+
+def format_catchpy_annotation(annote):
+    """
+    Transforms an annotation in catchpy v2 (webannotation) format into the flat
+    format used by the instructor dashboard, as an AnnotationRow. Raises KeyError
+    if the annotation is missing required fields or has no supported target
+    media type.
+    """
+    # look up index for correct nested catchpy object with accepted types due to uncertain order of dict in list
+    index_of_target_items = find_target_object_index(annote["target"]["items"])
+    if index_of_target_items is None:
+        raise KeyError(f"media type")
+    id = annote['id']
+    text = annote["body"]["items"][0]["value"]
+    created = annote["created"]
+    updated = annote["modified"]
+    text = text
+    permissions = annote["permissions"]
+    user = annote["creator"]
+    totalComments = annote["totalReplies"]
+    tags = []
+    parent = "0"
+    ranges = []
+    contextId = annote["platform"]["context_id"]
+    collectionId = annote["platform"]["collection_id"]
+    uri = annote["platform"]["target_source_id"]
+    media =  annote["target"]["items"][index_of_target_items]["type"].lower()
+    target_items = annote["target"]["items"]
+    quote = ""
+    formatted = {
+        "id": id,
+        "created": created,
+        "updated": updated,
+        "text": text,
+        "permissions": permissions,
+        "user": user,
+        "totalComments": totalComments,
+        "tags": tags,
+        "parent": parent,
+        "ranges": ranges,
+        "contextId": contextId,
+        "collectionId": collectionId,
+        "uri": uri,
+        "media": media,
+        "quote": quote,
+        # added manifest_url for better matching in get_target_id
+        "manifest_url": ""
+    }
+    if "selector" in target_items[index_of_target_items]:
+        for item in target_items[index_of_target_items]["selector"]["items"]:
+            if "type" in item and item["type"] == "TextQuoteSelector":
+                formatted["quote"] = item["exact"]
+    # check if the annotation has a parent text
+    # parent id is written to "parent" key
+    if target_items[index_of_target_items]["type"] == "Annotation":
+        formatted["parent"] = target_items[index_of_target_items]["source"]
+
+    # check images annotation fields
+    if media == "image":
+        # not guarenteed correct order
+        if index_of_target_items == 1 and target_items[0]["type"] == "Thumbnail":
+            formatted["thumb"] = target_items[0]["source"]
+        elif target_items[1]["type"] == "Thumbnail":
+            formatted["thumb"] = target_items[1]["source"]
+        if "selector" in target_items[index_of_target_items]:
+            formatted["rangePosition"] = target_items[index_of_target_items]["selector"]["items"]
+            # added field for image manifest for lookup in get_target_id function
+            bounds = ""
+            # Data structure is different between old highlighter and new highlighter e.g. newhighlighter assignment data does not have scope field
+            if "type" in formatted['rangePosition'][0]:
+                formatted["manifest_url"] = target_items[index_of_target_items]["source"]
+                bounds = formatted['rangePosition'][0]["value"]
+            else:    
+                formatted["manifest_url"] = formatted["rangePosition"][0]["within"]["@id"]
+                bounds = target_items[index_of_target_items]["scope"]["value"]
+            formatted_bounds = bounds.split("=")[1].split(',')
+            x, y, width, height = formatted_bounds
+            formatted["bounds"] = {
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+            }
+
+    return AnnotationRow(**formatted)
+
+
+def dashboard_row(
+    annotation, assignment_name, target_object_name, target_preview_url, parent_text=None
+):
+    """
+    Compact, display-ready version of a dashboard annotation (as returned by
+    format_catchpy_annotation), with the same columns as the rows in
+    dashboard_student_list_view.html. Used for live dashboard updates.
+    """
+    from hx_lti_initializer.templatetags.hx_lti_initializer_extras import (
+        format_date,
+        format_tags,
+    )
+
+    return {
+        "id": annotation["id"],
+        "user_id": annotation["user"]["id"],
+        "user_name": annotation["user"].get("name", ""),
+        "date": format_date(annotation["updated"]),
+        "assignment_name": assignment_name,
+        "target_object_name": target_object_name,
+        "target_preview_url": target_preview_url,
+        "media": annotation["media"],
+        "quote": annotation["quote"],
+        "thumb": annotation.get("thumb", ""),
+        "parent": annotation["parent"],
+        "parent_text": parent_text,
+        "text": annotation["text"],
+        "tags": format_tags(annotation["tags"]),
+    }
+
+
 def _fetch_annotations_by_course(
     context_id, annotation_db_url, annotator_auth_token, **kwargs
 ):
     """
-    Fetches the annotations of a given course from the CATCH database
+    Fetches the annotations of a given course from the CATCH database, one
+    page of `limit` annotations from `offset`. Raises on request errors and on
+    responses that are not a list of annotations.
+    """
+    response_info = {}
+    formatted_annotations = list(
+        iter_annotations_by_course(
+            context_id,
+            annotation_db_url,
+            annotator_auth_token,
+            response_info=response_info,
+            **kwargs
+        )
+    )
+    return {
+        "totalCount": response_info["total"] or 0,
+        "rows": formatted_annotations,
+    }
+
+
+def iter_annotations_by_course(
+    context_id, annotation_db_url, annotator_auth_token, response_info=None, **kwargs
+):
+    """
+    Yields the annotations of a given course from the CATCH database, in the
+    dashboard format (see format_catchpy_annotation), as they are read from
+    the response: the response is never held in memory as a whole. Its other
+    members (such as "total") are put in `response_info`.
+
+    Takes the same `limit`, `offset` and `timeout` as
+    _fetch_annotations_by_course.
     """
     # build request
     headers = {
@@ -257,142 +579,72 @@ def _fetch_annotations_by_course(
         "Content-Type": "application/json",
     }
     limit = kwargs.get("limit", 1000)  # Note: -1 means get everything there is
+    offset = kwargs.get("offset", 0)
+    timeout = kwargs.get("timeout", DASHBOARD_FETCH_DEFAULTS["timeout"])
     encoded_context_id = urllib.parse.quote_plus(context_id)
     request_url = "%s/?context_id=%s&limit=%s" % (
         annotation_db_url,
         encoded_context_id,
         limit,
     )
+    if offset:
+        request_url += "&offset=%s" % offset
 
     logger.debug("fetch_annotations_by_course(): url: %s" % request_url)
 
     # make request
     request_start_time = time.perf_counter()
-    r = requests.get(request_url, headers=headers)
-    request_end_time = time.perf_counter()
-    request_elapsed_time = request_end_time - request_start_time
-
-    logger.debug(
-        "fetch_annotations_by_course(): annotation database response code: %s"
-        % r.status_code
-    )
-    logger.debug(
-        "fetch_annotations_by_course(): request time elapsed: %s seconds"
-        % (request_elapsed_time)
-    )
-
-    try:
-        # this gets the whole request, including such things as 'count'
-        # however, that also means that the annotations come in as an object called 'rows,'
-        # where each row represents an annotation object.
-        # if more convenient, we could cut the top level and just return flat annotations.
-        annotations = r.json()
-        # Transform data body because we are hitting a v2 catchpy endpoint
-        formatted_annotations = []
-        parents_text_dict = {}
-        total = annotations["total"] or 0
-        result = {
-            "totalCount": total
-        }
+    with requests.get(
+        request_url, headers=headers, timeout=timeout, stream=True
+    ) as r:
+        request_end_time = time.perf_counter()
+        request_elapsed_time = request_end_time - request_start_time
 
+        logger.debug(
+            "fetch_annotations_by_course(): annotation database response code: %s"
+            % r.status_code
+        )
+        logger.debug(
+            "fetch_annotations_by_course(): response time elapsed: %s seconds"
+            % (request_elapsed_time)
+        )
+        r.raise_for_status()
+
+        # the response is an object with the annotations in 'rows', along with
+        # such things as 'total'. rows are parsed one at a time, and transformed
+        # as they come because we are hitting a v2 catchpy endpoint
+        r.encoding = r.encoding or "utf-8"
+        annotations = JsonArrayStream(
+            r.iter_content(chunk_size=65536, decode_unicode=True), "rows"
+        )
         #Note: there are other fields i left out since it did not seem to be required for what we need 
-        for annote in annotations["rows"]:
-            # add text to parent_text_dict text dict for quick lookup
+        shared = {}
+        for annote in annotations:
             try:
-                # look up index for correct nested catchpy object with accepted types due to uncertain order of dict in list
-                index_of_target_items = find_target_object_index(annote["target"]["items"])
-                if index_of_target_items is None:
-                    raise KeyError(f"media type")
-                id = annote['id']
-                text = annote["body"]["items"][0]["value"]
-                parents_text_dict[id] = text
-                created = annote["created"]
-                updated = annote["modified"]
-                text = text
-                permissions = annote["permissions"]
-                user = annote["creator"]
-                totalComments = annote["totalReplies"]
-                tags = []
-                parent = "0"
-                ranges = []
-                contextId = annote["platform"]["context_id"]
-                collectionId = annote["platform"]["collection_id"]
-                uri = annote["platform"]["target_source_id"]
-                media =  annote["target"]["items"][index_of_target_items]["type"].lower()
-                target_items = annote["target"]["items"]
-                quote = ""
-                formatted = {
-                    "id": id,
-                    "created": created,
-                    "updated": updated,
-                    "text": text,
-                    "permissions": permissions,
-                    "user": user,
-                    "totalComments": totalComments,
-                    "tags": tags,
-                    "parent": parent,
-                    "ranges": ranges,
-                    "contextId": contextId,
-                    "collectionId": collectionId,
-                    "uri": uri,
-                    "media": media,
-                    "quote": quote,
-                    # added manifest_url for better matching in get_target_id
-                    "manifest_url": ""
-                }
-                if "selector" in target_items[index_of_target_items]:
-                    for item in target_items[index_of_target_items]["selector"]["items"]:
-                        if "type" in item and item["type"] == "TextQuoteSelector":
-                            formatted["quote"] = item["exact"]
-                # check if the annotation has a parent text
-                # parent id is written to "parent" key
-                if target_items[index_of_target_items]["type"] == "Annotation":
-                    formatted["parent"] = target_items[index_of_target_items]["source"]
-
-                # check images annotation fields
-                if media == "image":
-                    # not guarenteed correct order
-                    if index_of_target_items == 1 and target_items[0]["type"] == "Thumbnail":
-                        formatted["thumb"] = target_items[0]["source"]
-                    elif target_items[1]["type"] == "Thumbnail":
-                        formatted["thumb"] = target_items[1]["source"]
-                    if "selector" in target_items[index_of_target_items]:
-                        formatted["rangePosition"] = target_items[index_of_target_items]["selector"]["items"]
-                        # added field for image manifest for lookup in get_target_id function
-                        bounds = ""
-                        # Data structure is different between old highlighter and new highlighter e.g. newhighlighter assignment data does not have scope field
-                        if "type" in formatted['rangePosition'][0]:
-                            formatted["manifest_url"] = target_items[index_of_target_items]["source"]
-                            bounds = formatted['rangePosition'][0]["value"]
-                        else:    
-                            formatted["manifest_url"] = formatted["rangePosition"][0]["within"]["@id"]
-                            bounds = target_items[index_of_target_items]["scope"]["value"]
-                        formatted_bounds = bounds.split("=")[1].split(',')
-                        x, y, width, height = formatted_bounds
-                        formatted["bounds"] = {
-                            "x": x,
-                            "y": y,
-                            "width": width,
-                            "height": height,
-                        }
-
-                formatted_annotations.append(formatted)
+                formatted = format_catchpy_annotation(annote)
             except KeyError as e:
                 logger.warning(f"key error={e}")
-        # Loop through the formatted_annotations and add parent_text if parent !=0
-        for formatted_annote in formatted_annotations:
-            if formatted_annote["parent"] is not "0":
-                id = formatted_annote["parent"]
-                formatted_annote["parent_text"] = parents_text_dict[id]
-        result["rows"] =  formatted_annotations
-    except KeyError as ke:
-        logger.error(f"missing {ke} field in response body")
-    except:
-        # If there are no annotations, the database should return a dictionary with empty rows,
-        # but in the event of another exception such as an authentication error, fail
-        # gracefully by manually passing in that empty response
-        annotations = {"rows": [], "totalCount": 0} 
-    return result
+                continue
+            share_row_values(formatted, shared)
+            yield formatted
+        if not annotations.found:
+            raise KeyError("rows")
+        if response_info is not None:
+            response_info.update(annotations.members)
+
+
+def add_parent_text(annotations, annotation_by_id=None):
+    """
+    Sets "parent_text" on the replies among the given formatted annotations
+    whose parent is in `annotation_by_id` (by default, among them too).
+    """
+    if annotation_by_id is None:
+        annotation_by_id = {annote["id"]: annote for annote in annotations}
+    for formatted_annote in annotations:
+        if formatted_annote["parent"] != "0":
+            parent = annotation_by_id.get(formatted_annote["parent"])
+            if parent is not None:
+                formatted_annote["parent_text"] = parent["text"]
 
 
 def get_distinct_users_from_annotations(annotations, sort_key=None):
@@ -453,6 +705,18 @@ def get_annotations_keyed_by_user_id(annotations):
     return annotations_by_user
 
 
+def get_annotation_positions_by_user(annotations):
+    """
+    Given a set of annotation objects returned by the CATCH database,
+    this function returns a dictionary that maps user IDs to the positions
+    of their annotations in annotations["rows"], as arrays of ints.
+    """
+    positions_by_user = {}
+    for position, r in enumerate(annotations["rows"]):
+        positions_by_user.setdefault(r["user"]["id"], array("I")).append(position)
+    return positions_by_user
+
+
 def get_annotations_keyed_by_annotation_id(annotations):
     """
     Given a set of annotation objects returned by the CATCH database,
@@ -467,6 +731,30 @@ def get_annotations_keyed_by_annotation_id(annotations):
     return dict([(r["id"], r) for r in rows])
 
 
+class DashboardEntry(object):
+    """
+    An annotation as listed on the instructor dashboard, with the names and
+    links it is shown with (see dashboard_student_list_view.html).
+    """
+
+    __slots__ = (
+        "data",
+        "assignment_name",
+        "target_preview_url",
+        "target_object_name",
+        "parent_text",
+    )
+
+    def __init__(
+        self, data, assignment_name, target_preview_url, target_object_name, parent_text
+    ):
+        self.data = data
+        self.assignment_name = assignment_name
+        self.target_preview_url = target_preview_url
+        self.target_object_name = target_object_name
+        self.parent_text = parent_text
+
+
 class DashboardAnnotations(object):
     """
     This class is used to transform annotations retrieved from the CATCH DB into
@@ -484,9 +772,8 @@ class DashboardAnnotations(object):
     Notes:
 
     This class is designed to minimize database hits by loading data up front.
-    The assumption is that the number of assignments and target objects in the tool
-    is going to be small compared to the number of annotations, so the memory use
-    should be negligible.
+    Only the assignments and target objects of the course are loaded, and they
+    are cached per course (see hx_lti_assignment.models.CourseTargets).
     """
 
     def __init__(self, request, annotations):
@@ -494,16 +781,20 @@ class DashboardAnnotations(object):
         self.annotations = annotations
         self.annotation_by_id = self.get_annotations_by_id()
         self.distinct_users = self.get_distinct_users()
+        self.course_targets = CourseTargets.get(request.LTI["hx_context_id"])
         self.assignment_name_of = self.get_assignments_dict()
         self.target_objects_list = self.get_target_objects_list()
         self.target_objects_by_id = {str(x["id"]): x for x in self.target_objects_list}
         self.target_objects_by_content = {
-            x.get("target_content", "").strip(): x
+            x["manifest_url"].strip(): x
             for x in self.target_objects_list
             if x["target_type"] == "ig"
         }
         self.preview_url_cache = {}
     def get_annotations_by_id(self):
+        # fetch_annotations_by_course indexes the rows along with their parents
+        if "annotation_by_id" in self.annotations:
+            return self.annotations["annotation_by_id"]
         return get_annotations_keyed_by_annotation_id(self.annotations)
 
     def get_distinct_users(self):
@@ -511,36 +802,36 @@ class DashboardAnnotations(object):
         return get_distinct_users_from_annotations(self.annotations, sort_key)
 
     def get_assignments_dict(self,):
-        return dict(Assignment.objects.values_list("assignment_id", "assignment_name"))
+        return self.course_targets.assignment_names
 
     def get_target_objects_list(self):
-        return TargetObject.objects.values(
-            "id", "target_title", "target_content", "target_type"
-        )
+        return self.course_targets.target_objects
 
     def get_annotations_by_user(self):
-        annotations_by_user = get_annotations_keyed_by_user_id(self.annotations)
+        rows = self.annotations["rows"]
+        positions_by_user = get_annotation_positions_by_user(self.annotations)
         users = []
         for user in self.distinct_users:
             user_id = user["id"]
             user_name = user["name"]
             annotations = []
-            for annotation in annotations_by_user[user_id]:
+            for position in positions_by_user[user_id]:
+                annotation = rows[position]
                 if self.assignment_object_exists(annotation):
                     annotations.append(
-                        {
-                            "data": annotation,
-                            "assignment_name": self.get_assignment_name(annotation),
-                            "target_preview_url": self.get_target_preview_url(
+                        DashboardEntry(
+                            data=annotation,
+                            assignment_name=self.get_assignment_name(annotation),
+                            target_preview_url=self.get_target_preview_url(
                                 annotation
                             ),
-                            "target_object_name": self.get_target_object_name(
+                            target_object_name=self.get_target_object_name(
                                 annotation
                             ),
-                            "parent_text": self.get_annotation_parent_value(
+                            parent_text=self.get_annotation_parent_value(
                                 annotation, "text"
                             ),
-                        }
+                        )
                     )
             if len(annotations) > 0:
                 users.append(
@@ -663,11 +954,16 @@ class DashboardAnnotations(object):
         return None
 
 def find_target_object_index(anno_target_items):
-    # note: left out "Thumbnail" and "Annotations"
+    # note: left out "Thumbnail", and "Annotation" unless there is nothing else
     # help with finding the correct types in the data response
     # TODO: add to constants?
     accepted_catchpy_types = ["Image", "Audio", "Image", "Text", "Video"]
     for index, d in enumerate(anno_target_items):
         if d["type"] in accepted_catchpy_types:
             return index
+    # replies target only the annotation they reply to: they are listed in the
+    # dashboard (and counted per student) along with the annotations
+    for index, d in enumerate(anno_target_items):
+        if d["type"] == "Annotation":
+            return index
     return None
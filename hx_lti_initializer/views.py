@@ -35,6 +35,7 @@ from hx_lti_initializer.utils import (
     save_session,
 )
 from lti import ToolConfig
+from notification.tickets import clean_id, mint_ticket
 from target_object_database.models import TargetObject
 
 try:
@@ -54,6 +55,26 @@ logger = logging.getLogger(__name__)
 class PlatformError(Exception):
     pass
 
+
+def _add_pending_admin(course_object, lti_profile, course_id):
+    """
+    Makes the user a course admin if an instructor added them as a pending admin.
+    """
+    if course_object is None or lti_profile is None:
+        return
+    # a single delete query when there is nothing pending, the common case
+    deleted, _ = LTICourseAdmin.objects.filter(
+        admin_unique_identifier=lti_profile.user.username,
+        new_admin_course_id=course_id,
+    ).delete()
+    if deleted:
+        course_object.add_admin(lti_profile)
+        logger.info(
+            "CourseAdmin Pending found: {} for course {}".format(
+                lti_profile.user.username, course_id
+            )
+        )
+
 @csrf_exempt
 def launch_lti(request):
     """
@@ -100,6 +121,8 @@ def launch_lti(request):
 
     # default to student
     save_session(request, is_staff=False)
+    lti_profile = None
+    course_object = None
 
     # this is where canvas will tell us what level individual is coming into
     # the tool the 'roles' field usually consists of just 'Instructor'
@@ -123,7 +146,9 @@ def launch_lti(request):
     # This handles the rare case in which we have neither display name nor external user id
     if not (display_name or external_user_id):
         try:
-            lti_profile = LTIProfile.objects.get(anon_id=str(course))
+            lti_profile = LTIProfile.objects.select_related("user").get(
+                anon_id=str(course)
+            )
         except LTIProfile.DoesNotExist:
             logger.error("username({}) not found for context({})".format(course, context_label))
             raise PermissionDenied("username not found in LTI launch")
@@ -145,10 +170,13 @@ def launch_lti(request):
     logger.debug("DEBUG - user name: " + display_name)
 
     # Check whether user is a admin, instructor or teaching assistant
-    if set(roles) & set(settings.ADMIN_ROLES):
+    is_admin = bool(set(roles) & set(settings.ADMIN_ROLES))
+    if is_admin:
         try:
             # See if the user already has a profile, and use it if so.
-            lti_profile = LTIProfile.objects.get(anon_id=user_id)
+            lti_profile = LTIProfile.objects.select_related("user").get(
+                anon_id=user_id
+            )
             logger.debug("DEBUG - LTI Profile was found via anonymous id.")
         except LTIProfile.DoesNotExist:
             # if it's a new user (profile doesn't exist), set up and save a new LTI Profile
@@ -214,7 +242,7 @@ def launch_lti(request):
         message_error = "Sorry, the course you are trying to reach does not exist."
         messages.error(request, message_error)
 
-        if set(roles) & set(settings.ADMIN_ROLES):
+        if is_admin:
             # This must be the instructor's first time accessing the annotation tool
             # Make him/her a new course within the tool
 
@@ -244,9 +272,18 @@ def launch_lti(request):
             )
         else:
             logger.info("Course not created because user does not have an admin role")
+
+    if is_admin:
+        _add_pending_admin(course_object, lti_profile, course)
+
+    # the annotation target to open, if any. it is opened after picking it, so
+    # that errors opening it are not taken for a missing or invalid target
+    target = None
     try:
         logger.debug("DEBUG *-* resource_link_id={}".format(resource_link_id))
-        config = LTIResourceLinkConfig.objects.get(resource_link_id=resource_link_id)
+        config = LTIResourceLinkConfig.objects.select_related(
+            "assignment_target__assignment"
+        ).get(resource_link_id=resource_link_id)
         collection_id = config.assignment_target.assignment.assignment_id
         object_id = config.assignment_target.target_object_id
         logger.debug(
@@ -254,28 +291,10 @@ def launch_lti(request):
             % (resource_link_id, collection_id, object_id)
         )
         course_id = str(course)
-        if set(roles) & set(settings.ADMIN_ROLES):
-            try:
-                userfound = LTICourseAdmin.objects.get(
-                    admin_unique_identifier=lti_profile.user.username,
-                    new_admin_course_id=course,
-                )
-                course_object.add_admin(lti_profile)
-                logger.info("CourseAdmin Pending found: %s" % userfound)
-                userfound.delete()
-            except Exception as e:
-                logger.info("Not waiting to be added as Admin: {}".format(e))
         logger.debug(
             "DEBUG - User wants to go directly to annotations for a specific target object using UI"
         )
-        url = reverse(
-            "hx_lti_initializer:access_annotation_target",
-            args=[course_id, collection_id, object_id],
-        )
-        url += "?resource_link_id={}&utm_source={}".format(
-            resource_link_id, request.session.session_key
-        )
-        return redirect(url)
+        target = (course_id, collection_id, object_id)
     except AnnotationTargetDoesNotExist as e:
         logger.warning("Could not access annotation target using resource config.")
         logger.info("Deleting resource config because it is invalid.")
@@ -304,49 +323,22 @@ def launch_lti(request):
                     logger.debug("no assignment object")
                     raise Exception("Assignment object not specified")
             course_id = str(course)
-            if set(roles) & set(settings.ADMIN_ROLES):
-                try:
-                    userfound = LTICourseAdmin.objects.get(
-                        admin_unique_identifier=lti_profile.user.username,
-                        new_admin_course_id=course,
-                    )
-                    course_object.add_admin(lti_profile)
-                    logger.info("CourseAdmin Pending found: %s" % userfound)
-                    userfound.delete()
-                except Exception as e:
-                    logger.info(
-                        "Not waiting to be added as admin: {}".format(e), exc_info=False
-                    )
             logger.debug(
                 "DEBUG - User wants to go directly to annotations for a specific target object({}--{}--{}".format(
                     course_id, assignment_id, object_id
                 )
             )
-            url = reverse(
-                "hx_lti_initializer:access_annotation_target",
-                args=[course_id, assignment_id, object_id],
-            )
-            url += "?resource_link_id={}&utm_source={}".format(
-                resource_link_id, request.session.session_key
-            )
-            return redirect(url)
+            target = (course_id, assignment_id, object_id)
         except Exception as e:
             logger.debug(
                 "DEBUG - User wants the index: {} --- {}".format(type(e), e),
                 exc_info=False,
             )
 
-    try:
-        userfound = LTICourseAdmin.objects.get(
-            admin_unique_identifier=lti_profile.user.username,
-            new_admin_course_id=course,
-        )
-        course_object.add_admin(lti_profile)
-        logger.info("CourseAdmin Pending found: %s" % userfound)
-        userfound.delete()
-    except Exception as e:
-        logger.debug(
-            "DEBUG - Not waiting to be added as admin: {}".format(e), exc_info=False
+    if target is not None:
+        course_id, assignment_id, object_id = target
+        return _open_annotation_target(
+            request, course_id, assignment_id, object_id, resource_link_id
         )
 
     url = reverse(
@@ -357,6 +349,40 @@ def launch_lti(request):
     return redirect(url)
 
 
+def _open_annotation_target(
+    request, course_id, assignment_id, object_id, resource_link_id
+):
+    """
+    Redirects the launch to the annotation target or, with
+    HXAT_LAUNCH_DIRECT_RENDER, renders it in the launch response and saves
+    the browser the second request.
+    """
+    url = "{}?resource_link_id={}&utm_source={}".format(
+        reverse(
+            "hx_lti_initializer:access_annotation_target",
+            args=[course_id, assignment_id, object_id],
+        ),
+        resource_link_id,
+        request.session.session_key,
+    )
+    if not getattr(settings, "HXAT_LAUNCH_DIRECT_RENDER", False):
+        return redirect(url)
+
+    # the page gets the same params as when redirected; and replaces the
+    # launch url in the browser, so that a reload does not post the launch again
+    return _render_annotation_target(
+        request,
+        course_id,
+        assignment_id,
+        object_id,
+        page_params={
+            "resource_link_id": resource_link_id,
+            "utm_source": request.session.session_key,
+        },
+        page_url=url,
+    )
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def embed_lti(request):
@@ -607,16 +633,44 @@ def access_annotation_target(
     """
     Renders an assignment page
     """
+    return _render_annotation_target(
+        request,
+        course_id,
+        assignment_id,
+        object_id,
+        page_params=request.GET.dict(),
+        user_id=user_id,
+        user_name=user_name,
+        roles=roles,
+    )
+
+
+def _render_annotation_target(
+    request,
+    course_id,
+    assignment_id,
+    object_id,
+    page_params,
+    page_url=None,
+    user_id=None,
+    user_name=None,
+    roles=None,
+):
+    """
+    Renders an assignment page, with `page_params` (resource_link_id,
+    utm_source...) in its context; and `page_url` as the url to show in
+    the browser, if not the one requested.
+    """
     if user_id is None:
         user_name = request.LTI["hx_user_name"]
         user_id = request.LTI["hx_user_id"]
         roles = request.LTI["hx_roles"]
     try:
         assignment = Assignment.objects.get(assignment_id=assignment_id)
-        targ_obj = TargetObject.objects.get(pk=object_id)
-        assignment_target = AssignmentTargets.objects.get(
-            assignment=assignment, target_object=targ_obj
-        )
+        assignment_target = AssignmentTargets.objects.select_related(
+            "target_object"
+        ).get(assignment=assignment, target_object_id=object_id)
+        targ_obj = assignment_target.target_object
         object_uri = targ_obj.get_target_content_uri()
         course_obj = LTICourse.objects.get(course_id=course_id)
     except Assignment.DoesNotExist or TargetObject.DoesNotExist:
@@ -676,6 +730,9 @@ def access_annotation_target(
         "instructions": assignment_target.target_instructions,
         "abstract_db_url": abstract_db_url,
         "session": request.session.session_key,
+        "ws_ticket": mint_ticket(
+            user_id, course_id, assignment_id, object_id, is_staff=is_instructor
+        ),
         "org": settings.ORGANIZATION,
         "logger_url": settings.ANNOTATION_LOGGER_URL,
         "accessibility": settings.ACCESSIBILITY,
@@ -683,12 +740,18 @@ def access_annotation_target(
         "is_graded": request.LTI["launch_params"].get("lis_outcome_service_url", None)
         is not None,
     }
-    if not assignment.object_before(object_id) is None:
-        original["prev_object"] = assignment.object_before(object_id)
+    navigation = assignment.get_navigation()
+    original["navigation_count"] = len(navigation)
+    if navigation.position(object_id) is not None:
+        original["navigation_position"] = navigation.position(object_id) + 1
+    prev_object_id = navigation.before(object_id)
+    if prev_object_id is not None:
+        original["prev_object_id"] = prev_object_id
         original["assignment_target"] = assignment_target
 
-    if not assignment.object_after(object_id) is None:
-        original["next_object"] = assignment.object_after(object_id)
+    next_object_id = navigation.after(object_id)
+    if next_object_id is not None:
+        original["next_object_id"] = next_object_id
         original["assignment_target"] = assignment_target
 
     if targ_obj.target_type == "vd":
@@ -702,35 +765,12 @@ def access_annotation_target(
         original.update({"typeSource": typeSource})
     elif targ_obj.target_type == "ig":
         original.update({"osd_json": targ_obj.target_content})
-        viewtype = assignment_target.get_view_type_for_mirador()
-        canvas_id = assignment_target.get_canvas_id_for_mirador()
-        logger.debug("CANVAS: %s" % canvas_id)
-
-        if viewtype is not None:
-            original.update({"viewType": viewtype})
-        if canvas_id is not None:
-            original.update({"canvas_id": canvas_id})
-
-    if assignment_target.target_external_css:
-        original.update({"custom_css": assignment_target.target_external_css})
-    elif course_obj.course_external_css_default:
-        original.update({"custom_css": course_obj.course_external_css_default})
-
-    original.update({"dashboard_hidden": assignment_target.get_dashboard_hidden()})
 
-    original.update({"transcript_hidden": assignment_target.get_transcript_hidden()})
+    original.update(assignment_target.get_page_options(course_obj))
 
-    original.update(
-        {"transcript_download": assignment_target.get_transcript_download()}
-    )
-
-    original.update({"video_download": assignment_target.get_video_download()})
-
-    get_paras = {}
-    for k in request.GET.keys():
-        get_paras[k] = request.GET[k]
-
-    original.update(get_paras)
+    original.update(page_params)
+    if page_url is not None:
+        original["page_url"] = page_url
     if (
         targ_obj.target_type == "tx" or targ_obj.target_type == "ig" or targ_obj.target_type == "vd"
     ) and assignment.use_hxighlighter:
@@ -766,6 +806,13 @@ def instructor_dashboard_view(request):
                 + "?resource_link_id={}&utm_source={}".format(
                     resource_link_id, request.session.session_key
                 ),
+                # live updates, see notification.consumers.DashboardNotificationConsumer
+                "notification_ws_path": "/ws/notification/dashboard/{}/".format(
+                    clean_id(context_id)
+                )
+                + "?resource_link_id={}&utm_source={}".format(
+                    resource_link_id, request.session.session_key
+                ),
             }
         ),
     }
@@ -801,6 +848,9 @@ def instructor_dashboard_student_list_view(request):
         "is_instructor": request.LTI["is_staff"],
         "user_annotations": user_annotations,
         "fetch_annotations_time": fetch_elapsed_time,
+        "fetch_annotations_truncated": course_annotations["truncated"],
+        "fetch_annotations_max": settings.HXAT_DASHBOARD_FETCH["max_annotations"],
+        "fetch_annotations_errors": course_annotations["errors"],
         "org": settings.ORGANIZATION,
         "resource_link_id": resource_link_id,
     }
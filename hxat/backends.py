@@ -0,0 +1,68 @@
+"""
+Settings-selected backends, built once per process.
+
+Stores that can live in process memory or in redis (lti nonces, notification
+event log and presence) are configured by a settings dict with a "backend"
+key; an empty "backend" disables the feature:
+
+    get_thing = ConfiguredBackend(
+        "HXAT_THING",
+        "thing store",
+        {
+            "memory": lambda config: InMemoryThing(ttl=int(config.get("ttl", 60))),
+            "redis": lambda config: RedisThing(redis_url=config.get("redis_url")),
+        },
+    )
+    thing = get_thing()  # None when disabled
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def redis_client(redis_url, description):
+    """returns a redis client for `redis_url`, if the redis package is there."""
+    if redis is None:
+        raise ImproperlyConfigured(
+            "redis package is required for the redis {}".format(description)
+        )
+    return redis.Redis.from_url(redis_url)
+
+
+class ConfiguredBackend(object):
+    def __init__(self, setting, description, factories):
+        self.setting = setting
+        self.description = description
+        self.factories = factories  # backend name -> callable(config)
+        self.instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return getattr(settings, self.setting, {})
+
+    @property
+    def backend(self):
+        return self.config.get("backend", "")
+
+    def __call__(self):
+        """returns the configured backend, or None if disabled."""
+        config = self.config
+        backend = config.get("backend", "")
+        if not backend:
+            return None
+        with self._lock:
+            if self.instance is None:
+                factory = self.factories.get(backend)
+                if factory is None:
+                    raise ImproperlyConfigured(
+                        "unknown {} backend({})".format(self.description, backend)
+                    )
+                self.instance = factory(config)
+            return self.instance
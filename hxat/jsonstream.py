@@ -0,0 +1,112 @@
+"""
+Incremental reading of a JSON object with one large array member, such as a
+catchpy search response ({"total": 50000, "rows": [...]}).
+
+Items of the array are decoded one at a time as text chunks arrive, so only
+the item being decoded and the current chunk are held in memory, rather than
+the whole document and everything decoded from it.
+"""
+import json
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",]}"
+
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayStream(object):
+    """
+    Iterates the items of the array member `key` of the JSON object read from
+    `chunks` (an iterable of str). The object's other members are in `members`
+    once iterated (or as soon as they are read), and `found` tells if the
+    object had `key`. Raises ValueError if the document is not such an object.
+    """
+
+    def __init__(self, chunks, key):
+        self.chunks = iter(chunks)
+        self.key = key
+        self.members = {}
+        self.found = False
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            name = self._value()
+            if not isinstance(name, str):
+                raise ValueError("expected an object key, got {!r}".format(name))
+            self._expect(":")
+            if name == self.key:
+                self.found = True
+                yield from self._items()
+            else:
+                self.members[name] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+    def _items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def _read(self):
+        # drops what was consumed, so the buffer holds at most one value
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self._buf += chunk
+                return True
+        self._eof = True
+        return False
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read():
+                raise ValueError("unexpected end of JSON document")
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(
+                "expected one of {!r} at {!r}".format(
+                    chars, self._buf[self._pos : self._pos + 20]
+                )
+            )
+        self._pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # a number may go on in the next chunk ("-1" of "-1.5e3"): it is
+            # only complete when followed by something else
+            if (
+                isinstance(value, (int, float))
+                and not self._eof
+                and (end == len(self._buf) or self._buf[end] not in DELIMITERS)
+                and self._read()
+            ):
+                continue
+            self._pos = end
+            return value
@@ -8,6 +8,8 @@ from django.http import HttpRequest
 from oauthlib.common import to_unicode
 from oauthlib.oauth1 import SIGNATURE_HMAC, RequestValidator
 
+from .nonces import get_nonce_store
+
 log = logging.getLogger(__name__)
 
 
@@ -52,8 +54,58 @@ class LTIRequestValidator(RequestValidator):
         request_token=None,
         access_token=None,
     ):
+        # oauthlib calls this before checking the signature, so the nonce is
+        # only looked up here and recorded in is_valid_request(), once the
+        # signature is good: a forged launch cannot use up a real nonce.
+        # oauthlib also checks the timestamp is recent first, so only nonces
+        # within the timestamp lifetime need remembering
+        self._nonce = None
+        nonce_store = get_nonce_store()
+        if nonce_store is None:
+            return True
+        try:
+            seen = nonce_store.contains(
+                self._nonce_key(client_key, timestamp, nonce)
+            )
+        except Exception as e:
+            # an unavailable store should not lock everyone out
+            log.warning("unable to check lti nonce, accepting it: {}".format(e))
+            return True
+        if seen:
+            self._log_replay(client_key, timestamp, nonce)
+            return False
+        self._nonce = (client_key, timestamp, nonce)
         return True
 
+    def is_valid_request(self, tool_provider):
+        """checks the launch signature, then remembers its nonce."""
+        self._nonce = None
+        if not tool_provider.is_valid_request(self):
+            return False
+        if self._nonce is None:  # store disabled or unavailable
+            return True
+        try:
+            # a concurrent replay may have got here first
+            is_new = get_nonce_store().add(self._nonce_key(*self._nonce))
+        except Exception as e:
+            log.warning("unable to record lti nonce, accepting it: {}".format(e))
+            return True
+        if not is_new:
+            self._log_replay(*self._nonce)
+        return is_new
+
+    @staticmethod
+    def _nonce_key(client_key, timestamp, nonce):
+        return "{}:{}:{}".format(client_key, timestamp, nonce)
+
+    @staticmethod
+    def _log_replay(client_key, timestamp, nonce):
+        log.warning(
+            "replayed lti launch: client-key({}) timestamp({}) nonce({})".format(
+                client_key, timestamp, nonce
+            )
+        )
+
     def get_client_secret(self, client_key, request):
         # hxat uses context_id as implicit consumer-key
         context_id = request.body.get("context_id", None)
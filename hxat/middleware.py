@@ -12,7 +12,6 @@ that particular URL.
 Note: Chrome, Safari, and IE ignore Allow-From, though they should still
 load the iframe.
 """
-import collections
 import importlib
 import json
 import logging
@@ -196,8 +195,11 @@ class CookielessSessionMiddleware(MiddlewareMixin):
             self.logger.info("Session get param returned key: %s" % session_key)
             check_ip = True
 
+        # loading the session drops its key if there is no such session, so a
+        # single load tells if it exists instead of exists() and then load()
         request.session = self.SessionStore(session_key)
-        if request.session.exists(session_key):
+        logged_ip = request.session.get("LOGGED_IP", None)
+        if request.session.session_key is not None:
             self.logger.info("Session exists")
             self.logger.debug("Session data: %s" % dict(request.session.items()))
         else:
@@ -205,7 +207,6 @@ class CookielessSessionMiddleware(MiddlewareMixin):
             request.session.create()
             self.logger.info("Created new session: %s" % request.session.session_key)
 
-        logged_ip = request.session.get("LOGGED_IP", None)
         if check_ip and logged_ip is not None:
             self.logger.info("Checking IP address against session")
             request_ip = ip_address(request)
@@ -220,6 +221,54 @@ class CookielessSessionMiddleware(MiddlewareMixin):
                 # self.logger.info("Flushed session")
 
 
+# launch parameters kept in the session, besides custom_* ones; everything else
+# in the launch (oauth signature, nonce, presentation hints...) is only needed
+# to validate the launch itself.
+LTI_SESSION_PARAMS = (
+    "context_id",
+    "context_label",
+    "context_title",
+    "launch_presentation_return_url",
+    "lis_course_offering_sourcedid",  # sis course id, for the image store
+    "lis_outcome_service_url",
+    "lis_person_name_full",
+    "lis_person_sourcedid",
+    "lis_result_sourcedid",
+    "lti_message_type",
+    "lti_version",
+    "oauth_consumer_key",  # to sign grade passbacks
+    "resource_link_id",
+    "roles",
+    "tool_consumer_instance_guid",
+    "user_id",
+)
+
+
+def compact_launch_params(postparams):
+    """
+    Returns the launch parameters to keep in the session, with roles as a list.
+    """
+    keep = set(LTI_SESSION_PARAMS)
+    keep.update(
+        [
+            settings.LTI_COURSE_ID,
+            settings.LTI_COLLECTION_ID,
+            settings.LTI_OBJECT_ID,
+            settings.LTI_ROLES,
+            settings.LTI_UNIQUE_RESOURCE_ID,
+        ]
+    )
+    lti_params = {
+        key: value
+        for key, value in postparams.items()
+        if key in keep or key.startswith("custom_")
+    }
+    lti_params["roles"] = [
+        role for role in postparams.get("roles", "").split(",") if role != ""
+    ]
+    return lti_params
+
+
 class MultiLTILaunchMiddleware(MiddlewareMixin):
     """
     This middleware detects an LTI launch request, validates it, and stores multiple LTI launches
@@ -343,7 +392,7 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         # -- could not force a query string in unit tests using django.test.Client
         qs = request.META.pop("QUERY_STRING", "")
         self.logger.debug("removed query string temporarily: %s" % qs)
-        request_is_valid = tool_provider.is_valid_request(validator)
+        request_is_valid = validator.is_valid_request(tool_provider)
         request.META["QUERY_STRING"] = qs  # restore the query string
         self.logger.debug("restored query string: %s" % request.META["QUERY_STRING"])
 
@@ -382,21 +431,11 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         to the correct entry in the LTI_LAUNCH mapping.
         """
         resource_link_id = request.POST.get("resource_link_id", None)
-        postparams = request.POST.dict()
-        lti_params = dict(postparams)
-        lti_params.update(
-            {
-                "roles": [
-                    role
-                    for role in postparams.get("roles", "").split(",")
-                    if role != ""
-                ]
-            }
-        )
+        lti_params = compact_launch_params(request.POST.dict())
 
         lti_launches = request.session.get("LTI_LAUNCH", None)
         if lti_launches is None:
-            lti_launches = collections.OrderedDict()
+            lti_launches = {}
             request.session["LTI_LAUNCH"] = lti_launches
 
         max_launches = getattr(settings, "LTI_MAX_LAUNCHES", 10)
@@ -405,7 +444,9 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         )
         if len(lti_launches.keys()) >= max_launches:
             self.logger.info("Invalidating oldest LTI launch (FIFO)")
-            invalidated_launch = lti_launches.popitem(last=False)
+            # dicts keep insertion order, so the first one is the oldest
+            oldest = next(iter(lti_launches))
+            invalidated_launch = (oldest, lti_launches.pop(oldest))
             self.logger.info(
                 "LTI launch invalidated: %s", json.dumps(invalidated_launch, indent=4)
             )
@@ -0,0 +1,101 @@
+"""
+Store of recently seen oauth nonces, to reject replayed LTI launches.
+
+oauthlib already rejects launches with a timestamp older than its
+`timestamp_lifetime` (10 minutes), so a nonce only needs to be remembered for
+that long: a replay after that fails on its timestamp instead.
+
+Which store is used, if any, is set in settings.HXAT_LTI_NONCE_STORE:
+
+    HXAT_LTI_NONCE_STORE = {
+        "backend": "redis",    # or "memory", or "" to accept any nonce
+        "ttl": 600,            # seconds a nonce is remembered
+        "max_entries": 100000, # memory backend only
+        "redis_url": "redis://localhost:6379/0",
+    }
+
+The "memory" backend is per process: a launch replayed to another process is
+not caught. Under a launch storm it forgets the oldest nonces first, rather
+than grow past `max_entries`.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .backends import ConfiguredBackend, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class NonceStore(object):
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+
+    def contains(self, key):
+        """returns True if `key` was seen and not yet forgotten."""
+        raise NotImplementedError
+
+    def add(self, key):
+        """remembers `key`; returns False if it was already seen."""
+        raise NotImplementedError
+
+
+class InMemoryNonceStore(NonceStore):
+    def __init__(self, ttl=600, max_entries=100000):
+        super(InMemoryNonceStore, self).__init__(ttl)
+        self.max_entries = max(1, max_entries)
+        self._seen = OrderedDict()  # key -> expires_at, oldest first
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        # all entries have the same ttl, so expired ones are at the front
+        while self._seen and next(iter(self._seen.values())) <= now:
+            self._seen.popitem(last=False)
+
+    def contains(self, key):
+        with self._lock:
+            self._expire(time.monotonic())
+            return key in self._seen
+
+    def add(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._seen:
+                return False
+            if len(self._seen) >= self.max_entries:
+                self._seen.popitem(last=False)
+                logger.warning("nonce store full, forgetting oldest nonce")
+            self._seen[key] = now + self.ttl
+            return True
+
+
+class RedisNonceStore(NonceStore):
+    KEY_PREFIX = "hxat:lti:nonce:"
+
+    def __init__(self, ttl=600, redis_url=None):
+        super(RedisNonceStore, self).__init__(ttl)
+        self.client = redis_client(redis_url, "lti nonce store")
+
+    def contains(self, key):
+        return bool(self.client.exists("{}{}".format(self.KEY_PREFIX, key)))
+
+    def add(self, key):
+        key = "{}{}".format(self.KEY_PREFIX, key)
+        return bool(self.client.set(key, 1, nx=True, ex=self.ttl))
+
+
+get_nonce_store = ConfiguredBackend(
+    "HXAT_LTI_NONCE_STORE",
+    "lti nonce store",
+    {
+        "memory": lambda config: InMemoryNonceStore(
+            ttl=int(config.get("ttl", 600)),
+            max_entries=int(config.get("max_entries", 100000)),
+        ),
+        "redis": lambda config: RedisNonceStore(
+            ttl=int(config.get("ttl", 600)), redis_url=config.get("redis_url")
+        ),
+    },
+)
@@ -12,3 +12,19 @@ class JsonOrderedDictSerializer(object):
 
     def loads(self, data):
         return json.loads(data.decode("latin-1"), object_pairs_hook=OrderedDict)
+
+
+class JsonSerializer(object):
+    """
+    JSON serializer for sessions. Dicts keep their insertion order, so there is
+    no need for an OrderedDict hook when loading; non-ascii text is stored as
+    utf-8 instead of \\u escapes. Loads sessions written by either serializer.
+    """
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+
+    def loads(self, data):
+        return json.loads(data)
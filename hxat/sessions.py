@@ -0,0 +1,37 @@
+"""
+Session engine: sessions are kept in the database, read through the cache
+named by SESSION_CACHE_ALIAS and written to both (as django's cached_db), and
+only written when their data changed.
+
+With CSRF_USE_SESSIONS, the csrf middleware sets the csrf token in the session
+on every response that uses it, marking the session modified even though the
+token is the same; without the check below that is a session write per page.
+A session that is saved without changes keeps its expiry date, as it does
+with any session that is not modified.
+"""
+from django.contrib.sessions.backends import cached_db
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super(SessionStore, self).__init__(session_key)
+        self._saved_data = None
+
+    def load(self):
+        data = super(SessionStore, self).load()
+        if self.session_key is not None:
+            self._saved_data = self.serializer().dumps(data)
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is not None and not must_create:
+            data = self.serializer().dumps(self._get_session())
+            if data == self._saved_data:
+                return
+        super(SessionStore, self).save(must_create)
+        self._saved_data = self.serializer().dumps(self._get_session(no_load=True))
+
+    def delete(self, session_key=None):
+        super(SessionStore, self).delete(session_key)
+        if session_key is None or session_key == self.session_key:
+            self._saved_data = None
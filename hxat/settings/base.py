@@ -287,6 +287,11 @@ ADMIN_ROLES = literal_eval(
     )
 )
 LTI_UNIQUE_RESOURCE_ID = "resource_link_id"
+# render the annotation target in the launch response instead of redirecting
+# to it; the page puts its own url in the browser history.
+HXAT_LAUNCH_DIRECT_RENDER = (
+    os.environ.get("HXAT_LAUNCH_DIRECT_RENDER", "false").lower() == "true"
+)
 CONTENT_SECURITY_POLICY_DOMAIN = os.environ.get(
     "CONTENT_SECURITY_POLICY_DOMAIN",
     SECURE_SETTINGS.get("content_security_policy_domain", None),
@@ -371,10 +376,86 @@ if ANNOTATION_HTTPS_ONLY:
     SESSION_COOKIE_SECURE = True
     SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
-# Instead of using the default JSON serializer, we need to modify it slightly so that
-# session dicts stored in JSON are de-serialized with their order preserved. This functionality
-# is used in particular by the MultiLTILaunchMiddleware.
-SESSION_SERIALIZER = "hxat.serializers.JsonOrderedDictSerializer"
+# Session dicts must be de-serialized with their order preserved, as the
+# MultiLTILaunchMiddleware drops the oldest launch first; plain dicts do that.
+SESSION_SERIALIZER = "hxat.serializers.JsonSerializer"
+
+# sessions live in the db, read through the "sessions" cache. that cache must
+# be shared by every process serving requests (e.g. memcached), or processes
+# would read each other's stale sessions; so it is a no-op unless configured.
+# configured caches default to memcached, through pymemcache.
+SESSION_ENGINE = "hxat.sessions"
+SESSION_CACHE_ALIAS = "sessions"
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+if os.environ.get("HXAT_SESSION_CACHE_LOCATION"):
+    CACHES["sessions"] = {
+        "BACKEND": os.environ.get(
+            "HXAT_SESSION_CACHE_BACKEND",
+            "django.core.cache.backends.memcached.PyMemcacheCache",
+        ),
+        "LOCATION": os.environ["HXAT_SESSION_CACHE_LOCATION"],
+    }
+
+# parsed iiif manifests of image targets (see target_object_database.manifests).
+# per process unless a shared cache is configured.
+CACHES["manifests"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "manifests",
+}
+if os.environ.get("HXAT_MANIFEST_CACHE_LOCATION"):
+    CACHES["manifests"] = {
+        "BACKEND": os.environ.get(
+            "HXAT_MANIFEST_CACHE_BACKEND",
+            "django.core.cache.backends.memcached.PyMemcacheCache",
+        ),
+        "LOCATION": os.environ["HXAT_MANIFEST_CACHE_LOCATION"],
+    }
+
+# assignment navigation and course targets (see hx_lti_assignment.models).
+# they are dropped on change by signals in the process making the change, so
+# like sessions they are not cached unless a shared cache is configured.
+CACHES["app"] = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+if os.environ.get("HXAT_APP_CACHE_LOCATION"):
+    CACHES["app"] = {
+        "BACKEND": os.environ.get(
+            "HXAT_APP_CACHE_BACKEND",
+            "django.core.cache.backends.memcached.PyMemcacheCache",
+        ),
+        "LOCATION": os.environ["HXAT_APP_CACHE_LOCATION"],
+    }
+# fetching course annotations for the instructor dashboard: pages of page_size,
+# at most max_annotations per annotation database, concurrency requests at a
+# time across pages and databases, and timeout seconds per request.
+HXAT_DASHBOARD_FETCH = {
+    "page_size": int(os.environ.get("HXAT_DASHBOARD_FETCH_PAGE_SIZE", 1000)),
+    "max_annotations": int(
+        os.environ.get("HXAT_DASHBOARD_FETCH_MAX_ANNOTATIONS", 20000)
+    ),
+    "concurrency": int(os.environ.get("HXAT_DASHBOARD_FETCH_CONCURRENCY", 4)),
+    "timeout": int(os.environ.get("HXAT_DASHBOARD_FETCH_TIMEOUT", 10)),
+}
+
+# seconds an assignment's prev/next navigation is kept in the "app" cache.
+HXAT_NAVIGATION_CACHE_TTL = int(os.environ.get("HXAT_NAVIGATION_CACHE_TTL", 300))
+
+# seconds the names of a course's assignments and target objects, looked up by
+# the instructor dashboard, are kept in the "app" cache.
+HXAT_COURSE_TARGETS_CACHE_TTL = int(
+    os.environ.get("HXAT_COURSE_TARGETS_CACHE_TTL", 300)
+)
+HXAT_MANIFEST_CACHE = {
+    "cache_alias": "manifests",
+    # seconds a manifest is used without asking its server again
+    "ttl": int(os.environ.get("HXAT_MANIFEST_CACHE_TTL", 3600)),
+    # seconds past ttl a manifest is still used while it is revalidated
+    "stale_ttl": int(os.environ.get("HXAT_MANIFEST_CACHE_STALE_TTL", 604800)),
+    # seconds a manifest that failed to fetch is not fetched again
+    "error_ttl": int(os.environ.get("HXAT_MANIFEST_CACHE_ERROR_TTL", 60)),
+    "timeout": int(os.environ.get("HXAT_MANIFEST_FETCH_TIMEOUT", 10)),
+}
 
 # Organization-specific configuration
 # Try to minimize this as much as possible in favor of configuration
@@ -392,13 +473,92 @@ REDIS_PORT = os.environ.get("REDIS_PORT", SECURE_SETTINGS.get("redis_port", "637
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {"hosts": [(REDIS_HOST, REDIS_PORT)],},
+        "CONFIG": {
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
+            # memberships not refreshed within this many seconds are dropped
+            "group_expiry": int(os.environ.get("HXAT_NOTIFY_GROUP_EXPIRY", 86400)),
+        },
     }
 }
 HXAT_NOTIFY_ERRORLOG = os.environ.get("HXAT_NOTIFY_ERRORLOG", "false").lower() == "true"
 
+# coalescing of notifications per group, in milliseconds; window 0 disables it.
+# idle 0 means a quarter of the window.
+HXAT_NOTIFY_COALESCE_WINDOW_MS = int(
+    os.environ.get("HXAT_NOTIFY_COALESCE_WINDOW_MS", 0)
+)
+HXAT_NOTIFY_COALESCE_IDLE_MS = int(os.environ.get("HXAT_NOTIFY_COALESCE_IDLE_MS", 0))
+HXAT_NOTIFY_COALESCE_MAX_BATCH = int(
+    os.environ.get("HXAT_NOTIFY_COALESCE_MAX_BATCH", 50)
+)
+
+# per group log of recent notifications, replayed to clients that reconnect
+# with `?since=<seq>`; backend is "redis", "memory" (single process only) or
+# empty to disable.
+HXAT_NOTIFY_EVENTLOG = {
+    "backend": os.environ.get("HXAT_NOTIFY_EVENTLOG_BACKEND", ""),
+    "size": int(os.environ.get("HXAT_NOTIFY_EVENTLOG_SIZE", 200)),
+    "ttl": int(os.environ.get("HXAT_NOTIFY_EVENTLOG_TTL", 3600)),
+    "redis_url": os.environ.get(
+        "HXAT_NOTIFY_EVENTLOG_REDIS_URL",
+        "redis://{}:{}/0".format(REDIS_HOST, REDIS_PORT),
+    ),
+}
+
+# per websocket buffer of frames waiting to be sent, and what to do when a slow
+# client fills it up: "drop_oldest", "resync" (replace buffer with a
+# resync_required message) or "disconnect".
+HXAT_NOTIFY_SEND_BUFFER = int(os.environ.get("HXAT_NOTIFY_SEND_BUFFER", 100))
+HXAT_NOTIFY_SEND_BUFFER_POLICY = os.environ.get(
+    "HXAT_NOTIFY_SEND_BUFFER_POLICY", "drop_oldest"
+)
+
+# notification socket housekeeping, in seconds; 0 disables each of them.
+# clients that do not answer pings are only reaped when idle timeout is set,
+# and must then send {"type": "pong"} (or anything else) within the timeout.
+# group refresh re-adds memberships so live sockets survive group_expiry.
+HXAT_NOTIFY_PING_INTERVAL = int(os.environ.get("HXAT_NOTIFY_PING_INTERVAL", 0))
+HXAT_NOTIFY_IDLE_TIMEOUT = int(os.environ.get("HXAT_NOTIFY_IDLE_TIMEOUT", 0))
+HXAT_NOTIFY_GROUP_REFRESH = int(os.environ.get("HXAT_NOTIFY_GROUP_REFRESH", 0))
+
+# stop notifying after this many consecutive channel layer failures, and probe
+# it every interval (seconds) until it is back; failures 0 disables it.
+HXAT_NOTIFY_BREAKER_FAILURES = int(os.environ.get("HXAT_NOTIFY_BREAKER_FAILURES", 3))
+HXAT_NOTIFY_BREAKER_PROBE_INTERVAL = int(
+    os.environ.get("HXAT_NOTIFY_BREAKER_PROBE_INTERVAL", 5)
+)
+HXAT_NOTIFY_BREAKER_PROBE_TIMEOUT = int(
+    os.environ.get("HXAT_NOTIFY_BREAKER_PROBE_TIMEOUT", 2)
+)
+
+# approximate count of live notification sockets per room, for staff; backend
+# is "redis", "memory" (single process only) or empty to disable.
+HXAT_NOTIFY_PRESENCE = {
+    "backend": os.environ.get("HXAT_NOTIFY_PRESENCE_BACKEND", ""),
+    "ttl": int(os.environ.get("HXAT_NOTIFY_PRESENCE_TTL", 3600)),
+    "redis_url": os.environ.get(
+        "HXAT_NOTIFY_PRESENCE_REDIS_URL",
+        "redis://{}:{}/0".format(REDIS_HOST, REDIS_PORT),
+    ),
+}
+
 # time-to-live for ws auth
-WS_JWT_TTL = os.environ.get("WS_JWT_TTL", 300)
+WS_JWT_TTL = int(os.environ.get("WS_JWT_TTL", 300))
+
+# oauth nonces seen in lti launches, to reject replays; backend is "redis",
+# "memory" or empty to accept any nonce. "memory" only remembers the nonces
+# seen by each process: with more than one process (workers, hosts) a replay
+# sent to another process is accepted, so use "redis" there. ttl should match
+# oauthlib's timestamp lifetime (600s).
+HXAT_LTI_NONCE_STORE = {
+    "backend": os.environ.get("HXAT_LTI_NONCE_STORE_BACKEND", "memory"),
+    "ttl": int(os.environ.get("HXAT_LTI_NONCE_STORE_TTL", 600)),
+    "max_entries": int(os.environ.get("HXAT_LTI_NONCE_STORE_MAX_ENTRIES", 100000)),
+    "redis_url": os.environ.get(
+        "HXAT_LTI_NONCE_STORE_REDIS_URL",
+        "redis://{}:{}/0".format(REDIS_HOST, REDIS_PORT),
+    ),
+}
 
 # https://docs.djangoproject.com/en/3.2/releases/3.2/#customizing-type-of-auto-created-primary-keys
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
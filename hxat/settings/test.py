@@ -128,3 +128,9 @@ LOGGING = {
         },
     },
 }
+
+# tests run in one process, so a locmem "app" cache stands in for a shared one
+CACHES["app"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "app",
+}
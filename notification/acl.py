@@ -0,0 +1,76 @@
+"""
+Read permissions for annotation notifications.
+
+A notification for annotation in room `<group>` is delivered to the sub-groups
+allowed to read it, rather than checked per message in every consumer:
+
+    - `<group>`                  public annotations; every consumer joins it
+    - `n.<hash>.staff`           annotations readable by ADMIN_GROUP_ID
+    - `n.<hash>.u.<user hash>`   annotations readable by a given hx_user_id
+
+where `<hash>` is a hash of `<group>`: channels rejects group names of 100
+characters or more, and a room can already be close to that (e.g. a 40
+character canvas context_id plus a uuid collection_id and a target id).
+
+Consumers join `<group>`, their own user sub-group and, for course staff, the
+staff sub-group. Course-wide staff views listen on `n.<hash>.course-staff`,
+hashed from the context_id.
+"""
+import hashlib
+
+from django.conf import settings
+
+
+def read_acl(annotation):
+    """returns the read permissions of an annotation; empty means public."""
+    permissions = annotation.get("permissions") or {}
+    # annotatorjs format has "read", webannotation (catchpy) has "can_read"
+    read = permissions.get("read", permissions.get("can_read", []))
+    return list(read or [])
+
+
+def _digest(value, length):
+    return hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:length]
+
+
+def staff_group(group):
+    return "n.{}.staff".format(_digest(group, 24))
+
+
+def user_group(group, user_id):
+    # user ids are not guaranteed to be valid group names, nor short
+    return "n.{}.u.{}".format(_digest(group, 24), _digest(user_id, 16))
+
+
+def member_groups(group, user_id, is_staff):
+    """groups a consumer for `user_id` in room `group` joins."""
+    groups = [group, user_group(group, user_id)]
+    if is_staff:
+        groups.append(staff_group(group))
+    return groups
+
+
+def audience_groups(group, read):
+    """groups that should receive a notification with read permissions `read`."""
+    if not read:
+        return [group]
+    groups = []
+    for reader in read:
+        if reader == settings.ADMIN_GROUP_ID:
+            groups.append(staff_group(group))
+        else:
+            groups.append(user_group(group, reader))
+    return groups
+
+
+def can_read(read, user_id, is_staff):
+    if not read:
+        return True
+    if user_id in read:
+        return True
+    return is_staff and settings.ADMIN_GROUP_ID in read
+
+
+def course_staff_group(context):
+    """group for course-wide staff views, like the instructor dashboard."""
+    return "n.{}.course-staff".format(_digest(context, 24))
@@ -1,8 +1,21 @@
+import asyncio
 import json
 import logging
+import time
+from collections import deque
+from urllib.parse import parse_qs
 
+from asgiref.sync import sync_to_async
 from channels.exceptions import DenyConnection
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from hx_lti_assignment.models import AssignmentTargets
+
+from . import acl, metrics
+from .eventlog import get_event_log
+from .presence import get_presence
+from .tickets import clean_id
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -19,6 +32,17 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             self.group_name, self.scope.get("hx_user_id", "unknown")
         )
 
+        # clients that understand array frames opt in with `?batch=1`
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.batch_frames = query.get("batch", ["0"])[0] in ("1", "true")
+
+        # reconnecting clients pass the last seq they saw with `?since=<seq>`
+        try:
+            self.since = int(query["since"][0])
+        except (KeyError, ValueError):
+            self.since = None
+        self.setup_state()
+
         logging.getLogger(__name__).debug(
             "{}|channel_name({}), context({}), collection({}), object({}), user({})".format(
                 self.wsid,
@@ -38,7 +62,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             raise DenyConnection()  # return status_code=403
         else:
             # join room group
-            await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await self.join_room(self.group_name)
             logging.getLogger(__name__).debug(
                 "{}|added group to channel({})".format(self.wsid, self.channel_name)
             )
@@ -46,18 +70,45 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             logging.getLogger(__name__).debug(
                 "{}|CONNECTION ACCEPTED".format(self.wsid)
             )
+            self.start_writer()
+            self.start_keeper()
+            if self.since is not None:
+                await self.replay(self.group_name, self.since)
 
     async def disconnect(self, close_code):
         # leave room group
         logging.getLogger(__name__).debug(
             "{}|DISCONNECT[{}]".format(self.wsid, close_code)
         )
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        for room in list(self.rooms):
+            await self.leave_room(room)
+        if self.keeper is not None:
+            self.keeper.cancel()
+            self.keeper = None
+        if self.live:
+            self.live = False
+            metrics.gauge("notify.connections.live").dec()
+        if self.writer is not None:
+            self.writer.cancel()
+            metrics.gauge("notify.send.buffered").dec(len(self.outbox))
+            logging.getLogger(__name__).debug(
+                "{}|send buffer: max lag({:.1f}ms) dropped({})".format(
+                    self.wsid, self.max_lag_ms, self.dropped
+                )
+            )
+
+    async def websocket_receive(self, message):
+        # any message from the client, pong or otherwise, counts as activity
+        self.last_seen = time.monotonic()
+        await super(NotificationConsumer, self).websocket_receive(message)
 
     # receive message from websocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        message = text_data_json["message"]
+        if await self.heartbeat(text_data_json):
+            return
+        if await self.presence(text_data_json):
+            return
 
         logging.getLogger(__name__).debug(
             "{}|WSRECEIVE[{}]".format(self.wsid, text_data_json.keys())
@@ -72,12 +123,417 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         #    }
         # )
 
+    def setup_state(self):
+        self.writer = None
+        self.keeper = None
+        self.live = False
+        self.last_seen = time.monotonic()
+        self.user_id = self.scope.get("hx_user_id", "anonymous")
+        self.is_staff = self.scope.get("hx_is_staff", False)
+        # room -> groups joined for it; see notification.acl
+        self.rooms = {}
+        # room -> last seq sent by replay()
+        self.replayed_seq = {}
+        # events delivered via more than one group are sent once
+        self.recent_ids = deque(maxlen=64)
+
+    def room_groups(self, room):
+        # public, own user and (for staff) staff sub-groups
+        return acl.member_groups(room, self.user_id, self.is_staff)
+
+    async def join_room(self, room):
+        groups = self.room_groups(room)
+        for group in groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.rooms[room] = groups
+        await self.count_presence("join", room)
+
+    async def leave_room(self, room):
+        if room in self.rooms:
+            await self.count_presence("leave", room)
+        for group in self.rooms.pop(room, []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.replayed_seq.pop(room, None)
+
+    async def count_presence(self, op, room):
+        presence = get_presence()
+        if presence is None:
+            return
+        try:
+            await sync_to_async(getattr(presence, op))(room)
+        except Exception as e:
+            # a missed count is not worth failing the socket for
+            logging.getLogger(__name__).error(
+                "{}|unable to {} presence for {}: {}".format(self.wsid, op, room, e)
+            )
+
+    async def replay(self, room, since):
+        # group_add happened before this, so anything published meanwhile is
+        # queued for this channel and deduped by seq when it arrives.
+        event_log = get_event_log()
+        if event_log is None:
+            return
+        try:
+            events, complete = await sync_to_async(event_log.since)(room, since)
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                "{}|unable to replay {} since({}): {}".format(self.wsid, room, since, e)
+            )
+            events, complete = [], False
+
+        if not complete:
+            metrics.counter("notify.replay.resync").inc()
+            logging.getLogger(__name__).debug(
+                "{}|cannot replay {} since({}), resync required".format(
+                    self.wsid, room, since
+                )
+            )
+            await self.enqueue(json.dumps(self._resync_frame(room)))
+            return
+
+        metrics.counter("notify.replay.events").inc(len(events))
+        self.replayed_seq[room] = events[-1][0] if events else since
+        await self.send_frames(
+            [
+                self._frame(dict(e, seq=s, room=room))
+                for (s, e) in events
+                if acl.can_read(e.get("read"), self.user_id, self.is_staff)
+            ]
+        )
+
     # receive message from room group
     async def annotation_notification(self, event):
-        message = event["message"]
-        action = event["action"]
+        if self._is_new(event):
+            await self.send_frames([self._frame(event)])
 
-        # send message to websocket
-        await self.send(
-            text_data=json.dumps({"type": action, "message": "{}".format(message),})
+    # receive coalesced messages from room group
+    async def annotation_notification_batch(self, event):
+        await self.send_frames(
+            [self._frame(e) for e in event["messages"] if self._is_new(e)]
         )
+
+    async def send_frames(self, frames):
+        if not frames:
+            return
+        if self.batch_frames:
+            await self.enqueue(json.dumps(frames))
+        else:
+            for frame in frames:
+                await self.enqueue(json.dumps(frame))
+
+    def start_writer(self):
+        # group messages are only queued here, and written to the socket by
+        # a separate task, so a slow client never backs up its channel-layer
+        # queue; what happens when this buffer is full is up to the policy.
+        self.outbox = deque()
+        self.outbox_ready = asyncio.Event()
+        self.outbox_size = max(1, getattr(settings, "HXAT_NOTIFY_SEND_BUFFER", 100))
+        self.outbox_policy = getattr(
+            settings, "HXAT_NOTIFY_SEND_BUFFER_POLICY", "drop_oldest"
+        )
+        self.max_lag_ms = 0.0
+        self.dropped = 0
+        self.writer = asyncio.ensure_future(self._write())
+
+    def start_keeper(self):
+        # application level ping, idle reaping and refresh of group
+        # memberships, so that a stale membership expires in the channel layer
+        # (group_expiry) rather than costing a send per event forever.
+        self.live = True
+        metrics.gauge("notify.connections.live").inc()
+        self.ping_interval = getattr(settings, "HXAT_NOTIFY_PING_INTERVAL", 0)
+        self.idle_timeout = getattr(settings, "HXAT_NOTIFY_IDLE_TIMEOUT", 0)
+        self.group_refresh = getattr(settings, "HXAT_NOTIFY_GROUP_REFRESH", 0)
+        intervals = [
+            i for i in (self.ping_interval, self.idle_timeout, self.group_refresh) if i
+        ]
+        if intervals:
+            self.keeper = asyncio.ensure_future(self._keep(min(intervals) / 2.0))
+
+    async def _keep(self, tick):
+        now = time.monotonic()
+        last_ping = last_refresh = now
+        while True:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            if self.idle_timeout and now - self.last_seen > self.idle_timeout:
+                logging.getLogger(__name__).info(
+                    "{}|idle for {:.0f}s, closing".format(self.wsid, now - self.last_seen)
+                )
+                metrics.counter("notify.connections.reaped").inc()
+                self.keeper = None
+                await self.close(code=4000)
+                return
+            if self.ping_interval and now - last_ping >= self.ping_interval:
+                last_ping = now
+                await self.enqueue(json.dumps({"type": "ping"}))
+            if self.group_refresh and now - last_refresh >= self.group_refresh:
+                last_refresh = now
+                for room, groups in list(self.rooms.items()):
+                    for group in groups:
+                        await self.channel_layer.group_add(group, self.channel_name)
+                    await self.count_presence("touch", room)
+
+    async def heartbeat(self, data):
+        """handles ping/pong from the client; returns True if it was one."""
+        if data.get("type") == "ping":
+            await self.enqueue(json.dumps({"type": "pong"}))
+            return True
+        return data.get("type") == "pong"
+
+    async def presence(self, data):
+        """
+        answers {"type": "presence"} from staff with the number of live sockets
+        in each room of this socket; returns True if it was one.
+        """
+        if data.get("type") != "presence":
+            return False
+        presence = get_presence()
+        counts = None
+        if self.is_staff and presence is not None:
+            try:
+                counts = await sync_to_async(presence.counts)(list(self.rooms))
+            except Exception as e:
+                logging.getLogger(__name__).error(
+                    "{}|unable to count presence: {}".format(self.wsid, e)
+                )
+        await self.enqueue(json.dumps({"type": "presence", "counts": counts}))
+        return True
+
+    async def enqueue(self, text):
+        if self.writer is None:  # not accepted, or already closed
+            return
+        if len(self.outbox) >= self.outbox_size:
+            metrics.counter("notify.send.overflow.{}".format(self.outbox_policy)).inc()
+            if self.outbox_policy == "disconnect":
+                logging.getLogger(__name__).info(
+                    "{}|send buffer full, disconnecting".format(self.wsid)
+                )
+                self._drop(len(self.outbox))
+                self.writer.cancel()
+                self.writer = None
+                await self.close(code=4008)
+                return
+            elif self.outbox_policy == "resync":
+                # client has to search again anyway, nothing queued is useful
+                self._drop(len(self.outbox))
+                text = json.dumps({"type": "resync_required"})
+            else:
+                self._drop(1)
+        self.outbox.append((time.monotonic(), text))
+        metrics.gauge("notify.send.buffered").inc()
+        self.outbox_ready.set()
+
+    def _drop(self, count):
+        for _ in range(count):
+            self.outbox.popleft()
+        self.dropped += count
+        metrics.gauge("notify.send.buffered").dec(count)
+        metrics.counter("notify.send.dropped").inc(count)
+
+    async def _write(self):
+        while True:
+            await self.outbox_ready.wait()
+            self.outbox_ready.clear()
+            while self.outbox:
+                queued_at, text = self.outbox.popleft()
+                metrics.gauge("notify.send.buffered").dec()
+                await self.send(text_data=text)
+                lag_ms = (time.monotonic() - queued_at) * 1000.0
+                self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+                metrics.histogram("notify.send.lag_ms").observe(lag_ms)
+
+    def _is_new(self, event):
+        event_id = event.get("id")
+        if event_id is not None:
+            if event_id in self.recent_ids:
+                return False
+            self.recent_ids.append(event_id)
+
+        # only events already sent by replay() are dropped; once live events
+        # catch up with the replay there is nothing left to dedupe.
+        room = event.get("room", self.group_name)
+        seq = event.get("seq")
+        replayed = self.replayed_seq.get(room)
+        if replayed is None or seq is None:
+            return True
+        if seq <= replayed:
+            return False
+        del self.replayed_seq[room]
+        return True
+
+    def _frame(self, event):
+        frame = {"type": event["action"], "message": "{}".format(event["message"])}
+        if "seq" in event:
+            frame["seq"] = event["seq"]
+        return frame
+
+    def _resync_frame(self, room):
+        return {"type": "resync_required"}
+
+
+class MultiplexNotificationConsumer(NotificationConsumer):
+    """
+    one socket, many rooms. clients manage their subscriptions with
+
+        {"type": "subscribe", "room": "<context>--<collection>--<target>", "since": 12}
+        {"type": "unsubscribe", "room": "<context>--<collection>--<target>"}
+
+    and get "subscribed", "unsubscribed" or "subscription_denied" back. each
+    subscription is authorized against the LTI launch the socket was opened
+    with; notification frames carry the room they belong to.
+    """
+
+    async def connect(self):
+        self.group_name = None
+        self.wsid = "multiplex--{}".format(self.scope.get("hx_user_id", "unknown"))
+
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.batch_frames = query.get("batch", ["0"])[0] in ("1", "true")
+        self.setup_state()
+        self.max_rooms = getattr(settings, "HXAT_NOTIFY_MAX_SUBSCRIPTIONS", 20)
+
+        auth = self.scope["hxat_auth"]
+        if auth != "authenticated":
+            logging.getLogger(__name__).debug(
+                "{}|ws auth FAILED: {}, dropping connection".format(self.wsid, auth)
+            )
+            raise DenyConnection()  # return status_code=403
+        await self.accept()
+        logging.getLogger(__name__).debug("{}|CONNECTION ACCEPTED".format(self.wsid))
+        self.start_writer()
+        self.start_keeper()
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            action = data.get("type")
+            room = str(data.get("room", ""))
+        except (ValueError, AttributeError):
+            logging.getLogger(__name__).debug(
+                "{}|ignoring malformed message".format(self.wsid)
+            )
+            return
+        if await self.heartbeat(data) or await self.presence(data):
+            return
+
+        logging.getLogger(__name__).debug(
+            "{}|WSRECEIVE[{}] room({})".format(self.wsid, action, room)
+        )
+        if action == "subscribe":
+            await self.subscribe(room, data.get("since"))
+        elif action == "unsubscribe":
+            await self.leave_room(room)
+            await self.enqueue(json.dumps({"type": "unsubscribed", "room": room}))
+
+    async def subscribe(self, room, since=None):
+        if room not in self.rooms:
+            if len(self.rooms) >= self.max_rooms:
+                reason = "too many subscriptions"
+            else:
+                reason = await self.authorize(room)
+            if reason is not None:
+                metrics.counter("notify.subscribe.denied").inc()
+                logging.getLogger(__name__).debug(
+                    "{}|subscription to {} denied: {}".format(self.wsid, room, reason)
+                )
+                await self.enqueue(
+                    json.dumps(
+                        {"type": "subscription_denied", "room": room, "reason": reason}
+                    )
+                )
+                return
+            await self.join_room(room)
+            metrics.counter("notify.subscribe.ok").inc()
+        await self.enqueue(json.dumps({"type": "subscribed", "room": room}))
+        if since is not None:
+            try:
+                since = int(since)
+            except (TypeError, ValueError):
+                return
+            await self.replay(room, since)
+
+    async def authorize(self, room):
+        """returns None if the launch allows `room`, the reason otherwise."""
+        try:
+            (context, collection, target) = room.split("--")
+        except ValueError:
+            return "malformed room"
+        if context != clean_id(self.scope.get("hx_context_id", "")):
+            return "unknown context-id"
+        tgt = target.split("-")[0]  # hxighlighter appends a canvas-id
+        if not tgt.isdigit():
+            return "unknown target-object-id"
+        if not await self._target_in_course(collection, int(tgt)):
+            return "unknown target-object-id"
+        return None
+
+    @database_sync_to_async
+    def _target_in_course(self, collection, target_object_id):
+        targets = AssignmentTargets.objects.filter(
+            assignment__assignment_id=collection,
+            assignment__course__course_id=self.scope.get("hx_context_id"),
+            target_object_id=target_object_id,
+        )
+        if not self.is_staff:
+            targets = targets.filter(assignment__is_published=True)
+        return targets.exists()
+
+    def _frame(self, event):
+        frame = super(MultiplexNotificationConsumer, self)._frame(event)
+        frame["room"] = event.get("room")
+        return frame
+
+    def _resync_frame(self, room):
+        return {"type": "resync_required", "room": room}
+
+
+class DashboardNotificationConsumer(NotificationConsumer):
+    """
+    course-wide feed of annotation changes for the instructor dashboard, staff
+    only. frames are `{"type": "annotation_created", "row": {...}}` (or
+    annotation_updated, annotation_deleted), with rows in the same columns the
+    dashboard renders; see hx_lti_initializer.utils.dashboard_row.
+    """
+
+    async def connect(self):
+        self.context = self.scope["url_route"]["kwargs"]["context"]
+        self.group_name = acl.course_staff_group(self.context)
+        self.wsid = "dashboard--{}--{}".format(
+            self.context, self.scope.get("hx_user_id", "unknown")
+        )
+        self.batch_frames = False
+        self.setup_state()
+
+        auth = self.scope["hxat_auth"]
+        if auth != "authenticated":
+            reason = auth
+        elif not self.is_staff:
+            reason = "not course staff"
+        elif clean_id(self.scope.get("hx_context_id", "")) != self.context:
+            reason = "unknown context-id({})".format(self.context)
+        else:
+            reason = None
+        if reason is not None:
+            logging.getLogger(__name__).debug(
+                "{}|ws auth FAILED: {}, dropping connection".format(self.wsid, reason)
+            )
+            raise DenyConnection()  # return status_code=403
+
+        await self.join_room(self.group_name)
+        await self.accept()
+        logging.getLogger(__name__).debug("{}|CONNECTION ACCEPTED".format(self.wsid))
+        self.start_writer()
+        self.start_keeper()
+
+    def room_groups(self, room):
+        # staff only, so no read sub-groups
+        return [room]
+
+    # receive message from course group
+    async def dashboard_notification(self, event):
+        if self._is_new(event):
+            await self.send_frames([self._frame(event)])
+
+    def _frame(self, event):
+        return {"type": event["action"], "row": event["row"]}
@@ -0,0 +1,155 @@
+"""
+Bounded, sequence-numbered log of recent notifications per group.
+
+Every notification published to a group gets the next sequence number for that
+group, and is kept in a ring of the last `size` events. A client that
+reconnects with `?since=<seq>` gets the events it missed replayed, or a
+"resync_required" message when the log no longer has all of them.
+
+Backends are configured via settings.HXAT_NOTIFY_EVENTLOG:
+
+    HXAT_NOTIFY_EVENTLOG = {
+        "backend": "redis",  # or "memory", or "" to disable
+        "size": 200,         # events kept per group
+        "ttl": 3600,         # seconds a quiet group's log is kept
+        "redis_url": "redis://localhost:6379/0",
+    }
+
+The "memory" backend is per process, so it is only correct when the same
+process publishes and serves websockets (e.g. a single daphne).
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from hxat.backends import ConfiguredBackend, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class EventLog(object):
+    def __init__(self, size=200, ttl=3600):
+        self.size = size
+        self.ttl = ttl
+
+    def append(self, group, event):
+        """stores `event` and returns its sequence number in `group`."""
+        raise NotImplementedError
+
+    def since(self, group, seq):
+        """
+        returns (events, complete) where `events` are the (seq, event) pairs
+        after `seq`, and `complete` is False when the log cannot account for
+        all events after `seq` and the client has to resync.
+        """
+        raise NotImplementedError
+
+    def _is_complete(self, seq, oldest, latest):
+        if seq > latest:  # log was reset since client last saw it
+            return False
+        if latest == seq:
+            return True
+        return oldest is not None and oldest <= seq + 1
+
+
+class InMemoryEventLog(EventLog):
+    def __init__(self, size=200, ttl=3600, max_groups=10000):
+        super(InMemoryEventLog, self).__init__(size, ttl)
+        self.max_groups = max_groups
+        self._groups = OrderedDict()  # group -> [latest_seq, last_used, deque]
+        self._lock = threading.Lock()
+
+    def append(self, group, event):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._groups.pop(group, None)
+            if entry is None or now - entry[1] > self.ttl:
+                entry = [0, now, deque(maxlen=self.size)]
+            entry[0] += 1
+            entry[1] = now
+            entry[2].append((entry[0], event))
+            self._groups[group] = entry
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+            return entry[0]
+
+    def since(self, group, seq):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._groups.get(group)
+            if entry is None or now - entry[1] > self.ttl:
+                return [], seq == 0
+            latest, _, events = entry
+            events = list(events)
+        oldest = events[0][0] if events else None
+        if not self._is_complete(seq, oldest, latest):
+            return [], False
+        return [(s, e) for (s, e) in events if s > seq], True
+
+
+class RedisEventLog(EventLog):
+    KEY_PREFIX = "hxat:notify:log:"
+
+    # increments the group sequence, stores the event under it, trims the
+    # ring and refreshes expiry; all in one round trip.
+    APPEND_SCRIPT = """
+    local seq = redis.call('INCR', KEYS[1])
+    redis.call('ZADD', KEYS[2], seq, cjson.encode({seq, ARGV[1]}))
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[2]) + 1))
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    return seq
+    """
+
+    def __init__(self, size=200, ttl=3600, redis_url=None):
+        super(RedisEventLog, self).__init__(size, ttl)
+        self.client = redis_client(redis_url, "notification event log")
+        self._append = self.client.register_script(self.APPEND_SCRIPT)
+
+    def _keys(self, group):
+        return (
+            "{}{}:seq".format(self.KEY_PREFIX, group),
+            "{}{}:events".format(self.KEY_PREFIX, group),
+        )
+
+    def append(self, group, event):
+        return int(
+            self._append(
+                keys=self._keys(group), args=[json.dumps(event), self.size, self.ttl]
+            )
+        )
+
+    def since(self, group, seq):
+        seq_key, events_key = self._keys(group)
+        pipe = self.client.pipeline()
+        pipe.get(seq_key)
+        pipe.zrange(events_key, 0, 0, withscores=True)
+        pipe.zrangebyscore(events_key, "({}".format(seq), "+inf")
+        latest, oldest, members = pipe.execute()
+        latest = int(latest or 0)
+        oldest = int(oldest[0][1]) if oldest else None
+        if not self._is_complete(seq, oldest, latest):
+            return [], False
+        events = []
+        for member in members:
+            s, data = json.loads(member)
+            events.append((int(s), json.loads(data)))
+        return events, True
+
+
+get_event_log = ConfiguredBackend(
+    "HXAT_NOTIFY_EVENTLOG",
+    "notification event log",
+    {
+        "memory": lambda config: InMemoryEventLog(
+            size=int(config.get("size", 200)), ttl=int(config.get("ttl", 3600))
+        ),
+        "redis": lambda config: RedisEventLog(
+            size=int(config.get("size", 200)),
+            ttl=int(config.get("ttl", 3600)),
+            redis_url=config.get("redis_url"),
+        ),
+    },
+)
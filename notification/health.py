@@ -0,0 +1,117 @@
+"""
+Circuit breaker for the notification channel layer.
+
+Publishing is best effort: an annotation is saved whether or not its
+notification goes out. When the channel layer is down (e.g. redis), every
+write would still wait on its connection timeouts before failing. Instead,
+after HXAT_NOTIFY_BREAKER_FAILURES consecutive failures the breaker opens and
+publish() skips the channel layer altogether. While open, a background thread
+probes the channel layer every HXAT_NOTIFY_BREAKER_PROBE_INTERVAL seconds and
+closes the breaker on the first probe that succeeds.
+
+The breaker is per process; each process finds out on its own.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import channels.layers
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PROBE_GROUP = "hxat.notify.health"
+
+
+class CircuitBreaker(object):
+    def __init__(self, probe, failures=3, probe_interval=5.0):
+        self.probe = probe  # raises when the channel layer is not healthy
+        self.failures = max(1, failures)
+        self.probe_interval = probe_interval
+        self._failed = 0
+        self._open = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def record_success(self):
+        if self._failed:
+            with self._lock:
+                self._failed = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            if self._open or self._failed < self.failures:
+                return
+            self._open = True
+        metrics.counter("notify.breaker.trips").inc()
+        metrics.gauge("notify.breaker.open").inc()
+        logger.warning(
+            "notification channel layer failed {} times, skipping notifications "
+            "until it is back".format(self._failed)
+        )
+        threading.Thread(
+            target=self._probe_until_closed, name="hxat-notify-probe", daemon=True
+        ).start()
+
+    def _probe_until_closed(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self.probe()
+            except Exception as e:
+                metrics.counter("notify.breaker.probe_failures").inc()
+                logger.debug("notification channel layer probe failed: {}".format(e))
+                continue
+            with self._lock:
+                self._open = False
+                self._failed = 0
+            metrics.gauge("notify.breaker.open").dec()
+            logger.info("notification channel layer is back, notifying again")
+            return
+
+
+def probe_channel_layer(channel_layer, timeout=2.0):
+    # own loop, as this runs in the probe thread
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            asyncio.wait_for(
+                channel_layer.group_send(PROBE_GROUP, {"type": "health.probe"}),
+                timeout,
+            )
+        )
+    finally:
+        loop.close()
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker():
+    """returns the process-wide breaker, or None if disabled."""
+    global _breaker
+    failures = getattr(settings, "HXAT_NOTIFY_BREAKER_FAILURES", 0)
+    if not failures:
+        return None
+    with _breaker_lock:
+        if _breaker is None:
+            channel_layer = channels.layers.get_channel_layer()
+            _breaker = CircuitBreaker(
+                lambda: probe_channel_layer(
+                    channel_layer,
+                    getattr(settings, "HXAT_NOTIFY_BREAKER_PROBE_TIMEOUT", 2),
+                ),
+                failures=failures,
+                probe_interval=getattr(
+                    settings, "HXAT_NOTIFY_BREAKER_PROBE_INTERVAL", 5
+                ),
+            )
+        return _breaker
@@ -0,0 +1,232 @@
+import ast
+import asyncio
+import json
+import time
+import tracemalloc
+
+import channels.layers
+from asgiref.sync import sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from annotation_store.store import WebAnnotationStoreBackend
+from notification.metrics import Histogram
+from notification.middleware import SessionAuthMiddleware, SessionStore
+from notification.routing import websocket_urlpatterns
+
+RESOURCE_LINK_ID = "bench-resource-link"
+
+
+class Command(BaseCommand):
+    help = (
+        "offline websocket fan-out benchmark: connects N simulated sockets across "
+        "M groups through SessionAuthMiddleware and NotificationConsumer, drives "
+        "notifications via send_annotation_notification and reports connect rate, "
+        "fan-out latency, memory per connection and messages/sec"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sockets", dest="sockets", type=int, default=200, help="number of sockets",
+        )
+        parser.add_argument(
+            "--groups", dest="groups", type=int, default=10, help="number of groups",
+        )
+        parser.add_argument(
+            "--events",
+            dest="events",
+            type=int,
+            default=100,
+            help="number of create/update notifications to publish",
+        )
+        parser.add_argument(
+            "--layer",
+            dest="layer",
+            choices=["memory", "redis"],
+            default="memory",
+            help="channel layer to benchmark (DEFAULT memory)",
+        )
+        parser.add_argument(
+            "--redis-url",
+            dest="redis_url",
+            default="redis://{}:{}/0".format(settings.REDIS_HOST, settings.REDIS_PORT),
+            help="redis(-compatible) server for --layer redis",
+        )
+        parser.add_argument(
+            "--timeout",
+            dest="timeout",
+            type=float,
+            default=30.0,
+            help="seconds to wait for all notifications to be delivered",
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs["sockets"] < 1 or kwargs["groups"] < 1:
+            raise CommandError("--sockets and --groups must be at least 1")
+
+        layer = self.make_layer(kwargs["layer"], kwargs["redis_url"])
+        previous_layer = channels.layers.channel_layers.set(
+            channels.layers.DEFAULT_CHANNEL_LAYER, layer
+        )
+        groups = ["bench-ctx--bench-coll--{}".format(g) for g in range(kwargs["groups"])]
+        sessions = self.create_sessions(kwargs["sockets"], groups)
+        # no asyncio.run(): it needs python 3.7
+        loop = asyncio.new_event_loop()
+        try:
+            report = loop.run_until_complete(
+                self.run(layer, sessions, groups, kwargs["events"], kwargs["timeout"])
+            )
+        finally:
+            loop.close()
+            if previous_layer is None:
+                channels.layers.channel_layers.backends.pop(
+                    channels.layers.DEFAULT_CHANNEL_LAYER, None
+                )
+            else:
+                channels.layers.channel_layers.set(
+                    channels.layers.DEFAULT_CHANNEL_LAYER, previous_layer
+                )
+            for session_id, _ in sessions:
+                SessionStore(session_id).delete()
+
+        self.stdout.write(
+            "layer({}) sockets({}) groups({}) events({})".format(
+                kwargs["layer"], kwargs["sockets"], kwargs["groups"], kwargs["events"]
+            )
+        )
+        for key, value in report.items():
+            self.stdout.write("{:>24}: {}".format(key, value))
+
+    def make_layer(self, name, redis_url):
+        if name == "memory":
+            return InMemoryChannelLayer(capacity=10000)
+        try:
+            from channels_redis.core import RedisChannelLayer
+        except ImportError:
+            raise CommandError("channels_redis is required for --layer redis")
+        return RedisChannelLayer(hosts=[redis_url])
+
+    def create_sessions(self, count, groups):
+        """one LTI session per socket, spread round-robin across groups."""
+        sessions = []
+        for i in range(count):
+            group = groups[i % len(groups)]
+            context_id, collection_id, object_id = group.split("--")
+            session = SessionStore()
+            session["LTI_LAUNCH"] = {
+                RESOURCE_LINK_ID: {
+                    "hx_user_id": "bench-user-{}".format(i),
+                    "hx_context_id": context_id,
+                    "hx_collection_id": collection_id,
+                    "hx_object_id": object_id,
+                    "launch_params": {},
+                }
+            }
+            session.create()
+            sessions.append((session.session_key, group))
+        return sessions
+
+    async def run(self, layer, sessions, groups, events, timeout):
+        application = SessionAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+        # connect
+        tracemalloc.start()
+        mem_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        communicators = []
+        for session_id, group in sessions:
+            communicator = WebsocketCommunicator(
+                application,
+                "/ws/notification/{}/?utm_source={}&resource_link_id={}".format(
+                    group, session_id, RESOURCE_LINK_ID
+                ),
+            )
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError("socket for group({}) was not accepted".format(group))
+            communicators.append((communicator, group))
+        connect_elapsed = time.perf_counter() - started
+        mem_per_conn = (tracemalloc.get_traced_memory()[0] - mem_before) / len(
+            communicators
+        )
+        tracemalloc.stop()
+
+        # publish and receive
+        expected = {g: 0 for g in groups}
+        for i in range(events):
+            expected[groups[i % len(groups)]] += 1
+        latency = Histogram("latency_ms", size=max(1024, events * len(sessions)))
+        started = time.perf_counter()
+        receivers = [
+            asyncio.ensure_future(self.receive(c, expected[g], latency, timeout))
+            for c, g in communicators
+        ]
+        await self.publish(layer, groups, events)
+        received = sum(await asyncio.gather(*receivers))
+        deliver_elapsed = time.perf_counter() - started
+
+        for communicator, _ in communicators:
+            await communicator.disconnect()
+
+        stats = latency.snapshot()
+        return {
+            "connect rate": "{:.1f} conn/s".format(len(communicators) / connect_elapsed),
+            "memory per connection": "{:.1f} KiB".format(mem_per_conn / 1024.0),
+            "delivered": "{}/{}".format(
+                received, sum(expected[g] for _, g in communicators)
+            ),
+            "messages/sec": "{:.1f}".format(received / deliver_elapsed),
+            "fan-out latency p50": "{:.2f} ms".format(stats["p50"]),
+            "fan-out latency p90": "{:.2f} ms".format(stats["p90"]),
+            "fan-out latency p99": "{:.2f} ms".format(stats["p99"]),
+            "fan-out latency max": "{:.2f} ms".format(stats["max"]),
+        }
+
+    async def publish(self, layer, groups, events):
+        factory = RequestFactory()
+        backends = {}
+        for group in groups:
+            context_id, collection_id, object_id = group.split("--")
+            request = factory.post("/annotation_store/api/")
+            request.LTI = {
+                "hx_context_id": context_id,
+                "hx_collection_id": collection_id,
+                "hx_object_id": object_id,
+            }
+            backend = WebAnnotationStoreBackend(request)
+            backend.channel_layer = layer
+            backends[group] = backend
+
+        for i in range(events):
+            group = groups[i % len(groups)]
+            action = "annotation_created" if i % 2 == 0 else "annotation_updated"
+            annotation = {"id": "bench-{}".format(i), "sent_at": time.perf_counter()}
+            # send_annotation_notification is sync and uses async_to_sync
+            await sync_to_async(backends[group].send_annotation_notification)(
+                action, annotation
+            )
+
+    async def receive(self, communicator, count, latency, timeout):
+        received = 0
+        deadline = time.perf_counter() + timeout
+        while received < count:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                text = await communicator.receive_from(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            frames = json.loads(text)
+            if not isinstance(frames, list):
+                frames = [frames]
+            for f in frames:
+                message = ast.literal_eval(f["message"])
+                latency.observe((now - message["sent_at"]) * 1000.0)
+                received += 1
+        return received
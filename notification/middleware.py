@@ -4,35 +4,30 @@ from importlib import import_module
 from urllib.parse import parse_qs
 
 from django.conf import settings
-from django.contrib.sessions.models import Session
 from django.db import close_old_connections
 from asgiref.sync import sync_to_async
 
-SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
-
+from .tickets import verify_ticket
 
-@sync_to_async
-def _async_session_exists(session_id):
-    '''
-    Returns an awaitable for checking if a session exists.
-
-    NOTE: `sync_to_async` is necessary because the SessionStore
-    uses the DB, and therefore is a synchronous operation. The `sync_to_async`
-    utility turns `session.exists()` into an awaitable.
-    '''
-    return SessionStore(session_id).exists(session_id)
+SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
 
 
 @sync_to_async
 def _async_session_get_ltilaunch(session_id):
     '''
-    Returns an awaitable for loading the LTI_LAUNCH data from the session.
+    Returns an awaitable for loading the LTI_LAUNCH data from the session, or
+    None if there is no such session.
 
     NOTE: `sync_to_async` is necessary because the SessionStore
     uses the DB, and therefore is a synchronous operation. The `sync_to_async`
-    utility turns `session.get()` into an awaitable.
+    utility turns `session.get()` into an awaitable. Loading the session drops
+    its key when it does not exist, so it is loaded only once.
     '''
-    return SessionStore(session_id).get("LTI_LAUNCH", {})
+    session = SessionStore(session_id)
+    multi_launch = session.get("LTI_LAUNCH", {})
+    if session.session_key is None:
+        return None
+    return multi_launch
 
 
 class SessionAuthMiddleware(object):
@@ -46,15 +41,23 @@ class SessionAuthMiddleware(object):
         # not authorized yet
         scope["hxat_auth"] = "403"
         scope["hx_user_id"] = "anonymous"
+        scope["hx_is_staff"] = False
+        scope["hx_context_id"] = ""
 
         # parse path to get context_id, collection_id, target_source_id
         path = scope.get("path")
         room_name = path.split("/")[-2]  # assumes path ends with a '/'
-        (context, collection, target) = room_name.split("--")
         try:
-            tgt, _ = target.split("-")  # hxighliter appends a canvas-id
+            (context, collection, target) = room_name.split("--")
         except ValueError:
-            tgt = target
+            # multiplexed socket: rooms are authorized per subscription
+            (context, collection, target) = (None, None, None)
+            tgt = None
+        else:
+            try:
+                tgt, _ = target.split("-")  # hxighliter appends a canvas-id
+            except ValueError:
+                tgt = target
 
         # parse query string for session-id and resource-link-id
         query_string = scope.get("query_string", "")
@@ -65,6 +68,18 @@ class SessionAuthMiddleware(object):
             self.log.debug("NOTIFY {}".format(scope["hxat_auth"]))
             return await self.app(scope, receive, send)
 
+        # a valid ticket authorizes without touching the session db
+        ticket = parsed_query.get(b"ticket", [b""])[0].decode()
+        if ticket:
+            claims = verify_ticket(ticket, context, collection, tgt)
+            if claims is not None:
+                scope["hxat_auth"] = "authenticated"
+                scope["hx_user_id"] = claims.get("sub", "anonymous")
+                scope["hx_is_staff"] = claims.get("stf", False)
+                scope["hx_context_id"] = claims.get("cid", "")
+                self.log.debug("NOTIFY {} via ticket".format(scope["hxat_auth"]))
+                return await self.app(scope, receive, send)
+
         session_id = parsed_query.get(b"utm_source", [b""])[0].decode()
         resource_link_id = parsed_query.get(b"resource_link_id", [b""])[0].decode()
 
@@ -78,12 +93,11 @@ class SessionAuthMiddleware(object):
         # close old db conn to prevent usage of timed out conn
         # see https://channels.readthedocs.io/en/latest/topics/authentication.html#custom-authentication
         close_old_connections()
-        session_exists = await _async_session_exists(session_id)
-        if not session_exists:
+        multi_launch = await _async_session_get_ltilaunch(session_id)
+        if multi_launch is None:
             scope["hxat_auth"] = "403: unknown session-id({})".format(session_id)
         else:
             # get lti params from session
-            multi_launch = await _async_session_get_ltilaunch(session_id)
             lti_launch = multi_launch.get(resource_link_id, {})
             lti_params = lti_launch.get("launch_params", {})
 
@@ -92,13 +106,23 @@ class SessionAuthMiddleware(object):
 
             # get used_id
             scope["hx_user_id"] = lti_launch.get("hx_user_id", "anonymous")
+            scope["hx_is_staff"] = lti_launch.get("is_staff", False)
+            scope["hx_context_id"] = lti_launch.get("hx_context_id", "")
 
             # check the context-id matches the channel being connected
             pat = re.compile("[^a-zA-Z0-9-.]")
             clean_context_id = pat.sub("-", lti_launch.get("hx_context_id", ""))
             clean_collection_id = pat.sub("-", lti_launch.get("hx_collection_id", ""))
             clean_target_id = str(lti_launch.get("hx_object_id", ""))
-            if clean_context_id == context:
+            if context is None:
+                # multiplexed socket only needs a launch for this resource-link
+                if lti_launch.get("hx_context_id"):
+                    scope["hxat_auth"] = "authenticated"
+                else:
+                    scope["hxat_auth"] = "403: unknown resource-link-id({})".format(
+                        resource_link_id
+                    )
+            elif clean_context_id == context:
                 if clean_collection_id == collection:
                     if clean_target_id == tgt:
                         scope["hxat_auth"] = "authenticated"
@@ -0,0 +1,157 @@
+"""
+Approximate count of live notification sockets per room.
+
+Consumers count themselves in when they join a room and out when they leave,
+so a count is one integer per room, kept until the room has been quiet for
+`ttl` seconds. Counts are of sockets, not of distinct users: a student with
+the same target open in two tabs counts twice. A process that dies without
+running its disconnects leaves its sockets counted until the room expires;
+with HXAT_NOTIFY_GROUP_REFRESH set, live sockets keep touching their rooms so
+a shorter `ttl` can be used.
+
+Set up like the event log, in settings.HXAT_NOTIFY_PRESENCE:
+
+    HXAT_NOTIFY_PRESENCE = {
+        "backend": "redis",  # or "memory", or "" to disable
+        "ttl": 3600,         # seconds a quiet room's count is kept
+        "redis_url": "redis://localhost:6379/0",
+    }
+
+Counts kept by the "memory" backend are per process.
+"""
+import logging
+import threading
+import time
+
+from hxat.backends import ConfiguredBackend, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class Presence(object):
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+
+    def join(self, room):
+        """counts a socket into `room`; returns the new count."""
+        raise NotImplementedError
+
+    def leave(self, room):
+        """counts a socket out of `room`; returns the new count."""
+        raise NotImplementedError
+
+    def touch(self, room):
+        """keeps `room` from expiring while it has live sockets."""
+        raise NotImplementedError
+
+    def counts(self, rooms):
+        """returns {room: count} for `rooms`."""
+        raise NotImplementedError
+
+
+class InMemoryPresence(Presence):
+    def __init__(self, ttl=3600):
+        super(InMemoryPresence, self).__init__(ttl)
+        self._rooms = {}  # room -> [count, expires_at]
+        self._lock = threading.Lock()
+
+    def _add(self, room, delta):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rooms.get(room)
+            if entry is None or entry[1] < now:
+                entry = [0, 0]
+            entry[0] = max(0, entry[0] + delta)
+            entry[1] = now + self.ttl
+            if entry[0]:
+                self._rooms[room] = entry
+            else:
+                self._rooms.pop(room, None)
+            return entry[0]
+
+    def join(self, room):
+        return self._add(room, 1)
+
+    def leave(self, room):
+        return self._add(room, -1)
+
+    def touch(self, room):
+        self._add(room, 0)
+
+    def counts(self, rooms):
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for room in rooms:
+                entry = self._rooms.get(room)
+                result[room] = entry[0] if entry and entry[1] >= now else 0
+            return result
+
+
+class RedisPresence(Presence):
+    KEY_PREFIX = "hxat:notify:presence:"
+
+    # a count never goes below zero; a room at zero is deleted.
+    LEAVE_SCRIPT = """
+    local n = redis.call('DECR', KEYS[1])
+    if n <= 0 then
+        redis.call('DEL', KEYS[1])
+        return 0
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return n
+    """
+
+    def __init__(self, ttl=3600, redis_url=None):
+        super(RedisPresence, self).__init__(ttl)
+        self.client = redis_client(redis_url, "notification presence")
+        self._leave = self.client.register_script(self.LEAVE_SCRIPT)
+
+    def _key(self, room):
+        return "{}{}".format(self.KEY_PREFIX, room)
+
+    def join(self, room):
+        pipe = self.client.pipeline()
+        pipe.incr(self._key(room))
+        pipe.expire(self._key(room), self.ttl)
+        count, _ = pipe.execute()
+        return int(count)
+
+    def leave(self, room):
+        return int(self._leave(keys=[self._key(room)], args=[self.ttl]))
+
+    def touch(self, room):
+        self.client.expire(self._key(room), self.ttl)
+
+    def counts(self, rooms):
+        rooms = list(rooms)
+        if not rooms:
+            return {}
+        values = self.client.mget([self._key(room) for room in rooms])
+        return {room: max(0, int(v or 0)) for room, v in zip(rooms, values)}
+
+
+get_presence = ConfiguredBackend(
+    "HXAT_NOTIFY_PRESENCE",
+    "notification presence",
+    {
+        "memory": lambda config: InMemoryPresence(ttl=int(config.get("ttl", 3600))),
+        "redis": lambda config: RedisPresence(
+            ttl=int(config.get("ttl", 3600)), redis_url=config.get("redis_url")
+        ),
+    },
+)
+
+
+def is_listened(room):
+    """
+    False only if presence is shared by all processes (redis) and counts no
+    socket in `room`; True when it cannot tell.
+    """
+    if get_presence.backend != "redis":
+        return True
+    try:
+        return get_presence().counts([room])[room] > 0
+    except Exception as e:
+        logger.warning("unable to count presence for {}: {}".format(room, e))
+        return True
@@ -0,0 +1,238 @@
+"""
+Publishes annotation notifications to the channel layer.
+
+By default each notification is a separate `group_send`. When
+HXAT_NOTIFY_COALESCE_WINDOW_MS is set, notifications are buffered per group and
+flushed as a single batch event when either:
+
+    - the batch reaches HXAT_NOTIFY_COALESCE_MAX_BATCH events,
+    - the group has been idle for HXAT_NOTIFY_COALESCE_IDLE_MS, or
+    - the first event in the batch is HXAT_NOTIFY_COALESCE_WINDOW_MS old.
+
+Batches are flushed from a background thread with its own event loop, so the
+request that triggered the notification does not wait for the channel layer.
+
+Sends go through the circuit breaker in notification.health, when enabled:
+while it is open, notifications are dropped without trying the channel layer.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+import channels.layers
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from . import acl, metrics
+from .eventlog import get_event_log
+from .health import get_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch(object):
+    __slots__ = ("events", "first", "last")
+
+    def __init__(self, now):
+        self.events = []
+        self.first = now
+        self.last = now
+
+
+class NotificationCoalescer(object):
+    """buffers notification events per group and flushes them in batches."""
+
+    def __init__(self, channel_layer, window_ms, idle_ms=None, max_batch=50):
+        self.channel_layer = channel_layer
+        self.window = window_ms / 1000.0
+        # flush on idle defaults to a quarter of the window
+        self.idle = (idle_ms if idle_ms else window_ms / 4.0) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._loop = None
+        self._stopped = False
+
+    def add(self, group, event):
+        now = time.monotonic()
+        with self._cond:
+            batch = self._pending.get(group)
+            if batch is None:
+                batch = self._pending[group] = _PendingBatch(now)
+            batch.events.append(event)
+            batch.last = now
+            self._ensure_thread()
+            self._cond.notify()
+
+    def flush(self):
+        """sends all pending batches now; returns number of batches sent."""
+        with self._cond:
+            due = [(g, b, "forced") for g, b in self._pending.items()]
+            self._pending = {}
+        for group, batch, reason in due:
+            self._send(group, batch, reason)
+        return len(due)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush()
+
+    def _ensure_thread(self):
+        # must be called with self._cond held
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._run, name="hxat-notify-coalescer", daemon=True
+            )
+            self._thread.start()
+
+    def _collect_due(self, now):
+        # must be called with self._cond held
+        due = []
+        next_deadline = None
+        for group, batch in list(self._pending.items()):
+            deadline = min(batch.first + self.window, batch.last + self.idle)
+            if len(batch.events) >= self.max_batch:
+                due.append((group, batch, "size"))
+            elif now >= batch.first + self.window:
+                due.append((group, batch, "window"))
+            elif now >= batch.last + self.idle:
+                due.append((group, batch, "idle"))
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        for group, _, _ in due:
+            del self._pending[group]
+        return due, next_deadline
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        while True:
+            with self._cond:
+                due, next_deadline = self._collect_due(time.monotonic())
+                if not due:
+                    if self._stopped:
+                        break
+                    timeout = None
+                    if next_deadline is not None:
+                        timeout = max(0.0, next_deadline - time.monotonic())
+                    self._cond.wait(timeout)
+                    continue
+            for group, batch, reason in due:
+                self._send(group, batch, reason)
+        self._loop.close()
+
+    def _send(self, group, batch, reason):
+        breaker = get_breaker()
+        if breaker is not None and breaker.is_open:
+            metrics.counter("notify.breaker.skipped").inc(len(batch.events))
+            return
+        delay_ms = (time.monotonic() - batch.first) * 1000.0
+        metrics.histogram("notify.coalesce.batch_size").observe(len(batch.events))
+        metrics.histogram("notify.coalesce.delay_ms").observe(delay_ms)
+        metrics.counter("notify.coalesce.flush.{}".format(reason)).inc()
+
+        if len(batch.events) == 1:
+            event = batch.events[0]
+        else:
+            event = {"type": "annotation_notification_batch", "messages": batch.events}
+        try:
+            self._group_send(group, event)
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure()
+            metrics.counter("notify.errors").inc()
+            logger.error(
+                "##### unable to notify batch: group({}) size({}): {}".format(
+                    group, len(batch.events), e
+                ),
+                exc_info=settings.HXAT_NOTIFY_ERRORLOG,
+            )
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            logger.debug(
+                "flushed batch: group({}) size({}) reason({}) delay({:.1f}ms)".format(
+                    group, len(batch.events), reason, delay_ms
+                )
+            )
+
+    def _group_send(self, group, event):
+        if self._loop is not None and threading.current_thread() is self._thread:
+            self._loop.run_until_complete(self.channel_layer.group_send(group, event))
+        else:
+            async_to_sync(self.channel_layer.group_send)(group, event)
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    """returns the process-wide coalescer, or None if coalescing is disabled."""
+    global _coalescer
+    window_ms = getattr(settings, "HXAT_NOTIFY_COALESCE_WINDOW_MS", 0)
+    if not window_ms:
+        return None
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = NotificationCoalescer(
+                channels.layers.get_channel_layer(),
+                window_ms=window_ms,
+                idle_ms=getattr(settings, "HXAT_NOTIFY_COALESCE_IDLE_MS", 0),
+                max_batch=getattr(settings, "HXAT_NOTIFY_COALESCE_MAX_BATCH", 50),
+            )
+            atexit.register(_coalescer.stop)
+        return _coalescer
+
+
+def publish(channel_layer, group, event):
+    """
+    sends `event` to `group`, either right away or via the coalescer.
+
+    if the event carries read permissions in `event["read"]`, it is only sent
+    to the sub-groups of `group` allowed to read it (see notification.acl).
+    the event log, when enabled, is kept for `group` as a whole.
+
+    exceptions from the channel layer are raised to the caller when sending
+    right away; coalesced batches log their own errors when flushed. while the
+    circuit breaker is open, the event is dropped.
+    """
+    metrics.counter("notify.events").inc()
+    breaker = get_breaker()
+    if breaker is not None and breaker.is_open:
+        metrics.counter("notify.breaker.skipped").inc()
+        return
+    # consumers in more than one audience group drop duplicates by id
+    event.setdefault("id", uuid.uuid4().hex)
+    # room the event belongs to, for consumers subscribed to more than one
+    event["room"] = group
+    event_log = get_event_log()
+    if event_log is not None:
+        try:
+            event["seq"] = event_log.append(group, event)
+        except Exception as e:
+            # clients that miss this one will resync on reconnect
+            metrics.counter("notify.eventlog.errors").inc()
+            logger.error(
+                "##### unable to log notification: group({}): {}".format(group, e),
+                exc_info=settings.HXAT_NOTIFY_ERRORLOG,
+            )
+    coalescer = get_coalescer()
+    for audience in acl.audience_groups(group, event.get("read")):
+        if coalescer is not None:
+            coalescer.add(audience, event)
+            continue
+        try:
+            async_to_sync(channel_layer.group_send)(audience, event)
+        except Exception:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        if breaker is not None:
+            breaker.record_success()
@@ -4,4 +4,9 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"^ws/notification/(?P<room_name>[^/]+)/$", consumers.NotificationConsumer.as_asgi()),
+    re_path(r"^ws/notification/$", consumers.MultiplexNotificationConsumer.as_asgi()),
+    re_path(
+        r"^ws/notification/dashboard/(?P<context>[^/]+)/$",
+        consumers.DashboardNotificationConsumer.as_asgi(),
+    ),
 ]
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def make_event():
+    """returns a function making the i-th annotation notification event."""
+
+    def _make_event(i):
+        return {
+            "type": "annotation_notification",
+            "message": {"id": i},
+            "action": "annotation_created",
+        }
+
+    return _make_event
+
+
+@pytest.fixture
+def wait_for():
+    """returns a function polling `predicate` until true or `timeout`."""
+
+    def _wait_for(predicate, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.01)
+        return False
+
+    return _wait_for
+
+
+@pytest.fixture
+def authenticated():
+    """returns a function wrapping an asgi app as an authenticated user."""
+
+    def _authenticated(app, user_id="fake_user"):
+        # stands in for SessionAuthMiddleware
+        async def wrapper(scope, receive, send):
+            scope = dict(scope, hxat_auth="authenticated", hx_user_id=user_id)
+            return await app(scope, receive, send)
+
+        return wrapper
+
+    return _authenticated
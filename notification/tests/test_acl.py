@@ -0,0 +1,140 @@
+import json
+
+import pytest
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification import acl
+from notification.consumers import NotificationConsumer
+from notification.publisher import publish
+
+
+def test_audience_groups():
+    assert acl.audience_groups("g", []) == ["g"]
+    assert acl.audience_groups("g", ["u1", "__admin__"]) == [
+        acl.user_group("g", "u1"),
+        acl.staff_group("g"),
+    ]
+
+
+# canvas context ids are 40 characters, collections are uuids
+LONG_CONTEXT = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4"
+LONG_ROOM = "{}--{}--{}".format(
+    LONG_CONTEXT, "5e2a3f9c-0b1d-4c8e-9f6a-7d3b2c1e0f4a", 1234
+)
+
+
+def test_group_names_fit_channels_limit():
+    layer = get_channel_layer()
+    groups = acl.member_groups(LONG_ROOM, "some-long-hx-user-id" * 5, True)
+    groups.append(acl.course_staff_group(LONG_CONTEXT * 3))
+    for group in groups:
+        assert len(group) < 100
+        assert layer.valid_group_name(group)
+
+
+def test_read_acl_formats():
+    assert acl.read_acl({}) == []
+    assert acl.read_acl({"permissions": {"read": ["u1"]}}) == ["u1"]
+    assert acl.read_acl({"permissions": {"can_read": ["u1"]}}) == ["u1"]
+
+
+def test_can_read():
+    assert acl.can_read([], "u2", False)
+    assert acl.can_read(["u1"], "u1", False)
+    assert not acl.can_read(["u1"], "u2", True)
+    assert acl.can_read(["u1", "__admin__"], "u2", True)
+    assert not acl.can_read(["u1", "__admin__"], "u2", False)
+
+
+def as_user(app, user_id, is_staff):
+    async def wrapper(scope, receive, send):
+        scope = dict(
+            scope, hxat_auth="authenticated", hx_user_id=user_id, hx_is_staff=is_staff
+        )
+        return await app(scope, receive, send)
+
+    return wrapper
+
+
+async def connect(user_id, is_staff=False, room="course--coll--1"):
+    application = as_user(
+        URLRouter(
+            [
+                re_path(
+                    r"^ws/notification/(?P<room_name>[^/]+)/$",
+                    NotificationConsumer.as_asgi(),
+                )
+            ]
+        ),
+        user_id,
+        is_staff,
+    )
+    communicator = WebsocketCommunicator(
+        application, "/ws/notification/{}/".format(room)
+    )
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def received_ids(communicator):
+    ids = []
+    while not await communicator.receive_nothing(timeout=0.1):
+        frame = json.loads(await communicator.receive_from())
+        ids.append(frame["message"])
+    return ids
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "read, expected",
+    [
+        ([], {"author": 1, "student": 1, "staff": 1}),
+        (["author"], {"author": 1, "student": 0, "staff": 0}),
+        (["author", "__admin__"], {"author": 1, "student": 0, "staff": 1}),
+        # staff author is in both audience groups, but gets it once
+        (["staff", "__admin__"], {"author": 0, "student": 0, "staff": 1}),
+    ],
+)
+async def test_fanout_by_read_permissions(read, expected):
+    sockets = {
+        "author": await connect("author"),
+        "student": await connect("student"),
+        "staff": await connect("staff", is_staff=True),
+    }
+    await sync_to_async(publish)(
+        get_channel_layer(),
+        "course--coll--1",
+        {
+            "type": "annotation_notification",
+            "message": {"id": 1},
+            "action": "annotation_created",
+            "read": read,
+        },
+    )
+    for name, communicator in sockets.items():
+        assert len(await received_ids(communicator)) == expected[name], name
+        await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_fanout_in_long_room():
+    author = await connect("author", room=LONG_ROOM)
+    staff = await connect("staff", is_staff=True, room=LONG_ROOM)
+    await sync_to_async(publish)(
+        get_channel_layer(),
+        LONG_ROOM,
+        {
+            "type": "annotation_notification",
+            "message": {"id": 1},
+            "action": "annotation_created",
+            "read": ["author"],
+        },
+    )
+    assert len(await received_ids(author)) == 1
+    assert len(await received_ids(staff)) == 0
+    await author.disconnect()
+    await staff.disconnect()
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification.consumers import NotificationConsumer
+
+
+class SlowConsumer(NotificationConsumer):
+    """consumer whose socket writes block until `gate` is set."""
+
+    gate = None
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        await self.gate.wait()
+        await super(SlowConsumer, self).send(text_data, bytes_data, close)
+
+
+@pytest.fixture
+def flood(settings, authenticated, make_event):
+    async def _flood(policy, count=5):
+        settings.HXAT_NOTIFY_SEND_BUFFER = 2
+        settings.HXAT_NOTIFY_SEND_BUFFER_POLICY = policy
+        SlowConsumer.gate = asyncio.Event()
+        application = authenticated(
+            URLRouter(
+                [
+                    re_path(
+                        r"^ws/notification/(?P<room_name>[^/]+)/$",
+                        SlowConsumer.as_asgi(),
+                    )
+                ]
+            )
+        )
+        communicator = WebsocketCommunicator(
+            application, "/ws/notification/course--coll--1/"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+
+        layer = get_channel_layer()
+        for i in range(1, count + 1):
+            await layer.group_send("course--coll--1", make_event(i))
+        await asyncio.sleep(0.1)  # let the consumer queue them all
+        SlowConsumer.gate.set()
+        return communicator
+
+    return _flood
+
+
+async def receive_all(communicator):
+    frames = []
+    while not await communicator.receive_nothing(timeout=0.1):
+        frames.append(json.loads(await communicator.receive_from()))
+    return frames
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest(flood):
+    communicator = await flood("drop_oldest")
+    frames = await receive_all(communicator)
+    # 1 was already being written when the buffer filled up
+    assert [f["message"] for f in frames] == ["{'id': 1}", "{'id': 4}", "{'id': 5}"]
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_resync(flood):
+    communicator = await flood("resync")
+    frames = await receive_all(communicator)
+    assert [f["type"] for f in frames] == [
+        "annotation_created",
+        "resync_required",
+        "annotation_created",
+    ]
+    assert frames[-1]["message"] == "{'id': 5}"
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_disconnect(flood):
+    communicator = await flood("disconnect")
+    output = await communicator.receive_output()
+    assert output == {"type": "websocket.close", "code": 4008}
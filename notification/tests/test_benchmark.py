@@ -0,0 +1,53 @@
+import sys
+from io import StringIO
+from types import ModuleType
+from unittest.mock import Mock, patch
+
+import pytest
+from channels.layers import InMemoryChannelLayer
+from django.core.management import CommandError, call_command
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_benchmark_delivers_all():
+    out = StringIO()
+    call_command(
+        "notification_benchmark", sockets=6, groups=2, events=4, stdout=out,
+    )
+    report = out.getvalue()
+    # 3 sockets per group, 2 events per group
+    assert "delivered: 12/12" in report
+    assert "fan-out latency p99" in report
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_benchmark_redis_layer():
+    # stands in for a redis server: the layer is built as for redis, but the
+    # messages go through memory
+    channels_redis_core = ModuleType("channels_redis.core")
+    channels_redis_core.RedisChannelLayer = Mock(
+        side_effect=lambda hosts: InMemoryChannelLayer(capacity=10000)
+    )
+    out = StringIO()
+    with patch.dict(sys.modules, {"channels_redis.core": channels_redis_core}):
+        call_command(
+            "notification_benchmark",
+            sockets=4,
+            groups=2,
+            events=2,
+            layer="redis",
+            redis_url="redis://redis.test:6379/0",
+            stdout=out,
+        )
+    channels_redis_core.RedisChannelLayer.assert_called_once_with(
+        hosts=["redis://redis.test:6379/0"]
+    )
+    report = out.getvalue()
+    assert "layer(redis)" in report
+    assert "delivered: 4/4" in report
+
+
+def test_notification_benchmark_redis_layer_needs_channels_redis():
+    with patch.dict(sys.modules, {"channels_redis.core": None}):
+        with pytest.raises(CommandError, match="channels_redis is required"):
+            call_command("notification_benchmark", layer="redis", stdout=StringIO())
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification import presence
+from notification.acl import course_staff_group
+from notification.consumers import DashboardNotificationConsumer
+from notification.presence import InMemoryPresence
+
+COURSE_ID = "course-v1:HarvardX+HxAT101+2020"
+CLEAN_COURSE_ID = "course-v1-HarvardX-HxAT101-2020"
+
+
+def communicator_for(context, is_staff=True, context_id=COURSE_ID):
+    app = URLRouter(
+        [
+            re_path(
+                r"^ws/notification/dashboard/(?P<context>[^/]+)/$",
+                DashboardNotificationConsumer.as_asgi(),
+            )
+        ]
+    )
+
+    async def application(scope, receive, send):
+        # stands in for SessionAuthMiddleware
+        scope = dict(
+            scope,
+            hxat_auth="authenticated",
+            hx_user_id="instructor",
+            hx_is_staff=is_staff,
+            hx_context_id=context_id,
+        )
+        return await app(scope, receive, send)
+
+    return WebsocketCommunicator(
+        application, "/ws/notification/dashboard/{}/".format(context)
+    )
+
+
+@pytest.mark.asyncio
+async def test_dashboard_receives_course_events():
+    communicator = communicator_for(CLEAN_COURSE_ID)
+    connected, _ = await communicator.connect()
+    assert connected
+
+    row = {"id": "a1", "user_id": "student", "text": "hello"}
+    await get_channel_layer().group_send(
+        course_staff_group(CLEAN_COURSE_ID),
+        {"type": "dashboard_notification", "action": "annotation_created", "row": row},
+    )
+    assert json.loads(await communicator.receive_from()) == {
+        "type": "annotation_created",
+        "row": row,
+    }
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_dashboard_requires_staff():
+    communicator = communicator_for(CLEAN_COURSE_ID, is_staff=False)
+    connected, _ = await communicator.connect()
+    assert not connected
+
+
+@pytest.mark.asyncio
+async def test_dashboard_requires_launch_in_course():
+    communicator = communicator_for("course-v1-HarvardX-Other-2020")
+    connected, _ = await communicator.connect()
+    assert not connected
+
+
+@pytest.mark.asyncio
+async def test_dashboard_coalesced_events_sent_once():
+    communicator = communicator_for(CLEAN_COURSE_ID)
+    connected, _ = await communicator.connect()
+    assert connected
+
+    event = {
+        "type": "dashboard_notification",
+        "action": "annotation_deleted",
+        "row": {"id": "a2"},
+    }
+    group = course_staff_group(CLEAN_COURSE_ID)
+    await get_channel_layer().group_send(
+        group,
+        {"type": "annotation_notification_batch", "messages": [dict(event, id="e1")]},
+    )
+    await get_channel_layer().group_send(group, dict(event, id="e1"))
+    assert json.loads(await communicator.receive_from()) == {
+        "type": "annotation_deleted",
+        "row": {"id": "a2"},
+    }
+    assert await communicator.receive_nothing()
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_dashboard_counted_in_presence(settings, monkeypatch):
+    settings.HXAT_NOTIFY_PRESENCE = {"backend": "memory"}
+    counter = InMemoryPresence()
+    monkeypatch.setattr(presence.get_presence, "instance", counter)
+    group = course_staff_group(CLEAN_COURSE_ID)
+
+    communicator = communicator_for(CLEAN_COURSE_ID)
+    connected, _ = await communicator.connect()
+    assert connected
+    assert counter.counts([group]) == {group: 1}
+    await communicator.disconnect()
+    assert counter.counts([group]) == {group: 0}
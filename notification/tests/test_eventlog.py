@@ -0,0 +1,147 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification import eventlog
+from notification.consumers import NotificationConsumer
+from notification.eventlog import InMemoryEventLog, RedisEventLog
+
+
+def test_memory_log_replays_since(make_event):
+    log = InMemoryEventLog(size=3)
+    for i in range(1, 4):
+        assert log.append("g", make_event(i)) == i
+
+    events, complete = log.since("g", 1)
+    assert complete
+    assert [seq for seq, _ in events] == [2, 3]
+    assert log.since("g", 3) == ([], True)
+
+
+def test_memory_log_requires_resync_when_gap_too_large(make_event):
+    log = InMemoryEventLog(size=3)
+    for i in range(1, 6):
+        log.append("g", make_event(i))
+
+    # events 2 and 3 fell off the ring
+    assert log.since("g", 1) == ([], False)
+    assert log.since("g", 2)[1]
+    # seq from before the log was reset
+    assert log.since("g", 10) == ([], False)
+    assert log.since("unknown", 4) == ([], False)
+
+
+def redis_member(seq, event):
+    # as stored by RedisEventLog.APPEND_SCRIPT: cjson.encode({seq, ARGV[1]})
+    return json.dumps([seq, json.dumps(event)]).encode("utf-8")
+
+
+def test_redis_log_appends_in_one_script_call(make_event):
+    with patch("hxat.backends.redis") as redis:
+        log = RedisEventLog(size=3, ttl=60, redis_url="redis://redis.test:6379/0")
+    redis.Redis.from_url.assert_called_once_with("redis://redis.test:6379/0")
+    client = redis.Redis.from_url.return_value
+    client.register_script.assert_called_once_with(RedisEventLog.APPEND_SCRIPT)
+    append = client.register_script.return_value
+    append.return_value = 7
+
+    assert log.append("g", make_event(7)) == 7
+    append.assert_called_once_with(
+        keys=("hxat:notify:log:g:seq", "hxat:notify:log:g:events"),
+        args=[json.dumps(make_event(7)), 3, 60],
+    )
+
+
+def test_redis_log_replays_since(make_event):
+    with patch("hxat.backends.redis") as redis:
+        log = RedisEventLog(size=3, ttl=60)
+    pipe = redis.Redis.from_url.return_value.pipeline.return_value
+    # the ring has events 5 to 7
+    oldest = [(redis_member(5, make_event(5)), 5.0)]
+    newer = [redis_member(6, make_event(6)), redis_member(7, make_event(7))]
+
+    pipe.execute.return_value = [b"7", oldest, newer]
+    assert log.since("g", 5) == ([(6, make_event(6)), (7, make_event(7))], True)
+    pipe.get.assert_called_with("hxat:notify:log:g:seq")
+    pipe.zrangebyscore.assert_called_with("hxat:notify:log:g:events", "(5", "+inf")
+
+    # event 4 fell off the ring
+    pipe.execute.return_value = [b"7", oldest, newer]
+    assert log.since("g", 3) == ([], False)
+    # group expired, or never seen
+    pipe.execute.return_value = [None, [], []]
+    assert log.since("g", 0) == ([], True)
+    assert log.since("g", 4) == ([], False)
+
+
+def test_memory_log_is_per_group(make_event):
+    log = InMemoryEventLog(size=3)
+    log.append("g1", make_event(1))
+    assert log.append("g2", make_event(2)) == 1
+
+
+@pytest.fixture
+def memory_eventlog(settings, monkeypatch):
+    settings.HXAT_NOTIFY_EVENTLOG = {"backend": "memory", "size": 3}
+    log = InMemoryEventLog(size=3)
+    monkeypatch.setattr(eventlog.get_event_log, "instance", log)
+    return log
+
+
+@pytest.fixture
+def connect(authenticated):
+    async def _connect(query):
+        application = authenticated(
+            URLRouter(
+                [
+                    re_path(
+                        r"^ws/notification/(?P<room_name>[^/]+)/$",
+                        NotificationConsumer.as_asgi(),
+                    )
+                ]
+            )
+        )
+        communicator = WebsocketCommunicator(
+            application, "/ws/notification/course--coll--1/{}".format(query)
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    return _connect
+
+
+@pytest.mark.asyncio
+async def test_consumer_replays_missed_events(memory_eventlog, connect, make_event):
+    for i in range(1, 4):
+        memory_eventlog.append("course--coll--1", make_event(i))
+
+    communicator = await connect("?since=1")
+    frames = [json.loads(await communicator.receive_from()) for _ in range(2)]
+    assert [f["seq"] for f in frames] == [2, 3]
+    assert frames[0]["message"] == "{'id': 2}"
+
+    # live event already sent by replay is dropped, next one goes through
+    layer = get_channel_layer()
+    await layer.group_send("course--coll--1", dict(make_event(3), seq=3))
+    await layer.group_send("course--coll--1", dict(make_event(4), seq=4))
+    frame = json.loads(await communicator.receive_from())
+    assert frame["seq"] == 4
+    assert await communicator.receive_nothing()
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_consumer_asks_for_resync(memory_eventlog, connect, make_event):
+    for i in range(1, 6):
+        memory_eventlog.append("course--coll--1", make_event(i))
+
+    communicator = await connect("?since=1")
+    frame = json.loads(await communicator.receive_from())
+    assert frame == {"type": "resync_required"}
+    assert await communicator.receive_nothing()
+    await communicator.disconnect()
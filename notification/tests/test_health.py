@@ -0,0 +1,71 @@
+import pytest
+from notification import health
+from notification.health import CircuitBreaker
+from notification.publisher import publish
+
+
+class FlakyChannelLayer(object):
+    def __init__(self):
+        self.down = True
+        self.attempts = 0
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.attempts += 1
+        if self.down:
+            raise ConnectionError("redis is down")
+        self.sent.append((group, event))
+
+
+class Probe(object):
+    def __init__(self, layer):
+        self.layer = layer
+
+    def __call__(self):
+        if self.layer.down:
+            raise ConnectionError("still down")
+
+
+@pytest.fixture
+def breaker(settings, monkeypatch):
+    settings.HXAT_NOTIFY_COALESCE_WINDOW_MS = 0
+    settings.HXAT_NOTIFY_EVENTLOG = {}
+    layer = FlakyChannelLayer()
+    breaker = CircuitBreaker(Probe(layer), failures=2, probe_interval=0.01)
+    monkeypatch.setattr(health, "_breaker", breaker)
+    settings.HXAT_NOTIFY_BREAKER_FAILURES = 2
+    return breaker, layer
+
+
+def test_breaker_opens_after_consecutive_failures(breaker, make_event):
+    breaker, layer = breaker
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            publish(layer, "course--coll--1", make_event(1))
+    assert breaker.is_open
+
+    # skipped without trying the channel layer
+    publish(layer, "course--coll--1", make_event(2))
+    assert layer.attempts == 2
+    layer.down = False  # lets the probe thread finish
+
+
+def test_breaker_closes_when_probe_succeeds(breaker, make_event, wait_for):
+    breaker, layer = breaker
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            publish(layer, "course--coll--1", make_event(1))
+    assert breaker.is_open
+
+    layer.down = False
+    assert wait_for(lambda: not breaker.is_open)
+    publish(layer, "course--coll--1", make_event(3))
+    assert [e["message"]["id"] for (_, e) in layer.sent] == [3]
+
+
+def test_success_resets_failure_count(breaker):
+    breaker, layer = breaker
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
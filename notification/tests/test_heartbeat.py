@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification import metrics
+from notification.consumers import NotificationConsumer
+
+
+@pytest.fixture
+def connect(settings, authenticated):
+    async def _connect(ping, idle, refresh=0):
+        settings.HXAT_NOTIFY_PING_INTERVAL = ping
+        settings.HXAT_NOTIFY_IDLE_TIMEOUT = idle
+        settings.HXAT_NOTIFY_GROUP_REFRESH = refresh
+        application = authenticated(
+            URLRouter(
+                [
+                    re_path(
+                        r"^ws/notification/(?P<room_name>[^/]+)/$",
+                        NotificationConsumer.as_asgi(),
+                    )
+                ]
+            )
+        )
+        communicator = WebsocketCommunicator(
+            application, "/ws/notification/course--coll--1/"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    return _connect
+
+
+@pytest.mark.asyncio
+async def test_idle_socket_is_reaped(connect):
+    reaped = metrics.counter("notify.connections.reaped").value
+    communicator = await connect(ping=0.1, idle=0.3)
+
+    assert json.loads(await communicator.receive_from()) == {"type": "ping"}
+    output = await communicator.receive_output(timeout=2)
+    while output["type"] == "websocket.send":  # more pings before the timeout
+        output = await communicator.receive_output(timeout=2)
+    assert output == {"type": "websocket.close", "code": 4000}
+    assert metrics.counter("notify.connections.reaped").value == reaped + 1
+
+
+@pytest.mark.asyncio
+async def test_pong_keeps_socket_alive(connect):
+    live = metrics.gauge("notify.connections.live").value
+    communicator = await connect(ping=0.1, idle=0.3)
+    assert metrics.gauge("notify.connections.live").value == live + 1
+
+    for _ in range(6):
+        assert json.loads(await communicator.receive_from()) == {"type": "ping"}
+        await communicator.send_to(text_data=json.dumps({"type": "pong"}))
+
+    # client pings are answered too
+    await communicator.send_to(text_data=json.dumps({"type": "ping"}))
+    frames = [json.loads(await communicator.receive_from()) for _ in range(2)]
+    assert {"type": "pong"} in frames
+    await communicator.disconnect()
+    assert metrics.gauge("notify.connections.live").value == live
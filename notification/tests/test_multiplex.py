@@ -0,0 +1,124 @@
+import json
+
+import pytest
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.urls import re_path
+from hx_lti_assignment.models import Assignment, AssignmentTargets
+from hx_lti_initializer.models import LTICourse
+from notification.consumers import MultiplexNotificationConsumer
+from notification.publisher import publish
+from target_object_database.models import TargetObject
+
+COURSE_ID = "course-v1:HarvardX+HxAT101+2020"
+CLEAN_COURSE_ID = "course-v1-HarvardX-HxAT101-2020"
+
+
+def make_target(is_published=True):
+    course, _ = LTICourse.objects.get_or_create(course_id=COURSE_ID)
+    assignment = Assignment.objects.create(
+        course=course,
+        assignment_name="multiplex",
+        is_published=is_published,
+        pagination_limit=settings.ANNOTATION_PAGINATION_LIMIT_DEFAULT,
+        annotation_database_url=settings.ANNOTATION_DB_URL,
+        annotation_database_apikey=settings.ANNOTATION_DB_API_KEY,
+        annotation_database_secret_token=settings.ANNOTATION_DB_SECRET_TOKEN,
+    )
+    target_object = TargetObject.objects.create(
+        target_title="multiplex", target_author="someone", target_type="tx"
+    )
+    AssignmentTargets.objects.create(
+        assignment=assignment, target_object=target_object, order=1
+    )
+    return "{}--{}--{}".format(CLEAN_COURSE_ID, assignment.assignment_id, target_object.id)
+
+
+async def connect(is_staff=False):
+    app = URLRouter(
+        [re_path(r"^ws/notification/$", MultiplexNotificationConsumer.as_asgi())]
+    )
+
+    async def application(scope, receive, send):
+        # stands in for SessionAuthMiddleware
+        scope = dict(
+            scope,
+            hxat_auth="authenticated",
+            hx_user_id="student",
+            hx_is_staff=is_staff,
+            hx_context_id=COURSE_ID,
+        )
+        return await app(scope, receive, send)
+
+    communicator = WebsocketCommunicator(application, "/ws/notification/")
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def request(communicator, action, room):
+    await communicator.send_to(text_data=json.dumps({"type": action, "room": room}))
+    return json.loads(await communicator.receive_from())
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_subscribe_to_several_rooms():
+    room1 = await sync_to_async(make_target)()
+    room2 = await sync_to_async(make_target)()
+    communicator = await connect()
+
+    assert await request(communicator, "subscribe", room1) == {
+        "type": "subscribed",
+        "room": room1,
+    }
+    # hxighlighter appends a canvas-id to image targets
+    assert (await request(communicator, "subscribe", room2 + "-canvas1"))[
+        "type"
+    ] == "subscribed"
+
+    event = {
+        "type": "annotation_notification",
+        "message": {"id": 1},
+        "action": "annotation_created",
+    }
+    await sync_to_async(publish)(get_channel_layer(), room1, dict(event))
+    frame = json.loads(await communicator.receive_from())
+    assert frame["room"] == room1
+    assert frame["type"] == "annotation_created"
+
+    assert (await request(communicator, "unsubscribe", room1))["type"] == "unsubscribed"
+    await sync_to_async(publish)(get_channel_layer(), room1, dict(event))
+    assert await communicator.receive_nothing()
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_subscription_is_authorized_against_launch():
+    room = await sync_to_async(make_target)()
+    unpublished = await sync_to_async(make_target)(is_published=False)
+    context, collection, target = room.split("--")
+    communicator = await connect()
+
+    denied = [
+        "other-course--{}--{}".format(collection, target),
+        "{}--{}--{}".format(context, collection, int(target) + 1000),
+        "{}--not-an-assignment--{}".format(context, target),
+        unpublished,
+        "malformed",
+    ]
+    for r in denied:
+        response = await request(communicator, "subscribe", r)
+        assert response["type"] == "subscription_denied", r
+    await communicator.disconnect()
+
+    # staff can subscribe to unpublished assignments
+    communicator = await connect(is_staff=True)
+    assert (await request(communicator, "subscribe", unpublished))[
+        "type"
+    ] == "subscribed"
+    await communicator.disconnect()
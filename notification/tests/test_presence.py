@@ -0,0 +1,159 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.exceptions import PermissionDenied
+from django.test import RequestFactory
+from django.urls import re_path
+from notification import presence
+from notification.consumers import NotificationConsumer
+from notification.presence import InMemoryPresence, RedisPresence
+from notification.views import notification_presence
+
+ROOM = "course--coll--1"
+
+
+def test_memory_presence_counts_joins_and_leaves():
+    counter = InMemoryPresence(ttl=60)
+    assert counter.join(ROOM) == 1
+    assert counter.join(ROOM) == 2
+    assert counter.leave(ROOM) == 1
+    assert counter.counts([ROOM, "course--coll--2"]) == {ROOM: 1, "course--coll--2": 0}
+
+
+def test_memory_presence_never_below_zero():
+    counter = InMemoryPresence(ttl=60)
+    assert counter.leave(ROOM) == 0
+    assert counter.join(ROOM) == 1
+
+
+def test_memory_presence_expires_quiet_rooms():
+    counter = InMemoryPresence(ttl=-1)
+    counter.join(ROOM)
+    assert counter.counts([ROOM]) == {ROOM: 0}
+
+
+def test_redis_presence_counts():
+    with patch("hxat.backends.redis") as redis:
+        counter = RedisPresence(ttl=60, redis_url="redis://redis.test:6379/0")
+    redis.Redis.from_url.assert_called_once_with("redis://redis.test:6379/0")
+    client = redis.Redis.from_url.return_value
+    key = "hxat:notify:presence:{}".format(ROOM)
+
+    pipe = client.pipeline.return_value
+    pipe.execute.return_value = [2, True]
+    assert counter.join(ROOM) == 2
+    pipe.incr.assert_called_once_with(key)
+    pipe.expire.assert_called_once_with(key, 60)
+
+    client.register_script.assert_called_once_with(RedisPresence.LEAVE_SCRIPT)
+    leave = client.register_script.return_value
+    leave.return_value = 1
+    assert counter.leave(ROOM) == 1
+    leave.assert_called_once_with(keys=[key], args=[60])
+
+    counter.touch(ROOM)
+    client.expire.assert_called_once_with(key, 60)
+
+    client.mget.return_value = [b"1", None, b"-1"]
+    assert counter.counts([ROOM, "course--coll--2", "course--coll--3"]) == {
+        ROOM: 1,
+        "course--coll--2": 0,
+        "course--coll--3": 0,
+    }
+    assert counter.counts([]) == {}
+    client.mget.assert_called_once()
+
+
+@pytest.fixture
+def memory_presence(settings, monkeypatch):
+    settings.HXAT_NOTIFY_PRESENCE = {"backend": "memory"}
+    counter = InMemoryPresence()
+    monkeypatch.setattr(presence.get_presence, "instance", counter)
+    return counter
+
+
+async def connect(user_id, is_staff=False):
+    app = URLRouter(
+        [
+            re_path(
+                r"^ws/notification/(?P<room_name>[^/]+)/$",
+                NotificationConsumer.as_asgi(),
+            )
+        ]
+    )
+
+    async def application(scope, receive, send):
+        # stands in for SessionAuthMiddleware
+        scope = dict(
+            scope, hxat_auth="authenticated", hx_user_id=user_id, hx_is_staff=is_staff
+        )
+        return await app(scope, receive, send)
+
+    communicator = WebsocketCommunicator(
+        application, "/ws/notification/{}/?batch=0".format(ROOM)
+    )
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def ask(communicator):
+    await communicator.send_to(text_data=json.dumps({"type": "presence"}))
+    return json.loads(await communicator.receive_from())
+
+
+@pytest.mark.asyncio
+async def test_consumer_counts_live_sockets(memory_presence):
+    staff = await connect("instructor", is_staff=True)
+    student = await connect("student")
+    assert await ask(staff) == {"type": "presence", "counts": {ROOM: 2}}
+
+    await student.disconnect()
+    assert await ask(staff) == {"type": "presence", "counts": {ROOM: 1}}
+    await staff.disconnect()
+    assert memory_presence.counts([ROOM]) == {ROOM: 0}
+
+
+@pytest.mark.asyncio
+async def test_consumer_presence_is_staff_only(memory_presence):
+    student = await connect("student")
+    assert await ask(student) == {"type": "presence", "counts": None}
+    await student.disconnect()
+
+
+def presence_request(rooms, is_staff=True):
+    request = RequestFactory().get("/notification/presence/", {"room": rooms})
+    request.LTI = {"is_staff": is_staff, "hx_context_id": "course"}
+    return request
+
+
+def test_presence_view(memory_presence):
+    memory_presence.join(ROOM)
+    response = notification_presence(presence_request([ROOM, "course--coll--2"]))
+    assert json.loads(response.content) == {"counts": {ROOM: 1, "course--coll--2": 0}}
+
+
+def test_presence_view_is_course_scoped(memory_presence):
+    with pytest.raises(PermissionDenied):
+        notification_presence(presence_request(["other--coll--1"]))
+    with pytest.raises(PermissionDenied):
+        notification_presence(presence_request([ROOM], is_staff=False))
+
+
+def test_is_listened(settings, monkeypatch):
+    counter = InMemoryPresence()
+    monkeypatch.setattr(presence.get_presence, "instance", counter)
+    # per process counts cannot tell about other processes
+    settings.HXAT_NOTIFY_PRESENCE = {"backend": "memory"}
+    assert presence.is_listened(ROOM)
+
+    settings.HXAT_NOTIFY_PRESENCE = {"backend": "redis"}
+    assert not presence.is_listened(ROOM)
+    counter.join(ROOM)
+    assert presence.is_listened(ROOM)
+
+    monkeypatch.setattr(counter, "counts", lambda rooms: 1 / 0)
+    assert presence.is_listened("course--coll--2")
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+from notification.consumers import NotificationConsumer
+from notification.publisher import NotificationCoalescer
+
+
+class FakeChannelLayer(object):
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.sent.append((group, event))
+
+
+def test_coalescer_flushes_on_max_batch(make_event, wait_for):
+    layer = FakeChannelLayer()
+    coalescer = NotificationCoalescer(layer, window_ms=60000, idle_ms=60000, max_batch=3)
+    for i in range(3):
+        coalescer.add("course--coll--1", make_event(i))
+
+    assert wait_for(lambda: len(layer.sent) == 1)
+    group, event = layer.sent[0]
+    assert group == "course--coll--1"
+    assert event["type"] == "annotation_notification_batch"
+    assert [m["message"]["id"] for m in event["messages"]] == [0, 1, 2]
+    coalescer.stop()
+
+
+def test_coalescer_flushes_on_idle_per_group(make_event, wait_for):
+    layer = FakeChannelLayer()
+    coalescer = NotificationCoalescer(layer, window_ms=5000, idle_ms=20, max_batch=50)
+    coalescer.add("course--coll--1", make_event(1))
+    coalescer.add("course--coll--2", make_event(2))
+    coalescer.add("course--coll--1", make_event(3))
+
+    assert wait_for(lambda: len(layer.sent) == 2)
+    sent = dict(layer.sent)
+    assert len(sent["course--coll--1"]["messages"]) == 2
+    # a batch of one is sent as a regular notification
+    assert sent["course--coll--2"] == make_event(2)
+    coalescer.stop()
+
+
+def test_coalescer_forced_flush(make_event):
+    layer = FakeChannelLayer()
+    coalescer = NotificationCoalescer(layer, window_ms=60000, idle_ms=60000)
+    coalescer.add("course--coll--1", make_event(1))
+    coalescer.add("course--coll--1", make_event(2))
+    assert coalescer.flush() == 1
+    assert len(layer.sent[0][1]["messages"]) == 2
+    coalescer.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, expected_frames", [("", 2), ("?batch=1", 1)])
+async def test_consumer_batch_frames(
+    query, expected_frames, authenticated, make_event
+):
+    application = authenticated(
+        URLRouter(
+            [
+                re_path(
+                    r"^ws/notification/(?P<room_name>[^/]+)/$",
+                    NotificationConsumer.as_asgi(),
+                )
+            ]
+        )
+    )
+    communicator = WebsocketCommunicator(
+        application, "/ws/notification/course--coll--1/{}".format(query)
+    )
+    connected, _ = await communicator.connect()
+    assert connected
+
+    await get_channel_layer().group_send(
+        "course--coll--1",
+        {
+            "type": "annotation_notification_batch",
+            "messages": [make_event(1), make_event(2)],
+        },
+    )
+    frames = []
+    for _ in range(expected_frames):
+        frames.append(json.loads(await communicator.receive_from()))
+    assert await communicator.receive_nothing()
+
+    if expected_frames == 1:
+        assert [f["type"] for f in frames[0]] == ["annotation_created"] * 2
+    else:
+        assert [f["message"] for f in frames] == ["{'id': 1}", "{'id': 2}"]
+    await communicator.disconnect()
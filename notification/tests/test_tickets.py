@@ -0,0 +1,72 @@
+import time
+
+import jwt
+import pytest
+from django.conf import settings
+from notification.middleware import SessionAuthMiddleware
+from notification.tickets import mint_ticket
+
+
+ROOM_PATH = "/ws/notification/course-v1-x--ad10b1d2--1/"
+
+
+async def call_middleware(query_string, path=ROOM_PATH):
+    captured = {}
+
+    async def app(scope, receive, send):
+        captured.update(scope)
+
+    scope = {
+        "type": "websocket",
+        "path": path,
+        "query_string": query_string.encode(),
+    }
+    await SessionAuthMiddleware(app)(scope, None, None)
+    return captured
+
+
+# no django_db mark: a ticket connect must not touch the database
+@pytest.mark.asyncio
+async def test_ticket_authenticates_without_session():
+    ticket = mint_ticket("user1", "course-v1:x", "ad10b1d2", 1, is_staff=True)
+    scope = await call_middleware("ticket={}".format(ticket))
+    assert scope["hxat_auth"] == "authenticated"
+    assert scope["hx_user_id"] == "user1"
+    assert scope["hx_is_staff"] is True
+
+
+@pytest.mark.asyncio
+async def test_ticket_for_another_room_is_rejected():
+    ticket = mint_ticket("user1", "course-v1:x", "ad10b1d2", 2)
+    scope = await call_middleware("ticket={}".format(ticket))
+    assert scope["hxat_auth"] == "403: missing session-id or resource-link-id"
+
+
+@pytest.mark.asyncio
+async def test_expired_ticket_falls_back_to_session():
+    now = int(time.time())
+    ticket = jwt.encode(
+        {
+            "aud": "hxat-ws",
+            "sub": "user1",
+            "ctx": "course-v1-x",
+            "col": "ad10b1d2",
+            "tgt": "1",
+            "iat": now - 600,
+            "exp": now - 300,
+        },
+        settings.SECRET_KEY,
+        algorithm="HS256",
+    )
+    if isinstance(ticket, bytes):
+        ticket = ticket.decode("utf-8")
+    scope = await call_middleware("ticket={}&resource_link_id=abc".format(ticket))
+    assert scope["hxat_auth"] == "403: missing session-id or resource-link-id"
+
+
+@pytest.mark.asyncio
+async def test_ticket_authenticates_multiplexed_socket():
+    ticket = mint_ticket("user1", "course-v1:x", "ad10b1d2", 2)
+    scope = await call_middleware("ticket={}".format(ticket), path="/ws/notification/")
+    assert scope["hxat_auth"] == "authenticated"
+    assert scope["hx_context_id"] == "course-v1:x"
@@ -1,5 +1,8 @@
-from django.urls import path, re_path
+from django.urls import path
 
 from . import views
 
-urlpatterns = []
+urlpatterns = [
+    path("metrics/", views.notification_metrics, name="notification_metrics"),
+    path("presence/", views.notification_presence, name="notification_presence"),
+]
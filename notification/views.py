@@ -1,3 +1,32 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
 
-# Create your views here.
+from . import metrics
+from .presence import get_presence
+from .tickets import clean_id
+
+
+@staff_member_required
+def notification_metrics(request):
+    """in-process notification metrics, for the process that serves the request."""
+    return JsonResponse(metrics.snapshot())
+
+
+def notification_presence(request):
+    """
+    approximate number of live notification sockets for each
+    `?room=<context>--<collection>--<target>` given, for course staff.
+    rooms must be in the course of the LTI launch.
+    """
+    if not request.LTI["is_staff"]:
+        raise PermissionDenied("You must be a staff member to view presence.")
+    presence = get_presence()
+    if presence is None:
+        return JsonResponse({"error": "presence is not enabled"}, status=404)
+
+    prefix = "{}--".format(clean_id(request.LTI["hx_context_id"]))
+    rooms = request.GET.getlist("room")
+    if any(not room.startswith(prefix) for room in rooms):
+        raise PermissionDenied("Rooms must be in the current course.")
+    return JsonResponse({"counts": presence.counts(rooms)})
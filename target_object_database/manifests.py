@@ -0,0 +1,182 @@
+"""
+Cache of parsed IIIF manifests, for image targets.
+
+An image target's content is the url of its manifest, on an external IIIF
+server. Rather than fetch and parse the whole manifest on every render, the
+cache keeps its parsed metadata (label, canvas ids and labels) along with its
+ETag/Last-Modified, keyed by manifest url. Configured via
+settings.HXAT_MANIFEST_CACHE:
+
+    HXAT_MANIFEST_CACHE = {
+        "cache_alias": "manifests",  # shared by all processes if memcached
+        "ttl": 3600,         # seconds a manifest is used as is
+        "stale_ttl": 604800, # seconds past ttl it is used while revalidated
+        "error_ttl": 60,     # seconds a failed fetch is not retried
+        "timeout": 10,       # seconds to wait on the IIIF server
+    }
+
+A stale manifest is returned right away and revalidated with a conditional
+request in a background thread; only a manifest that is not cached at all
+makes the caller wait on the IIIF server. Only one process revalidates a
+manifest at a time (a lock entry in the cache), and callers of one process
+that miss the same manifest share a single fetch.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "hxat:manifest:"
+
+DEFAULTS = {
+    "cache_alias": "manifests",
+    "ttl": 3600,
+    "stale_ttl": 604800,
+    "error_ttl": 60,
+    "timeout": 10,
+}
+
+# what can go wrong fetching or parsing a manifest
+FETCH_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+_inflight = {}  # url -> threading.Event, set when its fetch is done
+_inflight_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "HXAT_MANIFEST_CACHE", {}))
+    return config
+
+
+def cache_key(url):
+    # urls can be longer than, or have characters not allowed in, cache keys
+    return KEY_PREFIX + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def get_label(label):
+    """returns an iiif label (string, language map or list of them) as text."""
+    if isinstance(label, list):
+        label = label[0] if label else None
+    if isinstance(label, dict):
+        label = label.get("@value")
+    return None if label is None else str(label)
+
+
+def parse_manifest(manifest):
+    """returns the metadata kept from an iiif presentation 2 manifest."""
+    canvases = []
+    for sequence in manifest.get("sequences", [])[:1]:
+        for canvas in sequence.get("canvases", []):
+            canvases.append(
+                {"id": canvas["@id"], "label": get_label(canvas.get("label"))}
+            )
+    return {"label": get_label(manifest.get("label")), "canvases": canvases}
+
+
+def fetch_manifest(url, timeout, entry=None):
+    """
+    fetches the manifest at `url`; with `entry`, the cached entry for it, only
+    if it changed. returns the entry to cache.
+    """
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if entry is not None and response.status_code == 304:
+        return dict(entry, checked_at=time.time())
+    response.raise_for_status()
+    return {
+        "manifest": parse_manifest(json.loads(response.text)),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "checked_at": time.time(),
+    }
+
+
+def get_manifest(url):
+    """
+    returns the metadata of the manifest at `url` (see parse_manifest), or
+    None if it could not be fetched or parsed.
+    """
+    config = get_config()
+    cache = caches[config["cache_alias"]]
+    key = cache_key(url)
+    entry = cache.get(key)
+    if entry is None:
+        return _load(url, config)
+    if (
+        entry["manifest"] is not None
+        and time.time() - entry["checked_at"] >= config["ttl"]
+        and cache.add(
+            key + ":lock", 1, max(config["error_ttl"], config["timeout"])
+        )
+    ):
+        threading.Thread(
+            target=_revalidate,
+            args=(url, entry, config),
+            name="hxat-manifest-revalidate",
+            daemon=True,
+        ).start()
+    return entry["manifest"]
+
+
+def get_first_canvas_id(url):
+    manifest = get_manifest(url)
+    if manifest is None or not manifest["canvases"]:
+        return None
+    return manifest["canvases"][0]["id"]
+
+
+def _load(url, config):
+    cache = caches[config["cache_alias"]]
+    key = cache_key(url)
+    with _inflight_lock:
+        done = _inflight.get(url)
+        if done is None:
+            _inflight[url] = threading.Event()
+    if done is not None:
+        # another thread is fetching it
+        done.wait(config["timeout"])
+        entry = cache.get(key)
+        return None if entry is None else entry["manifest"]
+
+    try:
+        try:
+            entry = fetch_manifest(url, config["timeout"])
+        except FETCH_ERRORS as e:
+            logger.warning("failed to fetch manifest {}: {}".format(url, e))
+            cache.set(
+                key,
+                {"manifest": None, "checked_at": time.time()},
+                config["error_ttl"],
+            )
+            return None
+        cache.set(key, entry, config["ttl"] + config["stale_ttl"])
+        return entry["manifest"]
+    finally:
+        with _inflight_lock:
+            _inflight.pop(url).set()
+
+
+def _revalidate(url, entry, config):
+    cache = caches[config["cache_alias"]]
+    key = cache_key(url)
+    try:
+        entry = fetch_manifest(url, config["timeout"], entry)
+    except FETCH_ERRORS as e:
+        # the stale manifest is kept; the lock expiring allows the next try
+        logger.warning("failed to revalidate manifest {}: {}".format(url, e))
+        return
+    cache.set(key, entry, config["ttl"] + config["stale_ttl"])
+    cache.delete(key + ":lock")
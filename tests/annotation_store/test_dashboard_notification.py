@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pytest
+from annotation_store.store import WebAnnotationStoreBackend
+from django.test.client import RequestFactory
+from hx_lti_initializer.models import LTICourse
+from notification.acl import course_staff_group
+
+
+@pytest.fixture
+def dashboard_backend(user_profile_factory, assignment_target_factory):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course = LTICourse.create_course("course-v1:HarvardX+HxAT101+2020", instructor)
+    assignment_target = assignment_target_factory(course)
+    request = RequestFactory().post("/annotation_store/api/")
+    request.LTI = {
+        "hx_context_id": course.course_id,
+        "hx_collection_id": str(assignment_target.assignment.assignment_id),
+        "hx_object_id": assignment_target.target_object_id,
+    }
+    backend = WebAnnotationStoreBackend(request)
+    backend.channel_layer = None
+    return backend, assignment_target
+
+
+def course_annotation(assignment_target, webannotation_annotation_factory, user):
+    annotation = webannotation_annotation_factory(user)
+    annotation["totalReplies"] = 0
+    annotation["platform"]["context_id"] = "course-v1:HarvardX+HxAT101+2020"
+    annotation["platform"]["collection_id"] = str(
+        assignment_target.assignment.assignment_id
+    )
+    annotation["platform"]["target_source_id"] = str(
+        assignment_target.target_object_id
+    )
+    return annotation
+
+
+@pytest.mark.django_db
+def test_dashboard_notification_names_from_course_targets(
+    dashboard_backend,
+    user_profile_factory,
+    webannotation_annotation_factory,
+    django_assert_num_queries,
+):
+    backend, assignment_target = dashboard_backend
+    annotation = course_annotation(
+        assignment_target, webannotation_annotation_factory, user_profile_factory()
+    )
+
+    with patch("annotation_store.store.publish") as publish:
+        backend.send_dashboard_notification(
+            "annotation_created", annotation, "course-v1-HarvardX-HxAT101-2020"
+        )
+        # names are cached per course, not queried on every write
+        with django_assert_num_queries(0):
+            backend.send_dashboard_notification(
+                "annotation_updated", annotation, "course-v1-HarvardX-HxAT101-2020"
+            )
+
+    assert publish.call_count == 2
+    group, event = publish.call_args[0][1:]
+    assert group == course_staff_group("course-v1-HarvardX-HxAT101-2020")
+    assert event["row"]["assignment_name"] == assignment_target.assignment.assignment_name
+    assert event["row"]["target_object_name"] == assignment_target.target_object.target_title
+
+
+@pytest.mark.django_db
+def test_dashboard_notification_skipped_while_breaker_open(
+    dashboard_backend,
+    user_profile_factory,
+    webannotation_annotation_factory,
+    django_assert_num_queries,
+):
+    backend, assignment_target = dashboard_backend
+    annotation = course_annotation(
+        assignment_target, webannotation_annotation_factory, user_profile_factory()
+    )
+
+    class OpenBreaker(object):
+        is_open = True
+
+    with patch("annotation_store.store.get_breaker", return_value=OpenBreaker()), \
+            patch("annotation_store.store.format_catchpy_annotation") as format_row, \
+            patch("annotation_store.store.publish") as publish, \
+            django_assert_num_queries(0):
+        backend.send_dashboard_notification(
+            "annotation_created", annotation, "course-v1-HarvardX-HxAT101-2020"
+        )
+    assert not format_row.called
+    assert not publish.called
+
+
+@pytest.mark.django_db
+def test_dashboard_notification_skipped_without_dashboard(
+    dashboard_backend,
+    user_profile_factory,
+    webannotation_annotation_factory,
+):
+    backend, assignment_target = dashboard_backend
+    annotation = course_annotation(
+        assignment_target, webannotation_annotation_factory, user_profile_factory()
+    )
+
+    with patch("annotation_store.store.is_listened", return_value=False), \
+            patch("annotation_store.store.publish") as publish:
+        backend.send_dashboard_notification(
+            "annotation_created", annotation, "course-v1-HarvardX-HxAT101-2020"
+        )
+    assert not publish.called
@@ -5,6 +5,7 @@ from random import randint
 import pytest
 from dateutil import tz
 from django.conf import settings
+from django.core.cache import caches
 from django.urls import reverse
 from lti import ToolConsumer
 from lti.tool_outbound import ToolOutbound
@@ -15,6 +16,14 @@ from hx_lti_initializer.utils import create_new_user
 from target_object_database.models import TargetObject
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # cache keys (manifest urls, assignment pks) are reused across tests
+    caches["default"].clear()
+    caches["manifests"].clear()
+    caches["app"].clear()
+
+
 @pytest.fixture
 def user_profile_factory():
     def _user_profile_factory(roles=["Learner"]):
@@ -151,6 +160,7 @@ def lti_launch_params_factory():
         consumer_key=None,
         consumer_secret=None,
         tool_consumer_instance_guid=None,
+        custom_params=None,
     ):
         params = {
             "lti_message_type": "basic-lti-launch-request",
@@ -170,6 +180,8 @@ def lti_launch_params_factory():
             )
         if tool_consumer_instance_guid:
             params["tool_consumer_instance_guid"] = tool_consumer_instance_guid
+        if custom_params:
+            params.update(custom_params)
 
         consumer = ToolConsumer(
             consumer_key=consumer_key if consumer_key else settings.CONSUMER_KEY,
@@ -1,8 +1,14 @@
 import pytest
 from unittest import mock
 
-from hx_lti_assignment.models import AssignmentTargets
+from hx_lti_assignment.models import (
+    Assignment,
+    AssignmentTargets,
+    CourseTargets,
+    TargetOptions,
+)
 from hx_lti_initializer.models import LTICourse
+from target_object_database.models import TargetObject
 
 
 @pytest.mark.parametrize('status_code', [404, 500])
@@ -27,6 +33,7 @@ def test_AssignmentTargets_get_canvas_id_for_mirador_manifest_not_found(user_pro
     assert requests_mock.called
     assert canvas_id is None
 
+
 @pytest.mark.django_db
 def test_AssignmentTargets_get_canvas_id_for_mirador_manifest_returns_canvas_id_in_options(user_profile_factory, assignment_target_factory, requests_mock):
     """
@@ -48,3 +55,344 @@ def test_AssignmentTargets_get_canvas_id_for_mirador_manifest_returns_canvas_id_
     actual_canvas_id = assignment_target.get_canvas_id_for_mirador()
     assert not requests_mock.called
     assert actual_canvas_id == expected_canvas_id
+
+
+@pytest.mark.django_db
+def test_AssignmentTargets_get_canvas_id_for_mirador_manifest_cached(
+    user_profile_factory, assignment_target_factory, requests_mock
+):
+    """
+    Checks that the first canvas ID in the manifest is returned, and that the
+    manifest is not requested again on the next render.
+    """
+    manifest_url = "http://localhost:8000/valid/manifest.json"
+    expected_canvas_id = "http://localhost:8000/valid/canvas/1"
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    assignment_target = assignment_target_factory(
+        course_object,
+        target_type="ig",
+        target_content=manifest_url,
+        target_external_options="ImageView,,false,,,",
+    )
+
+    requests_mock.get(
+        manifest_url, json={"sequences": [{"canvases": [{"@id": expected_canvas_id}]}]}
+    )
+    assert assignment_target.get_canvas_id_for_mirador() == expected_canvas_id
+    assert assignment_target.get_canvas_id_for_mirador() == expected_canvas_id
+    assert requests_mock.call_count == 1
+
+
+@pytest.mark.django_db
+def test_Assignment_get_navigation(
+    user_profile_factory, assignment_target_factory, django_assert_num_queries
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    first = assignment_target_factory(course_object)
+    assignment = first.assignment
+    third = AssignmentTargets.objects.create(
+        assignment=assignment,
+        target_object=assignment_target_factory(course_object).target_object,
+        order=3,
+    )
+    second = AssignmentTargets.objects.create(
+        assignment=assignment,
+        target_object=assignment_target_factory(course_object).target_object,
+        order=2,
+    )
+
+    with django_assert_num_queries(1):
+        navigation = assignment.get_navigation()
+    with django_assert_num_queries(0):
+        assert (
+            assignment.get_navigation().target_object_ids
+            == navigation.target_object_ids
+        )
+
+    assert len(navigation) == 3
+    assert navigation.position(second.target_object_id) == 1
+    assert navigation.position(str(second.target_object_id)) == 1
+    assert navigation.position(-1) is None
+    assert navigation.before(first.target_object_id) is None
+    assert navigation.before(str(second.target_object_id)) == first.target_object_id
+    assert navigation.after(second.target_object_id) == third.target_object_id
+    assert navigation.after(third.target_object_id) is None
+    assert navigation.after(-1) is None
+
+    assert assignment.object_before(second.target_object_id) == first
+    assert assignment.object_after(second.target_object_id) == third
+    assert assignment.object_after(third.target_object_id) is None
+
+
+@pytest.mark.django_db
+def test_Assignment_get_navigation_not_cached_by_default(
+    settings, user_profile_factory, assignment_target_factory, django_assert_num_queries
+):
+    # without a shared "app" cache, other processes could not be told to drop it
+    settings.CACHES = dict(
+        settings.CACHES,
+        app={"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    )
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    assignment = assignment_target_factory(course_object).assignment
+
+    assignment.get_navigation()
+    with django_assert_num_queries(1):
+        assignment.get_navigation()
+
+
+@pytest.mark.django_db
+def test_Assignment_get_navigation_invalidated(
+    user_profile_factory, assignment_target_factory
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    first = assignment_target_factory(course_object)
+    assignment = first.assignment
+    second = AssignmentTargets.objects.create(
+        assignment=assignment,
+        target_object=assignment_target_factory(course_object).target_object,
+        order=2,
+    )
+    assert assignment.get_navigation().target_object_ids == [
+        first.target_object_id,
+        second.target_object_id,
+    ]
+
+    # reordered
+    second.order = 0
+    second.save()
+    assert assignment.get_navigation().target_object_ids == [
+        second.target_object_id,
+        first.target_object_id,
+    ]
+
+    # removed
+    second.delete()
+    navigation = assignment.get_navigation()
+    assert navigation.target_object_ids == [first.target_object_id]
+    assert navigation.before(first.target_object_id) is None
+    assert navigation.after(first.target_object_id) is None
+
+
+@pytest.mark.parametrize(
+    "external_options,expected",
+    [
+        (None, TargetOptions("ImageView", None, False, False, False, False)),
+        ("", TargetOptions("ImageView", None, False, False, False, False)),
+        ("BookView", TargetOptions("ImageView", None, False, False, False, False)),
+        ("BookView,,,", TargetOptions("BookView", None, False, False, False, False)),
+        (
+            "ImageView,3123,true,false,true,true",
+            TargetOptions("ImageView", "3123", True, False, True, True),
+        ),
+        (",,false,true", TargetOptions("ImageView", None, False, True, False, False)),
+    ],
+)
+def test_AssignmentTargets_options(external_options, expected):
+    assignment_target = AssignmentTargets(target_external_options=external_options)
+    assert assignment_target.options == expected
+    assert assignment_target.get_dashboard_hidden() == (
+        "true" if expected.dashboard_hidden else "false"
+    )
+    assert assignment_target.get_video_download() == (
+        "true" if expected.video_download else "false"
+    )
+
+
+@pytest.mark.django_db
+def test_AssignmentTargets_options_reparsed_after_save(
+    user_profile_factory, assignment_target_factory
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    assignment_target = assignment_target_factory(
+        course_object, target_external_options="ImageView,,false,,,"
+    )
+    assert assignment_target.options.dashboard_hidden is False
+
+    assignment_target.target_external_options = "ImageView,,true,,,"
+    assignment_target.save()
+    assert assignment_target.options.dashboard_hidden is True
+
+
+@pytest.mark.django_db
+def test_AssignmentTargets_get_page_options(
+    user_profile_factory, assignment_target_factory, requests_mock
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    course_object.course_external_css_default = "http://localhost:8000/course.css"
+    text_target = assignment_target_factory(
+        course_object, target_external_options=",,true,,,true"
+    )
+    image_target = assignment_target_factory(
+        course_object,
+        target_type="ig",
+        target_content="http://localhost:8000/valid/manifest.json",
+        target_external_options="BookView,3123,,,,",
+    )
+    image_target.target_external_css = "http://localhost:8000/target.css"
+
+    assert text_target.get_page_options(course_object) == {
+        "dashboard_hidden": "true",
+        "transcript_hidden": "false",
+        "transcript_download": "false",
+        "video_download": "true",
+        "custom_css": "http://localhost:8000/course.css",
+    }
+    assert image_target.get_page_options(course_object) == {
+        "dashboard_hidden": "false",
+        "transcript_hidden": "false",
+        "transcript_download": "false",
+        "video_download": "false",
+        "custom_css": "http://localhost:8000/target.css",
+        "viewType": "BookView",
+        "canvas_id": "3123",
+    }
+    assert not requests_mock.called
+
+
+@pytest.mark.django_db
+def test_CourseTargets_scoped_to_course(
+    user_profile_factory, assignment_target_factory, django_assert_num_queries
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    other_course = LTICourse.create_course("other_course_id", instructor)
+    text = assignment_target_factory(course_object, target_content="<p>long text</p>")
+    image = assignment_target_factory(
+        course_object,
+        target_type="ig",
+        target_content="http://iiif.example.edu/manifest.json",
+    )
+    # a target object used by two assignments of the course is listed once
+    AssignmentTargets.objects.create(
+        assignment=image.assignment, target_object=text.target_object, order=2
+    )
+    other = assignment_target_factory(other_course)
+
+    with django_assert_num_queries(2):
+        course_targets = CourseTargets.get("test_course_id")
+    with django_assert_num_queries(0):
+        CourseTargets.get("test_course_id")
+
+    assert course_targets.assignment_names == {
+        str(text.assignment.assignment_id): text.assignment.assignment_name,
+        str(image.assignment.assignment_id): image.assignment.assignment_name,
+    }
+    assert course_targets.target_objects == [
+        {
+            "id": text.target_object.pk,
+            "target_title": text.target_object.target_title,
+            "target_type": "tx",
+            "manifest_url": "",
+        },
+        {
+            "id": image.target_object.pk,
+            "target_title": image.target_object.target_title,
+            "target_type": "ig",
+            "manifest_url": "http://iiif.example.edu/manifest.json",
+        },
+    ]
+    assert [x["id"] for x in CourseTargets.get("other_course_id").target_objects] == [
+        other.target_object.pk
+    ]
+
+
+@pytest.mark.django_db
+def test_CourseTargets_invalidated(user_profile_factory, assignment_target_factory):
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    first = assignment_target_factory(course_object)
+    CourseTargets.get("test_course_id")
+
+    # assignment renamed
+    first.assignment.assignment_name = "Renamed"
+    first.assignment.save()
+    assert CourseTargets.get("test_course_id").assignment_names == {
+        str(first.assignment.assignment_id): "Renamed"
+    }
+
+    # target object renamed
+    first.target_object.target_title = "Retitled"
+    first.target_object.save()
+    assert (
+        CourseTargets.get("test_course_id").target_objects[0]["target_title"]
+        == "Retitled"
+    )
+
+    # target object added to, then removed from the assignment
+    second = TargetObject.objects.create(target_title="Second", target_author="John")
+    CourseTargets.get("test_course_id")
+    added = AssignmentTargets.objects.create(
+        assignment=first.assignment, target_object=second, order=2
+    )
+    assert len(CourseTargets.get("test_course_id").target_objects) == 2
+    added.delete()
+    assert [x["id"] for x in CourseTargets.get("test_course_id").target_objects] == [
+        first.target_object_id
+    ]
+
+    # target object deleted
+    AssignmentTargets.objects.create(
+        assignment=first.assignment, target_object=second, order=2
+    )
+    assert len(CourseTargets.get("test_course_id").target_objects) == 2
+    second.delete()
+    assert len(CourseTargets.get("test_course_id").target_objects) == 1
+
+    # assignment deleted
+    first.assignment.delete()
+    course_targets = CourseTargets.get("test_course_id")
+    assert course_targets.assignment_names == {}
+    assert course_targets.target_objects == []
+
+
+@pytest.mark.django_db
+def test_CourseTargets_not_cached_by_default(
+    settings, user_profile_factory, assignment_target_factory
+):
+    settings.CACHES = dict(
+        settings.CACHES,
+        app={"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    )
+    instructor = user_profile_factory(roles=["Instructor"])
+    course_object = LTICourse.create_course("test_course_id", instructor)
+    assignment = assignment_target_factory(course_object).assignment
+    CourseTargets.get("test_course_id")
+
+    # as if changed by another process: no signal reaches this one
+    Assignment.objects.filter(pk=assignment.pk).update(assignment_name="Renamed")
+    assert CourseTargets.get("test_course_id").assignment_names == {
+        str(assignment.assignment_id): "Renamed"
+    }
+
+
+@pytest.mark.django_db
+def test_CourseTargets_invalidated_on_course_change(
+    user_profile_factory, assignment_target_factory
+):
+    instructor = user_profile_factory(roles=["Instructor"])
+    old_course = LTICourse.create_course("old_course_id", instructor)
+    new_course = LTICourse.create_course("new_course_id", instructor)
+    moved = assignment_target_factory(old_course)
+    assignment_id = str(moved.assignment.assignment_id)
+    assert assignment_id in CourseTargets.get("old_course_id").assignment_names
+    assert CourseTargets.get("new_course_id").assignment_names == {}
+
+    # assignment moved to another course
+    moved.assignment.course = new_course
+    moved.assignment.save()
+    assert CourseTargets.get("old_course_id").assignment_names == {}
+    assert CourseTargets.get("old_course_id").target_objects == []
+    assert assignment_id in CourseTargets.get("new_course_id").assignment_names
+
+    # course_id of the course changed
+    new_course.course_id = "renamed_course_id"
+    new_course.save()
+    assert CourseTargets.get("new_course_id").assignment_names == {}
+    assert assignment_id in CourseTargets.get("renamed_course_id").assignment_names
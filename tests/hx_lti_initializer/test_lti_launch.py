@@ -3,14 +3,17 @@
 # $> DJANGO_SETTINGS_MODULE=hxat.settings.test pytest hx_lti_initializer/tests/test_launch.py  -v
 #
 from random import randint
+from unittest.mock import Mock
 
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 from hx_lti_initializer.forms import CourseForm
+from hx_lti_initializer import views
 from hx_lti_initializer.models import LTICourse, LTIProfile, LTIResourceLinkConfig
+from hxat.exceptions import AnnotationTargetDoesNotExist
 from lti import ToolConsumer
 
 old_timestamp = "1580487110"
@@ -641,3 +644,160 @@ class LTIInitializerCourseFormTests(TestCase):
 
         self.assertEqual(len(expected_names), len(actual_names))
         self.assertEqual(expected_names, actual_names)
+
+
+@pytest.mark.django_db
+def test_launchLti_returning_student_query_budget(
+    lti_path,
+    lti_launch_url,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    django_assert_max_num_queries,
+):
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=launch_params["resource_link_id"],
+        assignment_target=assignment_target,
+    )
+
+    client = Client(enforce_csrf_checks=False)
+    # new session (4), course (1), resource link config with its assignment (1)
+    # and saving the session (3)
+    with django_assert_max_num_queries(9):
+        response = client.post(lti_path, data=launch_params,)
+    assert response.status_code == 302
+    assert response.url.startswith(
+        reverse(
+            "hx_lti_initializer:access_annotation_target",
+            args=[
+                course.course_id,
+                assignment_target.assignment.assignment_id,
+                assignment_target.target_object_id,
+            ],
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_launchLti_direct_render(
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    settings,
+):
+    settings.HXAT_LAUNCH_DIRECT_RENDER = True
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id, assignment_target=assignment_target,
+    )
+
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params,)
+    # the target page itself, no redirect
+    assert response.status_code == 200
+    assert response.context["collection"] == str(assignment.assignment_id)
+    assert response.context["object"] == assignment_target.target_object_id
+    assert response.context["resource_link_id"] == resource_link_id
+    assert response.context["utm_source"] == client.session.session_key
+    expected_url = (
+        reverse(
+            "hx_lti_initializer:access_annotation_target",
+            args=[
+                course.course_id,
+                assignment.assignment_id,
+                assignment_target.target_object_id,
+            ],
+        )
+        + f"?resource_link_id={resource_link_id}"
+        + f"&utm_source={client.session.session_key}"
+    )
+    assert response.context["page_url"] == expected_url
+    assert b"history.replaceState" in response.content
+
+
+def test_open_annotation_target_keeps_launch_query(settings, monkeypatch):
+    settings.HXAT_LAUNCH_DIRECT_RENDER = True
+    request = RequestFactory().post("/lti_init/launch_lti/?foo=bar")
+    request.session = Mock(session_key="session-key")
+    render = Mock(return_value="rendered")
+    monkeypatch.setattr(views, "_render_annotation_target", render)
+
+    assert (
+        views._open_annotation_target(request, "course", "coll", "1", "link")
+        == "rendered"
+    )
+    # the launch request is not changed to look like the redirected one
+    assert request.GET.dict() == {"foo": "bar"}
+    kwargs = render.call_args[1]
+    assert kwargs["page_params"] == {
+        "resource_link_id": "link",
+        "utm_source": "session-key",
+    }
+    assert kwargs["page_url"].endswith("?resource_link_id=link&utm_source=session-key")
+
+
+@pytest.mark.django_db
+def test_launchLti_direct_render_denied(
+    lti_path,
+    lti_launch_url,
+    lti_launch_params_factory,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    settings,
+):
+    settings.HXAT_LAUNCH_DIRECT_RENDER = True
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    assignment.is_published = False
+    assignment.save()
+    launch_params = lti_launch_params_factory(
+        course_id=course.course_id,
+        user_name=user.name,
+        user_id=user.anon_id,
+        user_roles=["Learner"],
+        resource_link_id=launch_params["resource_link_id"],
+        launch_url=lti_launch_url,
+        custom_params={
+            settings.LTI_COLLECTION_ID: str(assignment.assignment_id),
+            settings.LTI_OBJECT_ID: str(assignment_target.target_object_id),
+        },
+    )
+
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params,)
+    # not sent to the admin hub instead
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_launchLti_direct_render_target_missing(
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    settings,
+    monkeypatch,
+):
+    settings.HXAT_LAUNCH_DIRECT_RENDER = True
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id, assignment_target=assignment_target,
+    )
+
+    def render_annotation_target(*args, **kwargs):
+        raise AnnotationTargetDoesNotExist("gone while rendering")
+
+    monkeypatch.setattr(views, "_render_annotation_target", render_annotation_target)
+    client = Client(enforce_csrf_checks=False)
+    with pytest.raises(AnnotationTargetDoesNotExist):
+        client.post(lti_path, data=launch_params,)
+    # an error opening the target does not make its resource config invalid
+    assert LTIResourceLinkConfig.objects.filter(
+        resource_link_id=resource_link_id
+    ).exists()
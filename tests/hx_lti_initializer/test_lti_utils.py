@@ -1,6 +1,17 @@
+import json
 import pytest
 from requests.sessions import session
-from hx_lti_initializer.utils import _fetch_annotations_by_course, DashboardAnnotations
+from hx_lti_initializer.utils import (
+    _fetch_annotations_by_course,
+    fetch_annotations_by_course,
+    AnnotationRow,
+    DashboardAnnotations,
+    dashboard_row,
+    find_target_object_index,
+    format_catchpy_annotation,
+    get_annotation_positions_by_user,
+    share_row_values,
+)
 import requests
 import requests_mock
 from testing_data import build_json
@@ -12,6 +23,7 @@ annotator_auth_token = f"{uuid4()}"
 id = f"{uuid4()}"
 built_json = build_json(id, context_id)
 
+
 def test_fetch_annotations_by_course_success_new_highlighter():
     d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
     data = [d["data"]]
@@ -23,6 +35,7 @@ def test_fetch_annotations_by_course_success_new_highlighter():
         r = _fetch_annotations_by_course(context_id, annotation_db_url, annotator_auth_token)
         assert r == expected_response
 
+
 def test_fetch_annotations_by_course_success_old_highlighter():
     d = built_json["test_fetch_annotations_by_course_success_old_highlighter"]
     data = [d["data"]]
@@ -34,6 +47,7 @@ def test_fetch_annotations_by_course_success_old_highlighter():
         r = _fetch_annotations_by_course(context_id, annotation_db_url, annotator_auth_token)
         assert r == expected_response
 
+
 def test_fetch_annotations_by_course_failing():
     d = built_json["test_fetch_annotations_by_course_failing"]
     data = [d["data"]]
@@ -45,6 +59,7 @@ def test_fetch_annotations_by_course_failing():
         r = _fetch_annotations_by_course(context_id, annotation_db_url, annotator_auth_token)
         assert r == expected_response
 
+
 def test_dashboard_annotations_success_image_uri():
     target_objects_by_content = built_json["test_dashboard_annotations_success"]
     # override DashboardAnnotations __init__
@@ -55,6 +70,7 @@ def test_dashboard_annotations_success_image_uri():
         da = DashboardAnnotations("", {})
         assert da.get_target_id('image', 'https://d.lib.ncsu.edu/collections/catalog/nubian-message-1992-11-30/manifest/661') == 15
 
+
 def test_dashboard_annotations_success_image_similar_uri():
     target_objects_by_content = built_json["test_dashboard_annotations_success"]
     def __init__(self, request, annotations):
@@ -64,6 +80,7 @@ def test_dashboard_annotations_success_image_similar_uri():
         da = DashboardAnnotations("", {})
         assert da.get_target_id('image', 'https://d.lib.ncsu.edu/collections/catalog/nubian-message-1992-11-30/manifest/662') == 16
 
+
 def test_dashboard_annotations_success_image_capital_letter_uri():
     target_objects_by_content = built_json["test_dashboard_annotations_success"]
     def __init__(self, request, annotations):
@@ -73,6 +90,7 @@ def test_dashboard_annotations_success_image_capital_letter_uri():
         da = DashboardAnnotations("", {})
         assert da.get_target_id('image', 'https://digital.library.villanova.edu/Item/vudl:92879/Manifest') == 9
 
+
 # TODO: Fix how we store and match up canvas URI with manifest URI
 # Note: test fails in e2e testing because we cant match any of the keys in the target_objects_by_content served up by catchpy
 # Data from catchpy sometimes does not include a manifest uri
@@ -82,4 +100,254 @@ def test_dashboard_annotations_success_image_capital_letter_uri():
 #         self.target_objects_by_content = target_objects_by_content
 #     with patch.object(DashboardAnnotations, '__init__', __init__):
 #         da = DashboardAnnotations("", {})
-#         assert da.get_target_id('image', 'https://digital.library.villanova.edu/Item/vudl:92879/Canvas/p0') == "some_id"
\ No newline at end of file
+#         assert da.get_target_id('image', 'https://digital.library.villanova.edu/Item/vudl:92879/Canvas/p0') == "some_id"
+def test_dashboard_row_from_catchpy_annotation():
+    d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
+    annotation = format_catchpy_annotation(d["data"])
+    row = dashboard_row(annotation, "Assignment", "Target", "/preview/")
+    assert row["id"] == annotation["id"]
+    assert row["user_id"] == annotation["user"]["id"]
+    assert row["assignment_name"] == "Assignment"
+    assert row["target_object_name"] == "Target"
+    assert row["target_preview_url"] == "/preview/"
+    assert row["text"] == annotation["text"]
+    assert row["parent_text"] is None
+
+
+def catchpy_page(total, ids):
+    d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
+    return {"total": total, "rows": [dict(d["data"], id=i) for i in ids]}
+
+
+def catchpy_reply(reply_id, parent_id):
+    d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
+    return dict(
+        d["data"],
+        id=reply_id,
+        body={
+            "type": "List",
+            "items": [
+                {"type": "TextualBody", "value": "reply to {}".format(parent_id)}
+            ],
+        },
+        target={
+            "type": "List",
+            "items": [
+                {"type": "Annotation", "format": "text/html", "source": parent_id}
+            ],
+        },
+    )
+
+
+def test_replies_are_listed_in_the_dashboard():
+    # replies target only the annotation they reply to; they used to be
+    # dropped when formatted, so were missing from each student's annotation
+    # list and count
+    parent = format_catchpy_annotation(catchpy_page(0, ["a0"])["rows"][0])
+    reply = format_catchpy_annotation(catchpy_reply("a1", "a0"))
+    assert reply["media"] == "annotation"
+    assert reply["parent"] == "a0"
+    assert reply["uri"] == parent["uri"]
+
+    positions = get_annotation_positions_by_user({"rows": [parent, reply]})
+    assert list(positions[parent["user"]["id"]]) == [0, 1]
+
+
+def test_reply_target_used_only_without_media_target():
+    items = [
+        {"type": "Annotation", "source": "a0"},
+        {"type": "Thumbnail", "source": "thumb"},
+        {"type": "Image", "source": "manifest"},
+    ]
+    assert find_target_object_index(items) == 2
+    assert find_target_object_index(items[:2]) == 0
+    assert find_target_object_index(items[1:2]) is None
+
+
+def test_fetch_annotations_by_course_paged(settings):
+    settings.HXAT_DASHBOARD_FETCH = {
+        "page_size": 2,
+        "max_annotations": 100,
+        "concurrency": 3,
+        "timeout": 5,
+    }
+    credentials = [
+        {
+            "annotation_database_url": "http://db1.test ",
+            "annotation_database_apikey": "k1",
+            "annotation_database_secret_token": "s1",
+        },
+        {
+            "annotation_database_url": "http://db2.test",
+            "annotation_database_apikey": "k2",
+            "annotation_database_secret_token": "s2",
+        },
+    ]
+
+    def db1(request, context):
+        offset = int(request.qs.get("offset", ["0"])[0])
+        return catchpy_page(
+            5, ["a{}".format(i) for i in range(offset, min(offset + 2, 5))]
+        )
+
+    with patch(
+        "hx_lti_initializer.utils.get_annotation_db_credentials_by_course",
+        return_value=credentials,
+    ), patch(
+        "hx_lti_initializer.utils.retrieve_token", return_value=annotator_auth_token
+    ), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get("http://db1.test/", json=db1)
+        requests_mocker.get("http://db2.test/", json=catchpy_page(1, ["b0"]))
+        r = fetch_annotations_by_course(context_id, "user")
+
+        assert [row["id"] for row in r["rows"]] == ["a0", "a1", "a2", "a3", "a4", "b0"]
+        assert r["totalCount"] == 6
+        assert r["truncated"] is False
+        assert r["errors"] == []
+        db1_offsets = sorted(
+            int(request.qs.get("offset", ["0"])[0])
+            for request in requests_mocker.request_history
+            if request.hostname == "db1.test"
+        )
+        assert db1_offsets == [0, 2, 4]
+        assert all(request.timeout == 5 for request in requests_mocker.request_history)
+
+
+def test_fetch_annotations_by_course_truncated_and_partial_failure(settings):
+    settings.HXAT_DASHBOARD_FETCH = {
+        "page_size": 2,
+        "max_annotations": 3,
+        "concurrency": 2,
+        "timeout": 5,
+    }
+    credentials = [
+        {
+            "annotation_database_url": "http://db1.test",
+            "annotation_database_apikey": "k1",
+            "annotation_database_secret_token": "s1",
+        },
+        {
+            "annotation_database_url": "http://db2.test",
+            "annotation_database_apikey": "k2",
+            "annotation_database_secret_token": "s2",
+        },
+    ]
+
+    def db1(request, context):
+        offset = int(request.qs.get("offset", ["0"])[0])
+        limit = int(request.qs["limit"][0])
+        return catchpy_page(
+            10, ["a{}".format(i) for i in range(offset, offset + limit)]
+        )
+
+    with patch(
+        "hx_lti_initializer.utils.get_annotation_db_credentials_by_course",
+        return_value=credentials,
+    ), patch(
+        "hx_lti_initializer.utils.retrieve_token", return_value=annotator_auth_token
+    ), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get("http://db1.test/", json=db1)
+        requests_mocker.get("http://db2.test/", status_code=500)
+        r = fetch_annotations_by_course(context_id, "user")
+
+    assert [row["id"] for row in r["rows"]] == ["a0", "a1", "a2"]
+    assert r["totalCount"] == 10
+    assert r["truncated"] is True
+    assert len(r["errors"]) == 1
+    assert "http://db2.test" in r["errors"][0]
+
+
+def test_fetch_annotations_by_course_parent_text_across_pages(settings):
+    settings.HXAT_DASHBOARD_FETCH = {
+        "page_size": 2,
+        "max_annotations": 4,
+        "concurrency": 2,
+        "timeout": 5,
+    }
+    credentials = [
+        {
+            "annotation_database_url": "http://db1.test",
+            "annotation_database_apikey": "k1",
+            "annotation_database_secret_token": "s1",
+        },
+    ]
+    # x1 is past max_annotations
+    annotations = [
+        catchpy_page(0, ["a0"])["rows"][0],
+        catchpy_reply("a1", "x1"),
+        catchpy_reply("a2", "a0"),
+        catchpy_reply("a3", "a2"),
+        catchpy_reply("x1", "a0"),
+    ]
+
+    def db1(request, context):
+        offset = int(request.qs.get("offset", ["0"])[0])
+        limit = int(request.qs["limit"][0])
+        return {"total": len(annotations), "rows": annotations[offset : offset + limit]}
+
+    with patch(
+        "hx_lti_initializer.utils.get_annotation_db_credentials_by_course",
+        return_value=credentials,
+    ), patch(
+        "hx_lti_initializer.utils.retrieve_token", return_value=annotator_auth_token
+    ), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get("http://db1.test/", json=db1)
+        r = fetch_annotations_by_course(context_id, "user")
+        offsets = [
+            request.qs.get("offset", ["0"])[0]
+            for request in requests_mocker.request_history
+        ]
+
+    # only the pages are requested, not the missing parent
+    assert sorted(offsets) == ["0", "2"]
+    assert [row["id"] for row in r["rows"]] == ["a0", "a1", "a2", "a3"]
+    assert r["truncated"] is True
+    assert r["errors"] == []
+    rows = {row["id"]: row for row in r["rows"]}
+    assert "parent_text" not in rows["a0"]
+    assert "parent_text" not in rows["a1"]
+    assert rows["a2"]["parent_text"] == rows["a0"]["text"]
+    assert rows["a3"]["parent_text"] == "reply to a0"
+    assert sorted(r["annotation_by_id"]) == ["a0", "a1", "a2", "a3"]
+
+
+def test_annotation_row_reads_like_a_dict():
+    d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
+    row = format_catchpy_annotation(d["data"])
+    assert isinstance(row, AnnotationRow)
+    assert row == d["expected_response"]["rows"][0]
+    assert dict(row) == d["expected_response"]["rows"][0]
+    assert "parent_text" not in row
+    assert row.get("parent_text") is None
+    with pytest.raises(KeyError):
+        row["parent_text"]
+
+    row["parent_text"] = "parent"
+    assert row["parent_text"] == "parent"
+    assert list(row)[-1] == "parent_text"
+    assert len(row) == len(d["expected_response"]["rows"][0]) + 1
+    for name in ("get", "__slots__", "not_a_field"):
+        with pytest.raises(KeyError):
+            row[name]
+    with pytest.raises(KeyError):
+        row["not_a_field"] = 1
+
+
+def test_annotation_rows_share_values():
+    d = built_json["test_fetch_annotations_by_course_success_new_highlighter"]
+    shared = {}
+    # as decoded from a response, with equal values in distinct objects
+    rows = [
+        format_catchpy_annotation(json.loads(json.dumps(dict(d["data"], id=str(i)))))
+        for i in range(3)
+    ]
+    assert rows[2]["user"] is not rows[0]["user"]
+    for row in rows:
+        share_row_values(row, shared)
+    assert rows[2]["user"] is rows[0]["user"]
+    assert rows[2]["permissions"] is rows[0]["permissions"]
+    assert rows[2]["contextId"] is rows[0]["contextId"]
+    assert rows[2] == dict(d["expected_response"]["rows"][0], id="2")
+
+    positions = get_annotation_positions_by_user({"rows": rows})
+    assert list(positions[rows[0]["user"]["id"]]) == [0, 1, 2]
@@ -0,0 +1,71 @@
+"""
+Checks the lookups done on every launch or page load use an index, by running
+EXPLAIN on them against a seeded database.
+"""
+import re
+
+import pytest
+from django.db import connection
+from hx_lti_assignment.models import Assignment, AssignmentTargets
+from hx_lti_initializer.models import (
+    LTICourse,
+    LTICourseAdmin,
+    LTIProfile,
+    LTIResourceLinkConfig,
+)
+
+
+def full_scans(queryset):
+    """returns the lines of the query plan for `queryset` that scan a table."""
+    if connection.vendor == "postgresql":
+        # tiny tables are cheaper to scan; ask for an index if there is one
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        pattern = re.compile(r"Seq Scan")
+    else:  # sqlite
+        pattern = re.compile(r"\bSCAN\b(?! CONSTANT ROW)")
+    plan = queryset.explain()
+    return [line for line in plan.splitlines() if pattern.search(line)]
+
+
+@pytest.fixture
+def seeded(course_instructor_factory, assignment_target_factory):
+    targets = []
+    for _ in range(3):
+        course, instructor = course_instructor_factory()
+        for _ in range(3):
+            targets.append(assignment_target_factory(course))
+        LTICourseAdmin.objects.create(
+            admin_unique_identifier=instructor.user.username,
+            new_admin_course_id=course.course_id,
+        )
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id="resource_link_id", assignment_target=targets[0]
+    )
+    return targets
+
+
+@pytest.mark.django_db
+def test_hot_lookups_use_indexes(seeded):
+    target = seeded[0]
+    hot_queries = {
+        "profile by anon_id": LTIProfile.objects.filter(anon_id="123"),
+        "course by course_id": LTICourse.objects.filter(course_id="course"),
+        "pending admin": LTICourseAdmin.objects.filter(
+            admin_unique_identifier="someone", new_admin_course_id="course"
+        ),
+        "assignment by assignment_id": Assignment.objects.filter(
+            assignment_id=target.assignment.assignment_id
+        ),
+        "target by order": AssignmentTargets.objects.filter(
+            assignment=target.assignment, order=2
+        ),
+        "target by object": AssignmentTargets.objects.filter(
+            assignment=target.assignment, target_object=target.target_object
+        ),
+        "resource link config": LTIResourceLinkConfig.objects.select_related(
+            "assignment_target__assignment"
+        ).filter(resource_link_id="resource_link_id"),
+    }
+    scans = {name: full_scans(qs) for name, qs in hot_queries.items()}
+    assert {name: lines for name, lines in scans.items() if lines} == {}
@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from hxat.backends import ConfiguredBackend, redis_client
+
+
+def make_backend():
+    return ConfiguredBackend(
+        "HXAT_TEST_BACKEND", "test store", {"memory": lambda config: dict(config)}
+    )
+
+
+def test_configured_backend_disabled(settings):
+    settings.HXAT_TEST_BACKEND = {"backend": ""}
+    assert make_backend()() is None
+
+
+def test_configured_backend_built_once(settings):
+    settings.HXAT_TEST_BACKEND = {"backend": "memory", "ttl": 5}
+    get_store = make_backend()
+    store = get_store()
+    assert store == {"backend": "memory", "ttl": 5}
+    assert get_store() is store
+
+
+def test_configured_backend_unknown(settings):
+    settings.HXAT_TEST_BACKEND = {"backend": "carrier-pigeon"}
+    with pytest.raises(ImproperlyConfigured, match="unknown test store backend"):
+        make_backend()()
+
+
+def test_redis_client_needs_redis_package():
+    with patch("hxat.backends.redis", None):
+        with pytest.raises(ImproperlyConfigured, match="redis package is required"):
+            redis_client("redis://localhost:6379/0", "test store")
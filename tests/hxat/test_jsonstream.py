@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from hxat.jsonstream import JsonArrayStream
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+DOCUMENT = {
+    "total": 12345,
+    "size": 3,
+    "rows": [
+        {"id": "a", "text": "<p>ñ, \"quoted\" [x]</p>", "tags": ["t1", "t2"]},
+        -1.5e3,
+        [None, True, False, {"nested": {"rows": []}}],
+    ],
+    "offset": 0,
+}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_json_array_stream(size):
+    text = json.dumps(DOCUMENT, indent=1)
+    stream = JsonArrayStream(chunked(text, size), "rows")
+    assert list(stream) == DOCUMENT["rows"]
+    assert stream.found
+    assert stream.members == {"total": 12345, "size": 3, "offset": 0}
+
+
+def test_json_array_stream_reads_incrementally():
+    rows = [{"id": i, "text": "x" * 100} for i in range(50)]
+    chunks = chunked(json.dumps({"rows": rows, "total": 50}), 64)
+    read = []
+
+    def reader():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    stream = JsonArrayStream(reader(), "rows")
+    for i, row in enumerate(stream):
+        assert row == rows[i]
+        # no more than the row and a chunk were read ahead
+        assert len("".join(read)) < (i + 1) * 130 + 64
+        assert len(stream._buf) < 200
+    assert len(read) == len(chunks)
+    assert stream.members == {"total": 50}
+
+
+@pytest.mark.parametrize(
+    "text,rows,members",
+    [
+        ("{}", [], {}),
+        ('{"rows": []}', [], {}),
+        (' { "total" : 0 , "rows" : [ ] } ', [], {"total": 0}),
+    ],
+)
+def test_json_array_stream_empty(text, rows, members):
+    stream = JsonArrayStream(chunked(text, 2), "rows")
+    assert list(stream) == rows
+    assert stream.members == members
+
+
+def test_json_array_stream_missing_key():
+    stream = JsonArrayStream(['{"total": 1}'], "rows")
+    assert list(stream) == []
+    assert not stream.found
+    assert stream.members == {"total": 1}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "[1, 2]",
+        '{"rows": [1, 2',
+        '{"rows": [1, 2]',
+        '{"rows": [1 2]}',
+        '{"rows": {"a": 1}}',
+        '{"total": 1, "rows": [1], }',
+        "<html>error</html>",
+    ],
+)
+def test_json_array_stream_invalid(text):
+    with pytest.raises(ValueError):
+        list(JsonArrayStream(chunked(text, 3), "rows"))
@@ -1,4 +1,8 @@
+from unittest.mock import Mock, patch
+
+from hxat import nonces
 from hxat.lti_validators import LTIRequestValidator
+from hxat.nonces import InMemoryNonceStore, RedisNonceStore
 from django.conf import settings
 from django.test import RequestFactory
 from django.urls import reverse
@@ -169,3 +173,171 @@ def test_lti_validation_ltidict_wrong_secret():
     request_is_valid = tool_provider.is_valid_request(validator)
 
     assert not request_is_valid
+
+
+def test_lti_validation_replayed_launch_fails(settings, monkeypatch):
+    monkeypatch.setattr(nonces.get_nonce_store, "instance", InMemoryNonceStore())
+    target_path = "/some_path"
+    consumer = ToolConsumer(
+        consumer_key=settings.CONSUMER_KEY,
+        consumer_secret=settings.LTI_SECRET,
+        launch_url="http://testserver{}".format(target_path),
+        params={
+            "lti_message_type": "basic-lti-launch-request",
+            "lti_version": "LTI-1p0",
+            "resource_link_id": "some_string_to_be_the_fake_resource_link_id",
+            "user_id": "instructor_1-anon",
+            "roles": ["Instructor", "Administrator"],
+            "context_id": "fake_course",
+        },
+    )
+    params = consumer.generate_launch_data()
+
+    factory = RequestFactory()
+    validator = LTIRequestValidator()
+    first = DjangoToolProvider.from_django_request(
+        request=factory.post(target_path, data=params)
+    )
+    assert validator.is_valid_request(first)
+
+    replay = DjangoToolProvider.from_django_request(
+        request=factory.post(target_path, data=params)
+    )
+    assert not validator.is_valid_request(replay)
+
+
+def _signed_launch_params(secret):
+    consumer = ToolConsumer(
+        consumer_key=settings.CONSUMER_KEY,
+        consumer_secret=secret,
+        launch_url="http://testserver/some_path",
+        params={
+            "lti_message_type": "basic-lti-launch-request",
+            "lti_version": "LTI-1p0",
+            "resource_link_id": "some_string_to_be_the_fake_resource_link_id",
+            "user_id": "instructor_1-anon",
+            "roles": ["Instructor", "Administrator"],
+            "context_id": "fake_course",
+        },
+    )
+    return consumer.generate_launch_data()
+
+
+def test_lti_validation_forged_launch_keeps_nonce(settings, monkeypatch):
+    monkeypatch.setattr(nonces.get_nonce_store, "instance", InMemoryNonceStore())
+    params = _signed_launch_params(settings.LTI_SECRET)
+    forged = dict(params, oauth_signature="forged")
+
+    factory = RequestFactory()
+    validator = LTIRequestValidator()
+    assert not validator.is_valid_request(
+        DjangoToolProvider.from_django_request(
+            request=factory.post("/some_path", data=forged)
+        )
+    )
+    # the genuine launch with the same nonce still gets in
+    assert validator.is_valid_request(
+        DjangoToolProvider.from_django_request(
+            request=factory.post("/some_path", data=params)
+        )
+    )
+
+
+class BrokenNonceStore(InMemoryNonceStore):
+    def contains(self, key):
+        raise ConnectionError("store is down")
+
+    def add(self, key):
+        raise ConnectionError("store is down")
+
+
+def test_lti_validation_fails_open_on_store_error(settings, monkeypatch):
+    monkeypatch.setattr(nonces.get_nonce_store, "instance", BrokenNonceStore())
+    params = _signed_launch_params(settings.LTI_SECRET)
+
+    factory = RequestFactory()
+    validator = LTIRequestValidator()
+    with patch("hxat.lti_validators.log") as log:
+        for i in range(2):
+            assert validator.is_valid_request(
+                DjangoToolProvider.from_django_request(
+                    request=factory.post("/some_path", data=params)
+                )
+            )
+    assert log.warning.call_count == 2
+    assert "unable to check lti nonce" in log.warning.call_args[0][0]
+    log.error.assert_not_called()
+
+
+def test_lti_validation_warns_when_nonce_cannot_be_recorded(settings, monkeypatch):
+    store = InMemoryNonceStore()
+    monkeypatch.setattr(store, "add", Mock(side_effect=ConnectionError("down")))
+    monkeypatch.setattr(nonces.get_nonce_store, "instance", store)
+    params = _signed_launch_params(settings.LTI_SECRET)
+
+    validator = LTIRequestValidator()
+    with patch("hxat.lti_validators.log") as log:
+        assert validator.is_valid_request(
+            DjangoToolProvider.from_django_request(
+                request=RequestFactory().post("/some_path", data=params)
+            )
+        )
+    log.warning.assert_called_once()
+    assert "unable to record lti nonce" in log.warning.call_args[0][0]
+
+
+def test_nonce_store_expires_nonces():
+    store = InMemoryNonceStore(ttl=60)
+    assert not store.contains("key:1:nonce")
+    assert store.add("key:1:nonce")
+    assert store.contains("key:1:nonce")
+    assert not store.add("key:1:nonce")
+
+    store = InMemoryNonceStore(ttl=0)
+    assert store.add("key:1:nonce")
+    assert store.add("key:1:nonce")
+
+
+def test_redis_nonce_store():
+    with patch("hxat.backends.redis") as redis:
+        store = RedisNonceStore(ttl=600, redis_url="redis://redis.test:6379/0")
+    redis.Redis.from_url.assert_called_once_with("redis://redis.test:6379/0")
+    client = redis.Redis.from_url.return_value
+
+    client.exists.return_value = 0
+    assert not store.contains("key:1:nonce")
+    client.exists.assert_called_once_with("hxat:lti:nonce:key:1:nonce")
+
+    # SET NX: only the first process to record a nonce gets True
+    client.set.side_effect = [True, None]
+    assert store.add("key:1:nonce")
+    assert not store.add("key:1:nonce")
+    client.set.assert_called_with("hxat:lti:nonce:key:1:nonce", 1, nx=True, ex=600)
+
+
+def test_lti_validation_replayed_launch_fails_with_redis_store(settings, monkeypatch):
+    with patch("hxat.backends.redis") as redis:
+        store = RedisNonceStore(ttl=600)
+    client = redis.Redis.from_url.return_value
+    # the nonce was recorded by another process
+    client.exists.return_value = 1
+    monkeypatch.setattr(nonces.get_nonce_store, "instance", store)
+    params = _signed_launch_params(settings.LTI_SECRET)
+
+    validator = LTIRequestValidator()
+    assert not validator.is_valid_request(
+        DjangoToolProvider.from_django_request(
+            request=RequestFactory().post("/some_path", data=params)
+        )
+    )
+    client.set.assert_not_called()
+
+
+def test_nonce_store_is_bounded():
+    store = InMemoryNonceStore(ttl=60, max_entries=2)
+    for nonce in ("a", "b", "c"):
+        assert store.add(nonce)
+    assert len(store._seen) == 2
+    # oldest forgotten first
+    assert store.add("a")
+    assert not store.add("c")
@@ -1,9 +1,17 @@
+import os
+import re
+
 import pytest
 
+from django.conf import settings
 from django.contrib.sessions.backends.db import SessionStore
 from django.test import RequestFactory
 from django.urls import reverse
-from hxat.middleware import LTILaunchSession, MultiLTILaunchMiddleware
+from hxat.middleware import (
+    LTILaunchSession,
+    MultiLTILaunchMiddleware,
+    compact_launch_params,
+)
 
 
 @pytest.mark.django_db
@@ -64,4 +72,57 @@ def test_MultiLTILaunchMiddleware_is_lti_content_item_message(
     except Exception as e:
         pytest.fail(f"Unexpected exception: {e}")
 
-    assert not hasattr(request, "LTI")
\ No newline at end of file
+    assert not hasattr(request, "LTI")
+
+
+def test_compact_launch_params_keeps_used_params():
+    params = compact_launch_params(
+        {
+            "context_id": "fake_context_id",
+            "resource_link_id": "resource_link_id_1234567",
+            "user_id": "fake_user_id",
+            "roles": "Instructor,Administrator",
+            "oauth_consumer_key": "consumer_key",
+            "oauth_nonce": "nonce",
+            "oauth_signature": "signature",
+            "custom_collection_id": "collection",
+            "launch_presentation_locale": "en",
+        }
+    )
+    assert params == {
+        "context_id": "fake_context_id",
+        "resource_link_id": "resource_link_id_1234567",
+        "user_id": "fake_user_id",
+        "roles": ["Instructor", "Administrator"],
+        "oauth_consumer_key": "consumer_key",
+        "custom_collection_id": "collection",
+    }
+
+
+# modules that read the launch params kept in the session
+LAUNCH_PARAMS_CONSUMERS = [
+    "annotation_store/store.py",
+    "hx_lti_initializer/views.py",
+    "image_store/backends.py",
+    "notification/middleware.py",
+    "target_object_database/forms.py",
+]
+
+
+def test_compact_launch_params_keeps_params_read_from_session():
+    read = set()
+    for path in LAUNCH_PARAMS_CONSUMERS:
+        with open(os.path.join(settings.BASE_DIR, path)) as f:
+            source = f.read()
+        read.update(
+            re.findall(
+                r"(?:launch_params|lti_params)\s*(?:\[|\.get\()\s*\"(\w+)\"", source
+            )
+        )
+        read.update(re.findall(r"\"(\w+)\" in request\.LTI\[\"launch_params\"\]", source))
+    # custom_* params are all kept
+    read = {key for key in read if not key.startswith("custom_")}
+    assert "lis_course_offering_sourcedid" in read
+
+    params = compact_launch_params({key: "value" for key in read})
+    assert sorted(read - set(params)) == []
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import RequestFactory
+from hxat.middleware import CookielessSessionMiddleware
+from hxat.serializers import JsonOrderedDictSerializer, JsonSerializer
+from hxat.sessions import SessionStore
+
+
+@pytest.fixture
+def saved_session(db):
+    session = SessionStore()
+    session["LTI_LAUNCH"] = {"resource_link_id_1234567": {"hx_user_id": "user"}}
+    session.create()
+    return session.session_key
+
+
+@pytest.mark.django_db
+def test_unchanged_session_is_not_saved(saved_session, django_assert_num_queries):
+    session = SessionStore(saved_session)
+    session["LTI_LAUNCH"] = session["LTI_LAUNCH"]
+    with django_assert_num_queries(0):
+        session.save()
+
+    session["CSRF"] = "token"
+    session.save()
+    assert SessionStore(saved_session)["CSRF"] == "token"
+
+
+@pytest.mark.django_db
+def test_deleted_session_is_saved_again(saved_session):
+    session = SessionStore(saved_session)
+    session.load()
+    session.delete()
+    session.save()
+    assert SessionStore().exists(session.session_key)
+
+
+@pytest.mark.django_db
+def test_middleware_loads_existing_session_once(
+    saved_session, django_assert_num_queries
+):
+    request = RequestFactory().get("/", {"utm_source": saved_session})
+    middleware = CookielessSessionMiddleware(get_response=lambda request: None)
+    with django_assert_num_queries(1):
+        middleware.process_request(request)
+    assert request.session.session_key == saved_session
+    assert "LTI_LAUNCH" in request.session
+
+
+@pytest.mark.django_db
+def test_middleware_creates_missing_session():
+    request = RequestFactory().get("/", {"utm_source": "no-such-session-key"})
+    middleware = CookielessSessionMiddleware(get_response=lambda request: None)
+    middleware.process_request(request)
+    assert request.session.session_key not in (None, "no-such-session-key")
+    assert SessionStore().exists(request.session.session_key)
+
+
+def test_json_serializer_keeps_order_and_reads_old_sessions():
+    session = OrderedDict([("b", 1), ("a", {"z": "ñ", "y": 2})])
+    old = JsonOrderedDictSerializer().dumps(session)
+    new = JsonSerializer().dumps(session)
+    assert len(new) < len(old)
+    for data in (old, new):
+        loaded = JsonSerializer().loads(data)
+        assert list(loaded) == ["b", "a"]
+        assert list(loaded["a"].items()) == [("z", "ñ"), ("y", 2)]
+
+
+def test_session_benchmark_reports_savings():
+    out = StringIO()
+    call_command("session_benchmark", launches=3, iterations=5, stdout=out)
+    report = out.getvalue()
+    assert "full+ordered: serialized" in report
+    assert "compact+json: serialized" in report
+    assert "saved:" in report
@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+from django.core.cache import caches
+
+from target_object_database import manifests
+
+MANIFEST_URL = "http://iiif.example.edu/manifest.json"
+
+
+def manifest_json(*canvas_ids):
+    return {
+        "@id": MANIFEST_URL,
+        "label": [{"@value": "A manuscript", "@language": "en"}],
+        "sequences": [
+            {
+                "canvases": [
+                    {"@id": canvas_id, "label": "page {}".format(i)}
+                    for i, canvas_id in enumerate(canvas_ids)
+                ]
+            }
+        ],
+    }
+
+
+def join_revalidation():
+    for thread in threading.enumerate():
+        if thread.name == "hxat-manifest-revalidate":
+            thread.join(5)
+
+
+def test_manifest_parsed_and_cached(requests_mock):
+    requests_mock.get(MANIFEST_URL, json=manifest_json("c1", "c2"))
+
+    for _ in range(3):
+        manifest = manifests.get_manifest(MANIFEST_URL)
+        assert manifest == {
+            "label": "A manuscript",
+            "canvases": [
+                {"id": "c1", "label": "page 0"},
+                {"id": "c2", "label": "page 1"},
+            ],
+        }
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+    assert requests_mock.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        {"status_code": 500, "text": ""},
+        {"text": "not json"},
+        {"json": {"sequences": [{"canvases": [{"label": "no @id"}]}]}},
+    ],
+)
+def test_manifest_failure_cached(requests_mock, response):
+    requests_mock.get(MANIFEST_URL, **response)
+
+    assert manifests.get_manifest(MANIFEST_URL) is None
+    assert manifests.get_first_canvas_id(MANIFEST_URL) is None
+    assert requests_mock.call_count == 1
+
+
+def test_manifest_without_canvases(requests_mock):
+    requests_mock.get(MANIFEST_URL, json={"label": "empty"})
+
+    assert manifests.get_manifest(MANIFEST_URL) == {"label": "empty", "canvases": []}
+    assert manifests.get_first_canvas_id(MANIFEST_URL) is None
+
+
+def test_stale_manifest_revalidated(requests_mock, settings):
+    settings.HXAT_MANIFEST_CACHE = dict(settings.HXAT_MANIFEST_CACHE, ttl=0)
+    requests_mock.get(
+        MANIFEST_URL,
+        json=manifest_json("c1"),
+        headers={"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"},
+    )
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+
+    # not modified: the cached manifest is kept
+    requests_mock.get(MANIFEST_URL, status_code=304)
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+    join_revalidation()
+    assert requests_mock.call_count == 2
+    request = requests_mock.last_request
+    assert request.headers["If-None-Match"] == '"v1"'
+    assert request.headers["If-Modified-Since"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+
+    # modified: the stale manifest is served while the new one is fetched
+    requests_mock.get(
+        MANIFEST_URL, json=manifest_json("c2"), headers={"ETag": '"v2"'}
+    )
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+    join_revalidation()
+    assert requests_mock.call_count == 3
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c2"
+    join_revalidation()
+
+
+def test_stale_manifest_kept_when_revalidation_fails(requests_mock, settings):
+    settings.HXAT_MANIFEST_CACHE = dict(settings.HXAT_MANIFEST_CACHE, ttl=0)
+    requests_mock.get(MANIFEST_URL, json=manifest_json("c1"))
+    assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+
+    requests_mock.get(MANIFEST_URL, status_code=503)
+    for _ in range(3):
+        assert manifests.get_first_canvas_id(MANIFEST_URL) == "c1"
+        join_revalidation()
+    # the revalidation lock holds off retries for error_ttl
+    assert requests_mock.call_count == 2
+
+
+def test_concurrent_misses_share_one_fetch(requests_mock, monkeypatch):
+    fetched = threading.Event()
+    release = threading.Event()
+    fetch_manifest = manifests.fetch_manifest
+
+    def slow_fetch_manifest(*args, **kwargs):
+        fetched.set()
+        release.wait(5)
+        return fetch_manifest(*args, **kwargs)
+
+    monkeypatch.setattr(manifests, "fetch_manifest", slow_fetch_manifest)
+    requests_mock.get(MANIFEST_URL, json=manifest_json("c1"))
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(manifests.get_first_canvas_id(MANIFEST_URL))
+        )
+        for _ in range(4)
+    ]
+    threads[0].start()
+    assert fetched.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["c1"] * 4
+    assert requests_mock.call_count == 1
+    assert caches["manifests"].get(manifests.cache_key(MANIFEST_URL)) is not None